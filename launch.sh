@@ -7,26 +7,20 @@ source "$SCRIPT_DIR/.venv/bin/activate"
 
 # Check if an argument is provided
 if [ -z "$1" ]; then
-    echo "Usage: $0 {browse|jira|workflow} [args...]"
+    echo "Usage: $0 {browse|jira|workflow|all|<group>,<group>...} [args...]"
     exit 1
 fi
 
-COMMAND=$1
+TOOLS=$1
 shift
 
-# Run the selected main script
-case "$COMMAND" in
-    browse)
-        python "$SCRIPT_DIR/src/browse_main.py" "$@"
-        ;;
-    jira)
-        python "$SCRIPT_DIR/src/jira_main.py" "$@"
-        ;;
-    workflow)
-        python "$SCRIPT_DIR/src/workflow_main.py" "$@"
+# Serve the selected tool groups from a single process
+case "$TOOLS" in
+    all|browse|jira|workflow|*,*)
+        python "$SCRIPT_DIR/src/main.py" --tools "$TOOLS" "$@"
         ;;
     *)
-        echo "Invalid argument. Usage: $0 {browse|jira|workflow} [args...]"
+        echo "Invalid argument. Usage: $0 {browse|jira|workflow|all|<group>,<group>...} [args...]"
         exit 1
         ;;
-esac 
\ No newline at end of file
+esac
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""Measure cold-start cost of the MCP entry points.
+
+For each entry point a fresh interpreter imports the module under
+`-X importtime` and builds its server with setup_mcp, without serving. The
+report lists time-to-ready, the heaviest top-level imports, and any heavy
+dependency that was imported eagerly. Reports can be saved with --save and
+compared with --baseline. Exits non-zero when an entry point exceeds the
+budget, regresses past the tolerance, or imports a deferred dependency at
+startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+ENTRY_POINTS = {
+    "browse": "import browse_main as m; m.setup_mcp(config)",
+    "jira": "import jira_main as m; m.setup_mcp(config)",
+    "workflow": "import workflow_main as m; m.setup_mcp(config)",
+    "all": "import main as m; m.setup_mcp(m.parse_groups('all'), config)",
+}
+
+# Dependencies that must only be imported by the first tool call needing them.
+DEFERRED_MODULES = ["atlassian", "requests", "black", "github"]
+
+# Every entry point is ready in about 450ms; the budget catches a regression
+# even without a baseline to compare against.
+BUDGET_MS = 1500
+# Ignore ready-time changes smaller than this; they are process start noise.
+MIN_REGRESSION_MS = 50.0
+
+CHILD = """
+import json, sys, time, types
+started = time.perf_counter()
+from core.config import ProjectRegistry
+config = ProjectRegistry.of(types.SimpleNamespace(project_dir=".", trace_file=None))
+{setup}
+ready_ms = (time.perf_counter() - started) * 1000
+loaded = [name for name in {deferred!r} if name in sys.modules]
+print(json.dumps({{"ready_ms": ready_ms, "deferred_loaded": loaded}}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Sum `-X importtime` self-time microseconds per top-level package."""
+    totals: dict = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue
+        root = name.strip().split(".")[0]
+        totals[root] = totals.get(root, 0) + int(self_us)
+    return totals
+
+
+def measure(name: str) -> dict:
+    code = CHILD.format(setup=ENTRY_POINTS[name], deferred=DEFERRED_MODULES)
+    env = dict(os.environ, PYTHONPATH=SRC, PYTHONWARNINGS="ignore")
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=ROOT,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{name} failed to start:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["wall_ms"] = wall_ms
+    report["imports_ms"] = {
+        root: us / 1000 for root, us in parse_importtime(result.stderr).items()
+    }
+    return report
+
+
+def run(names, runs: int) -> dict:
+    results = {}
+    for name in names:
+        samples = [measure(name) for _ in range(runs)]
+        last = samples[-1]
+        results[name] = {
+            "ready_ms": statistics.median(s["ready_ms"] for s in samples),
+            "wall_ms": statistics.median(s["wall_ms"] for s in samples),
+            "deferred_loaded": last["deferred_loaded"],
+            "imports_ms": dict(
+                sorted(last["imports_ms"].items(), key=lambda kv: -kv[1])
+            ),
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Entry points whose ready time grew by more than `tolerance` over the baseline."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        limit = before["ready_ms"] * (1 + tolerance)
+        if (
+            result["ready_ms"] > limit
+            and result["ready_ms"] - before["ready_ms"] > MIN_REGRESSION_MS
+        ):
+            regressions.append(
+                f"{name}: ready in {result['ready_ms']:.0f}ms vs baseline "
+                f"{before['ready_ms']:.0f}ms"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entry_points", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("STARTUP_BUDGET_MS", BUDGET_MS)),
+        help="Maximum time-to-ready per entry point",
+    )
+    parser.add_argument("--save", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare ready times to a saved report")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative ready-time growth over the baseline",
+    )
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.entry_points, args.runs)
+    failures = []
+    for name, result in results.items():
+        if result["ready_ms"] > args.budget_ms:
+            failures.append(
+                f"{name}: ready in {result['ready_ms']:.0f}ms > {args.budget_ms:.0f}ms"
+            )
+        if result["deferred_loaded"]:
+            failures.append(
+                f"{name}: imported at startup: {', '.join(result['deferred_loaded'])}"
+            )
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures.extend(compare(results, json.load(f), args.tolerance))
+    report = {"results": results, "failures": failures}
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, result in results.items():
+            print(
+                f"{name}: ready {result['ready_ms']:.0f}ms, "
+                f"process {result['wall_ms']:.0f}ms"
+            )
+            for root, ms in list(result["imports_ms"].items())[: args.top]:
+                print(f"    {ms:8.1f}ms  {root}")
+        for failure in failures:
+            print(f"[WARN] {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
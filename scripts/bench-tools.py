@@ -0,0 +1,598 @@
+#!/usr/bin/env python
+"""Benchmark the MCP tools offline, against local stand-ins for their backends.
+
+Jira tools talk to a fake Jira REST server with simulated latency and a
+50-issue page cap. Workflow tools run real git against a local bare remote,
+with a stub `gh` first on PATH. Browse tools fetch from a local HTTP server,
+and the formatter runs on a generated N-file project. Each scenario calls one
+tool through the MCP server several times and reports p50/p95 latency,
+throughput and the HTTP requests and commands it caused. Reports can be saved
+as JSON baselines and compared with --baseline; the exit code is non-zero
+when a tool fails or its p95 regresses past the tolerance.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+GROUPS = ["jira", "workflow", "formatter", "browse"]
+
+JIRA_PAGE_CAP = 50
+EPIC_KEY = "E-1"
+EPIC_FIELD = "customfield_10008"
+WORDS = ["login", "redirect", "cache", "search", "export", "billing", "upload"]
+
+# Ignore p95 changes smaller than this; they are scheduler noise.
+MIN_REGRESSION_MS = 5.0
+
+
+class LocalServer:
+    """Threaded HTTP server on 127.0.0.1 whose responses come from `handle`."""
+
+    def __init__(self, handle, latency_ms=0.0):
+        server = self
+        self.requests = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, Nagle's
+            # algorithm adds ~40ms to every keep-alive response.
+            disable_nagle_algorithm = True
+
+            def _respond(self):
+                server.requests += 1
+                if latency_ms:
+                    time.sleep(latency_ms / 1000)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, content_type, payload = handle(self.command, self.path, body)
+                if not isinstance(payload, (bytes, str)):
+                    payload = json.dumps(payload)
+                if isinstance(payload, str):
+                    payload = payload.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def url(self, path: str = "") -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}{path}"
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class FakeJira:
+    """The slice of the Jira REST API the tools use, over generated issues.
+
+    Issues P-1 … P-<issues> exist; the first `epic_size` belong to E-1.
+    """
+
+    def __init__(self, issues: int, epic_size: int):
+        self.issues = issues
+        self.epic_size = epic_size
+        self.created = 0
+
+    def issue(self, key: str, fields=None):
+        number = int(key.rpartition("-")[2])
+        comments = [
+            {
+                "author": {"displayName": f"user{c}"},
+                "created": "2024-01-01T00:00:00.000+0000",
+                "body": f"Comment {c} about {WORDS[(number + c) % len(WORDS)]}.",
+            }
+            for c in range(3)
+        ]
+        all_fields = {
+            "summary": f"Story {number}: {WORDS[number % len(WORDS)]} flow",
+            "description": f"Steps for {key}.\n" * 20,
+            "status": {"name": "Open"},
+            "issuetype": {"id": "10001", "name": "Story"},
+            "project": {"key": "P"},
+            "comment": {"total": len(comments), "comments": comments},
+            "customfield_10100": {"value": "Team A"},
+            EPIC_FIELD: EPIC_KEY if number <= self.epic_size else None,
+        }
+        if fields and "*all" not in fields:
+            all_fields = {k: v for k, v in all_fields.items() if k in fields}
+        return {"id": str(10000 + number), "key": key, "fields": all_fields}
+
+    def create(self) -> dict:
+        self.created += 1
+        number = self.issues + self.created
+        return {"id": str(10000 + number), "key": f"P-{number}"}
+
+    def _exists(self, key: str) -> bool:
+        project, _, number = key.rpartition("-")
+        return project == "P" and number.isdigit() and 1 <= int(number) <= self.issues
+
+    def search(self, query: dict):
+        jql = query["jql"][0]
+        fields = query.get("fields", ["*all"])[0].split(",")
+        start = int(query.get("startAt", ["0"])[0])
+        limit = min(int(query.get("maxResults", ["50"])[0]), JIRA_PAGE_CAP)
+        if jql.startswith("key in ("):
+            keys = jql[len("key in (") : jql.index(")")].split(", ")
+            if not all(self._exists(key) for key in keys):
+                return 400, {"errorMessages": ["An issue with key does not exist"]}
+        elif jql.startswith('"Epic Link"'):
+            keys = [f"P-{n}" for n in range(1, self.epic_size + 1)]
+        else:
+            # Incremental mirror syncs: nothing changes during a run.
+            keys = []
+        page = [self.issue(key, fields) for key in keys[start : start + limit]]
+        return 200, {
+            "startAt": start,
+            "maxResults": limit,
+            "total": len(keys),
+            "issues": page,
+        }
+
+    def handle(self, method, path, body):
+        parts = urlsplit(path)
+        query = parse_qs(parts.query)
+        route = parts.path.removeprefix("/rest/api/2/")
+        status, payload = 404, {"errorMessages": [f"No route for {path}"]}
+        if method == "POST" and route == "issue":
+            status, payload = 201, self.create()
+        elif method == "POST" and route == "issue/bulk":
+            updates = json.loads(body)["issueUpdates"]
+            status, payload = 201, {
+                "issues": [self.create() for _ in updates],
+                "errors": [],
+            }
+        elif route == "serverInfo":
+            status, payload = 200, {"version": "9.12.0"}
+        elif route == "field":
+            status, payload = 200, [{"id": EPIC_FIELD, "name": "Epic Link"}]
+        elif route == "search":
+            status, payload = self.search(query)
+        elif route.startswith("issue/createmeta/"):
+            required = ["summary", "issuetype", "project", "customfield_10100"]
+            status, payload = 200, {
+                "values": [{"fieldId": field, "required": True} for field in required]
+            }
+        elif re.fullmatch(r"issue/[A-Z]+-\d+(/comment)?", route):
+            key = route.split("/")[1]
+            if self._exists(key):
+                issue = self.issue(key, query.get("fields", ["*all"])[0].split(","))
+                if route.endswith("/comment"):
+                    issue = self.issue(key)["fields"]["comment"]
+                status, payload = 200, issue
+        return status, "application/json", payload
+
+
+def page_html(n: int) -> str:
+    paragraphs = "".join(
+        f"<p>Paragraph {i} of page {n}, with <a href='/page/{i}'>a link</a>.</p>"
+        for i in range(300)
+    )
+    return f"<html><head><title>Page {n}</title></head><body>{paragraphs}</body></html>"
+
+
+def search_html(query: str) -> str:
+    results = "".join(
+        f'<div class="result results_links web-result"><h2 class="result__title">'
+        f'<a class="result__a" href="https://example.com/{i}?q={query}">'
+        f"Result {i} for {query}</a></h2>"
+        f'<a class="result__snippet">Snippet {i} mentioning {query}.</a></div>'
+        for i in range(12)
+    )
+    return f"<html><body>{results}</body></html>"
+
+
+def handle_web(method, path, body):
+    parts = urlsplit(path)
+    if parts.path.startswith("/page/"):
+        return 200, "text/html; charset=utf-8", page_html(int(parts.path[6:]))
+    if parts.path == "/html/":
+        query = parse_qs(parts.query).get("q", [""])[0]
+        return 200, "text/html; charset=utf-8", search_html(query)
+    return 404, "text/plain", "not found"
+
+
+GH_STUB = """#!{python} -S
+import datetime, json, os, sys, time
+time.sleep(float(os.environ.get("BENCH_GH_LATENCY_MS", "0")) / 1000)
+args = sys.argv[1:]
+if args[:2] == ["auth", "status"]:
+    print("Logged in to github.com as bench")
+elif args[:2] == ["issue", "view"]:
+    number = int(args[2])
+    print(json.dumps({{"number": number, "title": f"Issue {{number}}", "body": ""}}))
+elif args[:1] == ["api"]:
+    if "since=" not in args[-1]:
+        base = datetime.datetime(2024, 1, 1)
+        for n in range(1, int(os.environ["BENCH_GH_ISSUES"]) + 1):
+            stamp = (base + datetime.timedelta(minutes=n)).isoformat() + "Z"
+            print(json.dumps({{
+                "number": n, "title": f"Issue {{n}}",
+                "state": "closed" if n % 3 == 0 else "open",
+                "labels": ["bug"] if n % 2 else [],
+                "created_at": stamp, "updated_at": stamp, "pull_request": False,
+            }}))
+elif args[:2] == ["pr", "view"]:
+    print(json.dumps({{"number": 1}}))
+else:
+    sys.stderr.write("gh stub: unsupported command: " + " ".join(args) + "\\n")
+    sys.exit(1)
+"""
+
+
+def git(*args, cwd):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def write_module(path: str, n: int, formatted=True):
+    if formatted:
+        source = f"def func_{n}(a, b):\n    return {{'a': a, 'b': b}}\n"
+        source = source.replace("'", '"')
+    else:
+        source = f"def func_{n}( a,b ):\n  return {{ 'a':a,'b' :b }}\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+
+
+def make_project(workdir: str, files: int, gh_latency_ms: float, gh_issues: int):
+    """A clone of a local bare remote holding `files` modules, and a stub gh."""
+    remote = os.path.join(workdir, "remote.git")
+    clone = os.path.join(workdir, "project")
+    git("init", "-q", "--bare", "-b", "main", remote, cwd=workdir)
+    git("clone", "-q", remote, clone, cwd=workdir)
+    for name, value in (("user.email", "bench@example.com"), ("user.name", "bench")):
+        git("config", name, value, cwd=clone)
+    package = os.path.join(clone, "pkg")
+    os.makedirs(package)
+    for n in range(files):
+        write_module(os.path.join(package, f"mod{n}.py"), n)
+    git("add", ".", cwd=clone)
+    git("commit", "-q", "-m", "Generated project", cwd=clone)
+    git("push", "-q", "-u", "origin", "main", cwd=clone)
+    git("remote", "set-head", "origin", "main", cwd=clone)
+
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir)
+    gh = os.path.join(bin_dir, "gh")
+    with open(gh, "w", encoding="utf-8") as f:
+        f.write(GH_STUB.format(python=sys.executable))
+    os.chmod(gh, 0o755)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+    os.environ["BENCH_GH_LATENCY_MS"] = str(gh_latency_ms)
+    os.environ["BENCH_GH_ISSUES"] = str(gh_issues)
+    return clone
+
+
+class Scenario:
+    def __init__(self, label, tool, args=None, before=None):
+        self.label = label
+        self.tool = tool
+        self.args = args or (lambda i: {})
+        self.before = before
+
+
+def scenarios(group: str, settings, clone: str, web) -> list:
+    if group == "jira":
+        batch = 20
+        return [
+            Scenario("jira__health", "jira__health"),
+            Scenario("jira__get_base_issue", "jira__get_base_issue"),
+            Scenario(
+                "jira__create_issue_from_base",
+                "jira__create_issue_from_base",
+                lambda i: {"title": f"Bench {i}", "description": "Created by bench"},
+            ),
+            Scenario(
+                f"jira__create_issues_from_base[{batch}]",
+                "jira__create_issues_from_base",
+                lambda i: {
+                    "items": [
+                        {"title": f"Bench {i}.{j}", "description": "Created by bench"}
+                        for j in range(batch)
+                    ]
+                },
+            ),
+            Scenario(
+                "jira__get_epic_stories",
+                "jira__get_epic_stories",
+                lambda i: {"epic_key": EPIC_KEY},
+            ),
+            Scenario(
+                "jira__get_story_content",
+                "jira__get_story_content",
+                lambda i: {"story_key": f"P-{settings.epic_size + i + 1}"},
+            ),
+            Scenario(
+                f"jira__get_stories_content[{batch}]",
+                "jira__get_stories_content",
+                lambda i: {
+                    "keys": [
+                        f"P-{settings.epic_size + 1000 + i * batch + j}"
+                        for j in range(batch)
+                    ]
+                },
+            ),
+            Scenario(
+                "jira__search_local",
+                "jira__search_local",
+                lambda i: {"query": WORDS[i % len(WORDS)] + " flow"},
+            ),
+        ]
+    if group == "workflow":
+        package = os.path.join(clone, "pkg")
+        return [
+            Scenario(
+                "workflow__change_summary",
+                "workflow__change_summary",
+                before=lambda i: write_module(
+                    os.path.join(package, f"mod{i % settings.files}.py"), i, False
+                ),
+            ),
+            Scenario("workflow__list", "workflow__list"),
+            Scenario(
+                "workflow__list[refresh]", "workflow__list", lambda i: {"refresh": True}
+            ),
+            Scenario(
+                "workflow__start", "workflow__start", lambda i: {"issue_number": 10 + i}
+            ),
+        ]
+    if group == "formatter":
+        package = os.path.join(clone, "pkg")
+        return [
+            Scenario(
+                "formatter__black",
+                "formatter__black",
+                before=lambda i: i
+                and write_module(
+                    os.path.join(package, f"mod{i % settings.files}.py"), i, False
+                ),
+            )
+        ]
+    if group == "browse":
+        return [
+            Scenario(
+                "browse__fetch",
+                "browse__fetch",
+                lambda i: {"url": web.url(f"/page/{i}")},
+            ),
+            Scenario(
+                "browse__fetch[cached]",
+                "browse__fetch",
+                lambda i: {"url": web.url("/page/0")},
+            ),
+            Scenario(
+                "browse__fetch_many[4]",
+                "browse__fetch_many",
+                lambda i: {
+                    "urls": [web.url(f"/page/{1000 + i * 4 + j}") for j in range(4)]
+                },
+            ),
+            Scenario(
+                "browse__search",
+                "browse__search",
+                lambda i: {"term": f"bench query {i}"},
+            ),
+        ]
+    raise ValueError(f"Unknown group: {group}")
+
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile of the raw samples."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def _is_error(content) -> bool:
+    for item in content:
+        text = getattr(item, "text", "")
+        try:
+            result = json.loads(text)
+        except ValueError:
+            return text.startswith("Error")
+        if isinstance(result, dict):
+            return result.get("success") is False or bool(result.get("error"))
+    return False
+
+
+async def run_scenario(mcp, scenario: Scenario, runs: int) -> dict:
+    from core import metrics
+
+    metrics.registry.reset()
+    samples, errors, first_error = [], 0, None
+    started = time.perf_counter()
+    for i in range(runs):
+        if scenario.before:
+            scenario.before(i)
+        call_started = time.perf_counter()
+        try:
+            content = await mcp.call_tool(scenario.tool, scenario.args(i))
+            failed = _is_error(content)
+            detail = content
+        except Exception as e:
+            failed, detail = True, e
+        samples.append((time.perf_counter() - call_started) * 1000)
+        if failed:
+            errors += 1
+            first_error = first_error or str(detail)[:500]
+    elapsed = time.perf_counter() - started
+    snapshot = metrics.registry.snapshot()
+    children = {
+        kind: {name: series["count"] for name, series in series_by_name.items()}
+        for kind, series_by_name in snapshot.items()
+        if isinstance(series_by_name, dict) and kind not in ("tool", "gauges")
+    }
+    report = {
+        "tool": scenario.tool,
+        "calls": runs,
+        "errors": errors,
+        "p50_ms": round(percentile(samples, 0.5), 2),
+        "p95_ms": round(percentile(samples, 0.95), 2),
+        "max_ms": round(max(samples), 2),
+        "mean_ms": round(sum(samples) / runs, 2),
+        "throughput_per_s": round(runs / elapsed, 2),
+        "children": children,
+    }
+    if first_error:
+        report["first_error"] = first_error
+    return report
+
+
+def build_server(settings, workdir: str, jira, clone: str, web):
+    from core.config import Config, ProjectRegistry
+    import main
+    import tool.browse
+
+    # Searches go to the local server instead of DuckDuckGo.
+    tool.browse.SEARCH_URL = web.url("/html/")
+    config = Config(
+        jira_url=jira.url(),
+        jira_username=None,
+        jira_api_token="bench",
+        jira_is_cloud=None,
+        gh_token="bench",
+        project_dir=clone,
+        jira_base_issue="P-1",
+        jira_pool_size=10,
+        jira_timeout=10,
+        jira_mirror_path=os.path.join(workdir, "jira-mirror.sqlite3"),
+    )
+    return main.setup_mcp(list(main.GROUPS), ProjectRegistry.of(config))
+
+
+async def run_all(settings) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="autonomy-bench-") as workdir:
+        fake = FakeJira(settings.issues, settings.epic_size)
+        jira = LocalServer(fake.handle, settings.jira_latency_ms)
+        web = LocalServer(handle_web)
+        try:
+            clone = make_project(
+                workdir, settings.files, settings.gh_latency_ms, settings.gh_issues
+            )
+            mcp = build_server(settings, workdir, jira, clone, web)
+            # Per-call INFO logs would swamp the report and add their own cost.
+            logging.disable(logging.INFO)
+            for group in settings.groups:
+                for scenario in scenarios(group, settings, clone, web):
+                    results[scenario.label] = await run_scenario(
+                        mcp, scenario, settings.runs
+                    )
+        finally:
+            jira.stop()
+            web.stop()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose p95 grew by more than `tolerance` over the baseline."""
+    regressions = []
+    for label, result in results.items():
+        before = baseline.get("results", {}).get(label)
+        if before is None:
+            continue
+        limit = before["p95_ms"] * (1 + tolerance)
+        if (
+            result["p95_ms"] > limit
+            and result["p95_ms"] - before["p95_ms"] > MIN_REGRESSION_MS
+        ):
+            regressions.append(
+                f"{label}: p95 {result['p95_ms']:.1f}ms vs baseline "
+                f"{before['p95_ms']:.1f}ms"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("groups", nargs="*", default=GROUPS, help=", ".join(GROUPS))
+    parser.add_argument("--runs", type=int, default=20, help="Calls per scenario")
+    parser.add_argument("--files", type=int, default=200, help="Generated modules")
+    parser.add_argument("--issues", type=int, default=5000, help="Fake Jira issues")
+    parser.add_argument("--epic-size", type=int, default=230)
+    parser.add_argument("--gh-issues", type=int, default=500)
+    parser.add_argument("--jira-latency-ms", type=float, default=20)
+    parser.add_argument("--gh-latency-ms", type=float, default=10)
+    parser.add_argument("--save", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare p95 latencies to a saved report")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed relative p95 growth over the baseline",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+    unknown = [group for group in args.groups if group not in GROUPS]
+    if unknown:
+        parser.error(f"Unknown group(s): {', '.join(unknown)}")
+
+    results = asyncio.run(run_all(args))
+    failures = [
+        f"{label}: {result['errors']} failed call(s): {result.get('first_error')}"
+        for label, result in results.items()
+        if result["errors"]
+    ]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    report = {
+        "settings": {
+            name: getattr(args, name)
+            for name in (
+                "runs",
+                "files",
+                "issues",
+                "epic_size",
+                "gh_issues",
+                "jira_latency_ms",
+                "gh_latency_ms",
+            )
+        },
+        "results": results,
+        "failures": failures,
+        "regressions": regressions,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'scenario':40} {'p50':>9} {'p95':>9} {'calls/s':>9}")
+        for label, result in results.items():
+            print(
+                f"{label:40} {result['p50_ms']:7.1f}ms {result['p95_ms']:7.1f}ms "
+                f"{result['throughput_per_s']:9.1f}"
+            )
+        for problem in failures + regressions:
+            print(f"[WARN] {problem}")
+    return 1 if failures or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
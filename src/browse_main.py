@@ -1,26 +1,53 @@
+import asyncio
+from core import metrics
 from core.config import load_config
+from core.log import configure_logging
+from typing import Optional
 from mcp.server.fastmcp import FastMCP
 import tool.browse as browse_tools
 
 
-def setup_mcp(config=None):
-    if config is None:
-        config = load_config()
-    mcp = FastMCP("BrowseMCP")
+def register(mcp, projects):
 
     @mcp.tool()
-    def browse__search(term: str) -> str:
-        """Search the web for the given term."""
-        return browse_tools.search(term)
+    async def browse__search(
+        term: str, max_results: int = browse_tools.MAX_SEARCH_RESULTS
+    ) -> dict:
+        """Search the web and return result titles, URLs and snippets."""
+        return await asyncio.to_thread(browse_tools.search, term, max_results)
 
     @mcp.tool()
-    def browse__fetch(url: str) -> str:
-        """Fetch and return the contents of a URL."""
-        return browse_tools.fetch(url)
+    async def browse__fetch(
+        url: str = "",
+        offset: int = 0,
+        max_chars: int = browse_tools.DEFAULT_MAX_CHARS,
+        continuation: Optional[str] = None,
+    ) -> dict:
+        """Fetch a URL as text, max_chars at a time. Pass continuation back for the next chunk."""
+        return await asyncio.to_thread(
+            browse_tools.fetch, url, offset, max_chars, continuation
+        )
 
+    @mcp.tool()
+    async def browse__fetch_many(urls: list[str]) -> dict:
+        """Fetch several URLs concurrently and return their contents in order."""
+        return await asyncio.to_thread(browse_tools.fetch_many, urls)
+
+    @mcp.tool()
+    def browse__cache_stats() -> dict:
+        """Report size and hit/revalidation counters of the page and search caches."""
+        return browse_tools.cache_stats()
+
+
+def setup_mcp(projects=None):
+    if projects is None:
+        projects = load_config()
+    mcp = metrics.instrument(FastMCP("BrowseMCP"), projects.trace_file)
+    register(mcp, projects)
     return mcp
 
 
 if __name__ == "__main__":
+    configure_logging()
     mcp = setup_mcp()
     mcp.run()
@@ -1,11 +1,15 @@
 import argparse
 import os
-from dotenv import load_dotenv
+import threading
+from core import jira_mirror
+from dotenv import dotenv_values, find_dotenv
 from typing import List, Optional
 
+DEFAULT_PROJECT = "default"
 
-def get_required_env(name: str) -> str:
-    value = os.getenv(name)
+
+def get_required_env(name: str, values=None) -> str:
+    value = (os.environ if values is None else values).get(name)
     if not value:
         raise RuntimeError(f"{name} must be set in the environment or .env file.")
     return value
@@ -21,6 +25,11 @@ class Config:
         gh_token: str,
         project_dir: str,
         jira_base_issue: str,
+        jira_pool_size: int = 10,
+        jira_timeout: float = 30,
+        trace_file: Optional[str] = None,
+        jira_mirror_path: Optional[str] = None,
+        watch_files: bool = False,
     ):
         self.jira_url = jira_url
         self.jira_username = jira_username
@@ -29,29 +38,183 @@ class Config:
         self.gh_token = gh_token
         self.project_dir = project_dir
         self.jira_base_issue = jira_base_issue
+        self.jira_pool_size = jira_pool_size
+        self.jira_timeout = jira_timeout
+        self.trace_file = trace_file
+        self.jira_mirror_path = jira_mirror_path
+        self.watch_files = watch_files
 
     @staticmethod
-    def from_env(args):
-        if args.env:
-            for env_file in args.env:
-                load_dotenv(env_file)
-        else:
-            load_dotenv()
-        project_dir = args.project_path or get_required_env("PROJECT_DIR")
+    def from_values(values, project_dir: Optional[str] = None) -> "Config":
+        jira_url = get_required_env("JIRA_URL", values)
+        mirror_path = values.get("JIRA_MIRROR_PATH") or jira_mirror.default_path(
+            jira_url
+        )
         return Config(
-            jira_url=get_required_env("JIRA_URL"),
-            jira_username=os.getenv("JIRA_USERNAME"),
-            jira_api_token=get_required_env("JIRA_API_TOKEN"),
-            jira_is_cloud=os.getenv("JIRA_IS_CLOUD"),
-            gh_token=get_required_env("GH_TOKEN"),
-            project_dir=project_dir,
-            jira_base_issue=get_required_env("JIRA_BASE_ISSUE"),
+            jira_url=jira_url,
+            jira_username=values.get("JIRA_USERNAME"),
+            jira_api_token=get_required_env("JIRA_API_TOKEN", values),
+            jira_is_cloud=values.get("JIRA_IS_CLOUD"),
+            gh_token=get_required_env("GH_TOKEN", values),
+            project_dir=project_dir or get_required_env("PROJECT_DIR", values),
+            jira_base_issue=get_required_env("JIRA_BASE_ISSUE", values),
+            jira_pool_size=int(values.get("JIRA_POOL_SIZE") or "10"),
+            jira_timeout=float(values.get("JIRA_TIMEOUT") or "30"),
+            trace_file=values.get("MCP_TRACE_FILE"),
+            jira_mirror_path=None if mirror_path == "off" else mirror_path,
+            watch_files=(values.get("WATCH_FILES") or "").lower()
+            in ("1", "true", "yes"),
+        )
+
+
+def _read_env_files(env_files: List[str]) -> dict:
+    """Values set in env_files, the first file to set a name winning."""
+    values: dict = {}
+    for env_file in reversed(env_files):
+        values.update({k: v for k, v in dotenv_values(env_file).items() if v})
+    return values
+
+
+class Project:
+    """One named project, whose Config is rebuilt when its .env files change.
+
+    The project's own env files win over the process environment, so an
+    exported variable meant for one project can't leak into the others. As
+    with load_dotenv, the process environment wins over the shared env
+    files. Within each group of files, the first one to set a value wins.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        project_dir: Optional[str],
+        env_files: List[str],
+        own_env_files: Optional[List[str]] = None,
+    ):
+        self.name = name
+        self.project_dir = project_dir
+        self.env_files = env_files
+        self.own_env_files = own_env_files or []
+        self._signature: Optional[tuple] = None
+        self._config: Optional[Config] = None
+        self._lock = threading.Lock()
+
+    def _mtimes(self) -> tuple:
+        mtimes: List[Optional[int]] = []
+        for env_file in self.own_env_files + self.env_files:
+            try:
+                mtimes.append(os.stat(env_file).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def config(self) -> Config:
+        with self._lock:
+            signature = self._mtimes()
+            config = self._config
+            if config is None or signature != self._signature:
+                values = _read_env_files(self.env_files)
+                values.update(os.environ)
+                values.update(_read_env_files(self.own_env_files))
+                config = Config.from_values(values, self.project_dir)
+                self._config, self._signature = config, signature
+            return config
+
+
+class _StaticProject:
+    def __init__(self, name: str, config):
+        self.name = name
+        self.project_dir = config.project_dir
+        self._config = config
+
+    def config(self):
+        return self._config
+
+
+class ProjectRegistry:
+    """The named projects one server process serves.
+
+    Tools take an optional project name; without one they use the default.
+    Per-project clients are cached by the tool modules, keyed by the
+    project's settings, so they are built on first use.
+    """
+
+    def __init__(self, projects: list, default: str):
+        self._projects = {project.name: project for project in projects}
+        self.default = default
+
+    @classmethod
+    def of(cls, config, name: str = DEFAULT_PROJECT):
+        """Registry serving a single, already-built config."""
+        return cls([_StaticProject(name, config)], name)
+
+    def names(self) -> list:
+        return list(self._projects)
+
+    def get(self, name: Optional[str] = None):
+        project = self._projects.get(name or self.default)
+        if project is None:
+            raise ValueError(
+                f"Unknown project: {name}. Choose from: {', '.join(self._projects)}."
+            )
+        return project.config()
+
+    def describe(self) -> list:
+        return [
+            {
+                "name": name,
+                "project_dir": self.get(name).project_dir,
+                "default": name == self.default,
+            }
+            for name in self._projects
+        ]
+
+    @property
+    def trace_file(self) -> Optional[str]:
+        return self.get().trace_file
+
+
+def _parse_project(value: str):
+    name, sep, rest = value.partition("=")
+    if not sep or not name or not rest:
+        raise argparse.ArgumentTypeError(
+            f"Expected NAME=PATH[,ENV_FILE...], got {value!r}"
         )
+    path, *env_files = rest.split(",")
+    return name, path, env_files
 
 
-def load_config(argv=None) -> Config:
+def load_config(argv=None) -> ProjectRegistry:
     parser = argparse.ArgumentParser()
     parser.add_argument("--env", type=str, nargs="*", help="Path(s) to .env file(s)")
     parser.add_argument("--project-path", type=str, help="Path to project root")
+    parser.add_argument(
+        "--project",
+        type=_parse_project,
+        action="append",
+        default=[],
+        metavar="NAME=PATH[,ENV_FILE...]",
+        help="Serve another named project, with its own optional .env overrides",
+    )
     args = parser.parse_args(argv) if argv is not None else parser.parse_args()
-    return Config.from_env(args)
+    if args.env:
+        env_files = [os.path.abspath(f) for f in args.env]
+    else:
+        env_files = [path for path in [find_dotenv()] if path]
+    projects = []
+    if args.project_path or not args.project:
+        projects.append(Project(DEFAULT_PROJECT, args.project_path, env_files))
+    for name, path, extra_env_files in args.project:
+        projects.append(
+            Project(
+                name,
+                os.path.abspath(path),
+                env_files,
+                [os.path.abspath(f) for f in extra_env_files],
+            )
+        )
+    registry = ProjectRegistry(projects, projects[0].name)
+    for name in registry.names():
+        # Fail at startup, not on the first tool call, if settings are missing.
+        registry.get(name)
+    return registry
@@ -0,0 +1,221 @@
+import re
+from typing import Optional
+
+# The hash of git's empty tree, used to diff an unborn branch.
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+# Above this many changed paths, pass no pathspec and let git diff everything
+# rather than risk overflowing the command line.
+MAX_PATHSPEC = 500
+
+_RENAME_BRACES = re.compile(r"\{([^{}]*) => ([^{}]*)\}")
+
+
+def status_command(paths=None) -> list:
+    cmd = [
+        "git",
+        "-c",
+        "core.quotepath=off",
+        "status",
+        "--porcelain=v2",
+        "--branch",
+        "-z",
+        "--untracked-files=all",
+    ]
+    if paths:
+        cmd += ["--", *paths]
+    return cmd
+
+
+def diff_command(base: str, paths=None) -> list:
+    cmd = [
+        "git",
+        "-c",
+        "core.quotepath=off",
+        "diff",
+        base,
+        "--numstat",
+        "--patch",
+        "-M",
+        "--no-color",
+        "--no-ext-diff",
+    ]
+    if paths:
+        cmd += ["--", *paths]
+    return cmd
+
+
+def default_branch_command(remote: str = "origin") -> list:
+    return ["git", "ls-remote", "--symref", remote, "HEAD"]
+
+
+def parse_default_branch(output: str) -> str:
+    """Branch name from `git ls-remote --symref <remote> HEAD` output."""
+    for line in output.splitlines():
+        if line.startswith("ref: refs/heads/") and line.endswith("\tHEAD"):
+            return line[len("ref: refs/heads/") : -len("\tHEAD")]
+    raise ValueError("Could not determine the remote's default branch")
+
+
+def parse_status(output: str) -> dict:
+    """Parse `git status --porcelain=v2 --branch -z` output."""
+    branch: Optional[str] = None
+    initial = False
+    entries = []
+    records = output.split("\0")
+    i = 0
+    while i < len(records):
+        record = records[i]
+        i += 1
+        if not record:
+            continue
+        if record.startswith("# branch.head "):
+            branch = record[len("# branch.head ") :]
+        elif record == "# branch.oid (initial)":
+            initial = True
+        elif record[0] == "1":
+            fields = record.split(" ", 8)
+            entries.append(_status_entry(fields[1], fields[8]))
+        elif record[0] == "2":
+            fields = record.split(" ", 9)
+            entry = _status_entry(fields[1], fields[9])
+            # Renames and copies carry the original path as the next record.
+            entry["orig_path"] = records[i]
+            i += 1
+            entries.append(entry)
+        elif record[0] == "u":
+            fields = record.split(" ", 10)
+            entries.append(_status_entry(fields[1], fields[10]))
+        elif record[0] == "?":
+            entries.append(_status_entry("??", record[2:]))
+    return {"branch": branch, "initial": initial, "entries": entries}
+
+
+def _status_entry(xy: str, path: str) -> dict:
+    return {"path": path, "index": xy[0], "worktree": xy[1]}
+
+
+def _numstat_path(path: str) -> str:
+    path = _RENAME_BRACES.sub(lambda m: m.group(2), path)
+    if " => " in path:
+        path = path.split(" => ", 1)[1]
+    return path.replace("//", "/")
+
+
+def _patch_path(lines: list) -> str:
+    for line in lines:
+        if line.startswith("rename to "):
+            return line[len("rename to ") :]
+        if line.startswith("+++ b/"):
+            # git terminates paths containing spaces with a tab here.
+            return line[len("+++ b/") :].rstrip("\t")
+    for line in lines:
+        if line.startswith("--- a/"):
+            return line[len("--- a/") :].rstrip("\t")
+    # Mode-only or binary changes: "diff --git a/<p> b/<p>" with equal halves.
+    header = lines[0][len("diff --git a/") :]
+    return header[: (len(header) - len(" b/")) // 2]
+
+
+def parse_numstat_patch(output: str):
+    """Split `git diff --numstat --patch` output into stats and per-file patches."""
+    stats = []
+    patches = []
+    current: Optional[list] = None
+    for line in output.split("\n"):
+        if line.startswith("diff --git "):
+            if current:
+                patches.append(current)
+            current = [line]
+        elif current is not None:
+            current.append(line)
+        elif line:
+            added, deleted, path = line.split("\t", 2)
+            stats.append(
+                {
+                    "path": _numstat_path(path),
+                    "added": None if added == "-" else int(added),
+                    "deleted": None if deleted == "-" else int(deleted),
+                }
+            )
+    if current:
+        patches.append(current)
+    return stats, [
+        {"path": _patch_path(lines), "patch": "\n".join(lines).rstrip("\n")}
+        for lines in patches
+    ]
+
+
+def _hunks(patch: str) -> list:
+    """Split a file patch into its header followed by one chunk per hunk."""
+    parts = re.split(r"(?m)^(?=@@ )", patch)
+    return [part for part in parts if part]
+
+
+def apply_budget(patches: list, max_bytes: int):
+    """Keep whole hunks, file by file, until `max_bytes` of patch text is used."""
+    kept = []
+    omitted = []
+    remaining = max_bytes
+    for patch in patches:
+        if remaining <= 0:
+            omitted.append(patch["path"])
+            continue
+        text = ""
+        truncated = False
+        for hunk in _hunks(patch["patch"]):
+            size = len(hunk.encode("utf-8"))
+            if size > remaining:
+                truncated = True
+                break
+            text += hunk
+            remaining -= size
+        if not text:
+            omitted.append(patch["path"])
+            continue
+        kept.append({"path": patch["path"], "patch": text, "truncated": truncated})
+    return kept, omitted
+
+
+async def collect_changes(capture, paths=None, max_patch_bytes: int = 100000) -> dict:
+    """Gather status, numstat and patch for the working tree.
+
+    The working tree is scanned once by `git status`; the diff is then
+    restricted to the paths status reported, so its cost scales with the
+    number of changed files rather than the size of the checkout.
+    """
+    status = parse_status((await capture(status_command(paths))).stdout)
+    tracked = [entry for entry in status["entries"] if entry["index"] != "?"]
+    result = {
+        "branch": status["branch"],
+        "status": status["entries"],
+        "diff_stat": [],
+        "diff": [],
+        "truncated": False,
+        "omitted": [],
+    }
+    if not tracked:
+        return result
+
+    pathspec = []
+    for entry in tracked:
+        pathspec.append(f":(literal){entry['path']}")
+        if "orig_path" in entry:
+            pathspec.append(f":(literal){entry['orig_path']}")
+    if len(pathspec) > MAX_PATHSPEC:
+        pathspec = list(paths or [])
+    base = EMPTY_TREE if status["initial"] else "HEAD"
+    # Leave headroom over the patch budget for the numstat section and for
+    # the hunk that crosses the budget, and drop everything past that.
+    diff = await capture(
+        diff_command(base, pathspec), max_output=max_patch_bytes * 2 + 65536
+    )
+    stats, patches = parse_numstat_patch(diff.stdout)
+    kept, omitted = apply_budget(patches, max_patch_bytes)
+    result["diff_stat"] = stats
+    result["diff"] = kept
+    result["omitted"] = omitted
+    result["truncated"] = bool(omitted) or any(p["truncated"] for p in kept)
+    if getattr(diff, "truncated", False):
+        result["truncated"] = True
+    return result
@@ -0,0 +1,243 @@
+import re
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlsplit
+
+_SKIP = {"script", "style", "noscript", "head", "template", "svg", "iframe"}
+_BLOCK = {
+    "address",
+    "article",
+    "aside",
+    "blockquote",
+    "dd",
+    "div",
+    "dl",
+    "dt",
+    "fieldset",
+    "figcaption",
+    "figure",
+    "footer",
+    "form",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "main",
+    "nav",
+    "ol",
+    "p",
+    "section",
+    "table",
+    "tr",
+    "ul",
+}
+_VOID_SKIP = {"meta", "link", "base", "input"}
+_SPACES = re.compile(r"[ \t\r\n\f\v]+")
+
+
+class TextRenderer(HTMLParser):
+    """Incrementally renders HTML into a lynx -dump style plain-text layout.
+
+    Feed it chunks as they arrive; completed lines are emitted through
+    `write`, so the whole document never needs to be held in memory.
+    """
+
+    def __init__(self, write):
+        super().__init__(convert_charrefs=True)
+        self._write = write
+        self._line = ""
+        self._blank = True
+        self._skip_depth = 0
+        self._pre_depth = 0
+        self._lists: list = []
+        self._indent = 0
+
+    def _flush_line(self):
+        line = self._line.rstrip()
+        self._line = ""
+        if line:
+            self._write(line + "\n")
+            self._blank = False
+
+    def _paragraph_break(self):
+        self._flush_line()
+        if not self._blank:
+            self._write("\n")
+            self._blank = True
+
+    def _append(self, text):
+        if not self._line:
+            text = text.lstrip()
+            if not text:
+                return
+            self._line = " " * self._indent
+        elif self._line.endswith(" ") and text.startswith(" "):
+            text = text[1:]
+        self._line += text
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP:
+            self._skip_depth += 1
+            return
+        if self._skip_depth or tag in _VOID_SKIP:
+            return
+        if tag == "br":
+            self._flush_line()
+        elif tag == "hr":
+            self._paragraph_break()
+            self._write(" " * self._indent + "_" * 40 + "\n\n")
+        elif tag == "pre":
+            self._paragraph_break()
+            self._pre_depth += 1
+        elif tag in ("ul", "ol"):
+            self._flush_line()
+            self._lists.append([tag, 0])
+            self._indent += 3
+        elif tag == "li":
+            self._flush_line()
+            marker = "*"
+            if self._lists and self._lists[-1][0] == "ol":
+                self._lists[-1][1] += 1
+                marker = f"{self._lists[-1][1]}."
+            self._line = " " * max(self._indent - 1, 0) + marker + " "
+        elif tag in ("td", "th"):
+            if self._line.strip():
+                self._line += " "
+        elif tag == "img":
+            alt = dict(attrs).get("alt")
+            if alt:
+                self._append(f"[{alt.strip()}]")
+        elif tag in _BLOCK:
+            self._paragraph_break()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+            return
+        if self._skip_depth:
+            return
+        if tag == "pre":
+            self._pre_depth = max(self._pre_depth - 1, 0)
+            self._paragraph_break()
+        elif tag in ("ul", "ol"):
+            if self._lists:
+                self._lists.pop()
+            self._indent = max(self._indent - 3, 0)
+            self._flush_line()
+            if not self._lists:
+                self._paragraph_break()
+        elif tag == "li":
+            self._flush_line()
+        elif tag in _BLOCK:
+            self._paragraph_break()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._pre_depth:
+            lines = data.split("\n")
+            for line in lines[:-1]:
+                self._line += line
+                self._write(self._line.rstrip() + "\n")
+                self._line = ""
+                self._blank = False
+            self._line += lines[-1]
+            return
+        text = _SPACES.sub(" ", data)
+        if text.strip() or self._line:
+            self._append(text)
+
+    def close(self):
+        super().close()
+        self._flush_line()
+
+
+def html_to_text(html: str) -> str:
+    parts: list = []
+    renderer = TextRenderer(parts.append)
+    renderer.feed(html)
+    renderer.close()
+    return "".join(parts).strip("\n") + "\n"
+
+
+def result_url(href: str) -> str:
+    """Resolve a search result link, unwrapping DuckDuckGo's `/l/?uddg=` redirect."""
+    if href.startswith("//"):
+        href = "https:" + href
+    parts = urlsplit(href)
+    if not parts.netloc or parts.netloc.endswith("duckduckgo.com"):
+        target = parse_qs(parts.query).get("uddg")
+        return target[0] if target else ""
+    return href if parts.scheme in ("http", "https") else ""
+
+
+class SearchResultParser(HTMLParser):
+    """Collects `{title, url, snippet}` records from a DuckDuckGo HTML results page.
+
+    Results are the `a.result__a` links and their `.result__snippet` text;
+    sponsored `.result--ad` blocks are skipped.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.results: list = []
+        self._ad = False
+        self._field = None
+        self._field_tag = None
+        self._field_depth = 0
+        self._text: list = []
+
+    def _begin(self, field, tag):
+        self._field = field
+        self._field_tag = tag
+        self._field_depth = 0
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self._field:
+            if tag == self._field_tag:
+                self._field_depth += 1
+            return
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if "result" in classes:
+            self._ad = "result--ad" in classes
+        elif self._ad:
+            return
+        elif "result__a" in classes:
+            url = result_url(attrs.get("href") or "")
+            if url:
+                self.results.append({"title": "", "url": url, "snippet": ""})
+                self._begin("title", tag)
+        elif "result__snippet" in classes and self.results:
+            if not self.results[-1]["snippet"]:
+                self._begin("snippet", tag)
+
+    def handle_endtag(self, tag):
+        if not self._field or tag != self._field_tag:
+            return
+        if self._field_depth:
+            self._field_depth -= 1
+            return
+        text = _SPACES.sub(" ", "".join(self._text)).strip()
+        self.results[-1][self._field] = text
+        self._field = None
+
+    def handle_data(self, data):
+        if self._field:
+            self._text.append(data)
+
+
+def parse_search_results(html: str, limit=None) -> list:
+    parser = SearchResultParser()
+    parser.feed(html)
+    parser.close()
+    results = []
+    seen = set()
+    for result in parser.results:
+        if result["title"] and result["url"] not in seen:
+            seen.add(result["url"])
+            results.append(result)
+    return results[:limit] if limit is not None else results
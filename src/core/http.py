@@ -0,0 +1,257 @@
+import codecs
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.message import Message
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from core import metrics
+
+USER_AGENT = "Mozilla/5.0 (compatible; autonomy-mcp/0.1; +lynx-like text fetcher)"
+DEFAULT_TIMEOUT = 20.0
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE = 10
+
+
+def content_charset(content_type: str, default: str = "utf-8") -> str:
+    message = Message()
+    message["content-type"] = content_type or "text/plain"
+    charset = message.get_param("charset")
+    if isinstance(charset, str):
+        try:
+            codecs.lookup(charset)
+            return charset
+        except LookupError:
+            pass
+    return default
+
+
+def media_type(content_type: str) -> str:
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+class HttpClient:
+    """Pooled HTTP client that keeps connections alive across requests.
+
+    `transport` is passed straight to httpx, so tests can serve requests
+    from an in-memory handler instead of the network.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive: int = MAX_KEEPALIVE,
+        transport=None,
+    ):
+        import httpx
+
+        self._client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+            ),
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+            transport=transport,
+        )
+
+    @contextmanager
+    def stream(self, url: str, headers=None, timeout=None):
+        """Open a streaming GET; use as a context manager."""
+        kwargs = {"headers": headers}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        host = urlsplit(url).netloc.lower()
+        with metrics.span("http", f"GET {host}", url=url) as span:
+            with self._client.stream("GET", url, **kwargs) as response:
+                span.set(status=response.status_code)
+                if response.status_code >= 400:
+                    span.error = True
+                try:
+                    yield response
+                finally:
+                    span.bytes = response.num_bytes_downloaded
+
+    def close(self):
+        self._client.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """Return the process-wide client shared by the browse tools."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def _cache_directives(headers) -> dict:
+    directives = {}
+    for part in headers.get("cache-control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def _freshness(headers, now: float) -> float:
+    """Seconds from `now` until a response stops being fresh."""
+    directives = _cache_directives(headers)
+    if "no-cache" in directives:
+        return 0
+    if "max-age" in directives:
+        try:
+            return max(0, int(directives["max-age"]) - int(headers.get("age", "0")))
+        except ValueError:
+            return 0
+    if "expires" in headers:
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+            return max(0, expires - now)
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+class CachedPage:
+    def __init__(
+        self,
+        url,
+        raw: bytes,
+        text: str,
+        headers,
+        fresh_until: float = 0,
+        truncated: bool = False,
+        stderr: str = "",
+    ):
+        self.url = url
+        self.raw = raw
+        self.text = text
+        self.etag = headers.get("etag")
+        self.last_modified = headers.get("last-modified")
+        self.fresh_until = fresh_until
+        self.truncated = truncated
+        self.stderr = stderr
+
+    @property
+    def size(self) -> int:
+        return len(self.raw) + len(self.text)
+
+    def validators(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """LRU cache of fetched pages that revalidates with ETag/Last-Modified.
+
+    Both the raw body and its rendered text are kept, bounded by total bytes.
+    Responses marked no-store, or larger than `max_page_bytes`, are never
+    stored.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        max_page_bytes: int = 4 * 1024 * 1024,
+        clock=time.time,
+    ):
+        self.max_bytes = max_bytes
+        self.max_page_bytes = max_page_bytes
+        self._clock = clock
+        self._pages: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, url):
+        """Return (page, fresh) for a cached URL, or (None, False)."""
+        with self._lock:
+            page = self._pages.get(url)
+            if page is None:
+                self.misses += 1
+                return None, False
+            self._pages.move_to_end(url)
+            fresh = page.fresh_until > self._clock()
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale += 1
+            return page, fresh
+
+    def store(
+        self, url, raw: bytes, text: str, headers, truncated=False, stderr=""
+    ) -> CachedPage:
+        """Cache a page if its headers allow it; the page is returned either way."""
+        now = self._clock()
+        page = CachedPage(
+            url,
+            raw,
+            text,
+            headers,
+            now + _freshness(headers, now),
+            truncated=truncated,
+            stderr=stderr,
+        )
+        directives = _cache_directives(headers)
+        if "no-store" in directives or len(raw) > self.max_page_bytes:
+            self.invalidate(url)
+            return page
+        with self._lock:
+            self._remove(url)
+            self._pages[url] = page
+            self._bytes += page.size
+            while self._bytes > self.max_bytes and len(self._pages) > 1:
+                _, evicted = self._pages.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+        return page
+
+    def refresh(self, page: CachedPage, headers):
+        """Record a 304 Not Modified: extend freshness and update validators."""
+        now = self._clock()
+        with self._lock:
+            page.fresh_until = now + _freshness(headers, now)
+            page.etag = headers.get("etag", page.etag)
+            page.last_modified = headers.get("last-modified", page.last_modified)
+            self.revalidated += 1
+
+    def _remove(self, url):
+        page = self._pages.pop(url, None)
+        if page is not None:
+            self._bytes -= page.size
+
+    def invalidate(self, url=None):
+        with self._lock:
+            if url is None:
+                self._pages.clear()
+                self._bytes = 0
+            else:
+                self._remove(url)
+
+    def stats(self) -> dict:
+        return {
+            "pages": len(self._pages),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale": self.stale,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+# Issues are re-synced at most this often unless a refresh is forced.
+REFRESH_INTERVAL = 60
+PAGE_SIZE = 100
+# Enough for tens of thousands of slimmed-down issue records.
+MAX_OUTPUT = 32 * 1024 * 1024
+INDEX_VERSION = 1
+
+# Keeps only the fields the index stores, one compact JSON object per line.
+_JQ = (
+    ".[] | {number, title, state, labels: [.labels[].name], "
+    "created_at, updated_at, pull_request: (.pull_request != null)}"
+)
+
+
+def git_dir_command() -> list:
+    return ["git", "rev-parse", "--absolute-git-dir"]
+
+
+def index_path(git_dir: str) -> str:
+    """Index location inside .git, where `git clean` won't remove it."""
+    return os.path.join(git_dir, "autonomy", "issues.json")
+
+
+def issues_command(since: Optional[str] = None) -> list:
+    query = (
+        "repos/{owner}/{repo}/issues"
+        f"?state=all&sort=updated&direction=asc&per_page={PAGE_SIZE}"
+    )
+    if since:
+        query += f"&since={since}"
+    return ["gh", "api", "--paginate", "--jq", _JQ, query]
+
+
+def parse_issues(output: str) -> list:
+    return [json.loads(line) for line in output.splitlines() if line.strip()]
+
+
+class IssueIndex:
+    """Issues of one repository, persisted as JSON and synced incrementally.
+
+    The first sync fetches every issue; later ones ask the API only for
+    issues updated since the newest `updated_at` already indexed.
+    """
+
+    def __init__(self, path: str, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self.issues: dict = {}
+        self.synced_at: Optional[str] = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        self.issues = {issue["number"]: issue for issue in data["issues"]}
+        self.synced_at = data.get("synced_at")
+        self.checked_at = data.get("checked_at", 0.0)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {
+            "version": INDEX_VERSION,
+            "synced_at": self.synced_at,
+            "checked_at": self.checked_at,
+            "issues": sorted(self.issues.values(), key=lambda i: i["number"]),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def is_fresh(self, max_age: float = REFRESH_INTERVAL) -> bool:
+        return self.synced_at is not None and self._clock() - self.checked_at < max_age
+
+    def merge(self, issues: list, full: bool = False):
+        """Apply fetched issues; a full sync also drops issues no longer listed."""
+        if full:
+            self.issues = {}
+        for issue in issues:
+            if issue.get("pull_request"):
+                # The issues API lists pull requests too.
+                self.issues.pop(issue["number"], None)
+                continue
+            self.issues[issue["number"]] = {
+                "number": issue["number"],
+                "title": issue["title"],
+                "state": issue["state"],
+                "labels": issue["labels"],
+                "createdAt": issue["created_at"],
+                "updatedAt": issue["updated_at"],
+            }
+            if self.synced_at is None or issue["updated_at"] > self.synced_at:
+                self.synced_at = issue["updated_at"]
+        if full and self.synced_at is None:
+            # An empty repository still counts as synced.
+            self.synced_at = ""
+        self.checked_at = self._clock()
+
+    def query(
+        self, state: str = "open", labels=None, offset: int = 0, limit: int = 100
+    ) -> dict:
+        """Filter by state ("open", "closed" or "all") and labels, newest first."""
+        wanted = {label.lower() for label in labels or []}
+        matches = [
+            issue
+            for issue in sorted(
+                self.issues.values(), key=lambda i: i["number"], reverse=True
+            )
+            if (state == "all" or issue["state"] == state)
+            and wanted <= {label.lower() for label in issue["labels"]}
+        ]
+        offset = max(offset, 0)
+        end = offset + max(limit, 1)
+        return {
+            "issues": matches[offset:end],
+            "total": len(matches),
+            "next_offset": end if end < len(matches) else None,
+            "synced_at": self.synced_at or None,
+        }
+
+
+async def sync(index: IssueIndex, capture, force: bool = False):
+    """Bring the index up to date unless it was synced recently."""
+    if not force and index.is_fresh():
+        return
+    since = None if force else index.synced_at or None
+    result = await capture(issues_command(since), max_output=MAX_OUTPUT)
+    if result.truncated:
+        raise RuntimeError("Issue listing exceeded the output limit")
+    with index.lock:
+        index.merge(parse_issues(result.stdout), full=since is None)
+        index.save()
+
+
+_indexes: dict = {}
+_indexes_lock = threading.Lock()
+
+
+async def get_index(project_dir: str, capture) -> IssueIndex:
+    with _indexes_lock:
+        index = _indexes.get(project_dir)
+    if index is None:
+        result = await capture(git_dir_command())
+        index = IssueIndex(index_path(result.stdout.strip()))
+        with _indexes_lock:
+            index = _indexes.setdefault(project_dir, index)
+    return index
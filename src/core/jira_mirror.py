@@ -0,0 +1,341 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger("jira")
+
+# Reads are served locally only after a sync no older than this.
+SYNC_INTERVAL = 60
+SYNC_PAGE_SIZE = 100
+SYNC_FIELDS = "summary,description,status,issuetype,comment,parent"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    key TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT '',
+    issue_type TEXT NOT NULL DEFAULT '',
+    epic TEXT,
+    comments TEXT NOT NULL DEFAULT '[]',
+    complete INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS issues_epic ON issues (epic);
+CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts USING fts5(
+    key UNINDEXED, summary, description, comments,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS projects (project TEXT PRIMARY KEY, synced_at REAL);
+CREATE TABLE IF NOT EXISTS epics (epic TEXT PRIMARY KEY, listed_at REAL);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def default_path(jira_url: str) -> str:
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    digest = hashlib.sha1(jira_url.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_home, "autonomy", f"jira-{digest}.sqlite3")
+
+
+def _fts_query(text: str) -> str:
+    """Quote each word so user input can't be read as FTS5 query syntax."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def _key_order(key: str):
+    project, _, number = key.rpartition("-")
+    return (project, int(number) if number.isdigit() else 0)
+
+
+class JiraMirror:
+    """SQLite copy of the Jira issues this server has read, with FTS5 search.
+
+    Issues enter the mirror as tools fetch them. sync() then pulls every
+    issue of those projects updated since the last sync, so a mirrored
+    issue can be served locally as long as the mirror was synced recently.
+    Tools start syncs with sync_in_background() and keep serving the last
+    synced state meanwhile, so a long catch-up never holds up a read.
+    """
+
+    def __init__(self, path: str, clock=time.time):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # The mirror can always be rebuilt from Jira, so durability is traded
+        # for cheaper commits.
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._clock = clock
+        self._sync_pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="jira-mirror"
+        )
+        self._pending: Optional[Future] = None
+        self.sync_failed = False
+
+    def _meta(self, name: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,))
+        found = row.fetchone()
+        return found[0] if found else None
+
+    def _write(self, key, project, columns: dict, epic_known=False):
+        """Insert or update one issue and its full-text row.
+
+        Callers hold the lock and a transaction, so a batch commits once.
+        """
+        self._db.execute(
+            "INSERT OR IGNORE INTO issues (key, project) VALUES (?, ?)",
+            (key, project),
+        )
+        if not epic_known:
+            columns.pop("epic", None)
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        self._db.execute(
+            f"UPDATE issues SET {assignments} WHERE key = ?",
+            (*columns.values(), key),
+        )
+        self._db.execute(
+            "INSERT OR IGNORE INTO projects VALUES (?, ?)",
+            (project, self._clock()),
+        )
+        row = self._db.execute(
+            "SELECT summary, description, comments FROM issues WHERE key = ?",
+            (key,),
+        ).fetchone()
+        comments = " ".join(c["body"] or "" for c in json.loads(row[2]))
+        self._db.execute("DELETE FROM issues_fts WHERE key = ?", (key,))
+        self._db.execute(
+            "INSERT INTO issues_fts VALUES (?, ?, ?, ?)",
+            (key, row[0], row[1], comments),
+        )
+
+    def _write_story(self, key: str, issue: dict, comments: list, complete: bool):
+        fields = issue["fields"]
+        self._write(
+            key,
+            key.rpartition("-")[0],
+            {
+                "summary": fields["summary"] or "",
+                "description": fields.get("description") or "",
+                "status": fields["status"]["name"],
+                "issue_type": fields["issuetype"]["name"],
+                "comments": json.dumps(comments),
+                "complete": int(complete),
+            },
+        )
+
+    def store_story(self, key: str, issue: dict, comments: list, complete=True):
+        self.store_stories([(key, issue, comments)], complete)
+
+    def store_stories(self, stories: list, complete=True):
+        """Store (key, issue, comments) tuples in a single transaction."""
+        with self._lock, self._db:
+            for key, issue, comments in stories:
+                self._write_story(key, issue, comments, complete)
+
+    def store_summaries(self, epic_key: str, stories: list):
+        """Record a complete listing of an epic's stories."""
+        with self._lock, self._db:
+            for story in stories:
+                self._write(
+                    story["key"],
+                    story["key"].rpartition("-")[0],
+                    {
+                        "summary": story["title"],
+                        "status": story["status"],
+                        "issue_type": story["issue_type"],
+                        "epic": epic_key,
+                    },
+                    epic_known=True,
+                )
+            if self._meta("epic_field") is not None:
+                # Membership can only be kept current by sync() when it knows
+                # which field holds the epic link.
+                self._db.execute(
+                    "INSERT OR REPLACE INTO epics VALUES (?, ?)",
+                    (epic_key, self._clock()),
+                )
+
+    def story(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary, description, status, issue_type, comments"
+                " FROM issues WHERE key = ? AND complete = 1",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "success": True,
+            "key": key,
+            "title": row[0],
+            "description": row[1],
+            "status": row[2],
+            "issue_type": row[3],
+            "comments": json.loads(row[4]),
+        }
+
+    def epic_stories(self, epic_key: str) -> Optional[list]:
+        """The epic's stories, or None if the epic was never fully listed."""
+        with self._lock:
+            listed = self._db.execute(
+                "SELECT 1 FROM epics WHERE epic = ?", (epic_key,)
+            ).fetchone()
+            if listed is None:
+                return None
+            rows = self._db.execute(
+                "SELECT key, summary, status, issue_type FROM issues WHERE epic = ?",
+                (epic_key,),
+            ).fetchall()
+        stories = [
+            {"key": key, "title": title, "status": status, "issue_type": kind}
+            for key, title, status, kind in rows
+        ]
+        return sorted(stories, key=lambda story: _key_order(story["key"]))
+
+    def search(self, query: str, limit: int = 20) -> list:
+        if not query.strip():
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT f.key, i.summary, i.status, i.issue_type,"
+                " snippet(issues_fts, -1, '[', ']', '...', 16)"
+                " FROM issues_fts f JOIN issues i ON i.key = f.key"
+                " WHERE issues_fts MATCH ? ORDER BY bm25(issues_fts) LIMIT ?",
+                (_fts_query(query), limit),
+            ).fetchall()
+        return [
+            {
+                "key": key,
+                "title": title,
+                "status": status,
+                "issue_type": kind,
+                "snippet": snippet,
+            }
+            for key, title, status, kind, snippet in rows
+        ]
+
+    def epic_field(self, jira) -> str:
+        """Id of the "Epic Link" custom field, or "" if the server has none."""
+        field = self._meta("epic_field")
+        if field is None:
+            names = {f.get("name"): f.get("id") for f in jira.get("rest/api/2/field")}
+            field = names.get("Epic Link") or ""
+            with self._lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('epic_field', ?)", (field,)
+                )
+        return field
+
+    def _store_synced(self, issue: dict, epic_field: str):
+        fields = issue["fields"]
+        comments = fields.get("comment") or {}
+        comment_list = [
+            {
+                "author": comment["author"]["displayName"],
+                "created": comment["created"],
+                "body": comment["body"],
+            }
+            for comment in comments.get("comments", [])
+        ]
+        epic = fields.get(epic_field) if epic_field else None
+        parent = fields.get("parent") or {}
+        parent_type = parent.get("fields", {}).get("issuetype", {}).get("name")
+        if epic is None and parent_type == "Epic":
+            epic = parent["key"]
+        self._write_story(
+            issue["key"],
+            issue,
+            comment_list,
+            complete=comments.get("total", 0) <= len(comment_list),
+        )
+        if epic_field:
+            self._db.execute(
+                "UPDATE issues SET epic = ? WHERE key = ?", (epic, issue["key"])
+            )
+
+    def sync_due(self) -> bool:
+        now = self._clock()
+        with self._lock:
+            row = self._db.execute("SELECT min(synced_at) FROM projects").fetchone()
+        return row[0] is not None and now - row[0] >= SYNC_INTERVAL
+
+    def sync_in_background(self, jira) -> Future:
+        """Start sync() on the mirror's own thread, unless one is running."""
+        with self._lock:
+            if self._pending is None or self._pending.done():
+                self._pending = self._sync_pool.submit(self._background_sync, jira)
+            return self._pending
+
+    def _background_sync(self, jira) -> int:
+        try:
+            received = self.sync(jira)
+        except Exception as e:
+            self.sync_failed = True
+            logger.warning(f"Jira mirror sync failed: {e}")
+            raise
+        self.sync_failed = False
+        return received
+
+    def sync(self, jira, force=False) -> int:
+        """Pull issues updated since the last sync; returns how many arrived."""
+        with self._sync_lock:
+            epic_field = self.epic_field(jira)
+            now = self._clock()
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT project, synced_at FROM projects"
+                ).fetchall()
+            due = [(p, at) for p, at in rows if force or now - at >= SYNC_INTERVAL]
+            if not due:
+                return 0
+            # A relative bound avoids converting to the Jira user's timezone;
+            # the extra minute covers clock skew and JQL's minute precision.
+            minutes = math.ceil((now - min(at for _, at in due)) / 60) + 1
+            projects = ", ".join(f'"{project}"' for project, _ in due)
+            jql = (
+                f'project in ({projects}) AND updated >= "-{minutes}m"'
+                " ORDER BY updated ASC"
+            )
+            fields = SYNC_FIELDS + (f",{epic_field}" if epic_field else "")
+            start = received = 0
+            while True:
+                page = jira.jql(jql, fields=fields, start=start, limit=SYNC_PAGE_SIZE)
+                issues = page.get("issues", [])
+                with self._lock, self._db:
+                    for issue in issues:
+                        self._store_synced(issue, epic_field)
+                received += len(issues)
+                start += len(issues)
+                if not issues or start >= page.get("total", 0):
+                    break
+            with self._lock, self._db:
+                self._db.executemany(
+                    "UPDATE projects SET synced_at = ? WHERE project = ?",
+                    [(now, project) for project, _ in due],
+                )
+            return received
+
+    def stats(self) -> dict:
+        with self._lock:
+            issues, complete = self._db.execute(
+                "SELECT count(*), coalesce(sum(complete), 0) FROM issues"
+            ).fetchone()
+            projects = self._db.execute(
+                "SELECT project, synced_at FROM projects"
+            ).fetchall()
+        return {
+            "issues": issues,
+            "complete": complete,
+            "projects": {project: synced_at for project, synced_at in projects},
+        }
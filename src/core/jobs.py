@@ -0,0 +1,175 @@
+import asyncio
+import atexit
+import concurrent.futures
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from core import metrics
+
+# wait() polls job state starting at POLL_INTERVAL seconds, doubling up to
+# MAX_POLL_INTERVAL.
+POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 5.0
+# Finished jobs are kept for status queries until this many have piled up.
+MAX_FINISHED = 100
+SHUTDOWN_TIMEOUT = 5.0
+
+
+class JobError(Exception):
+    """Fails a job with a message while still reporting a structured result."""
+
+    def __init__(self, message: str, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+class Job:
+    def __init__(self, kind: str, key=None, info=None):
+        self.id = secrets.token_hex(4)
+        self.kind = kind
+        self.key = key
+        self.info = info or {}
+        self.status = "running"
+        self.result = None
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.future: Optional[concurrent.futures.Future] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            **self.info,
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_s": round(end - self.started_at, 1),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Runs coroutines as tracked background jobs on a dedicated event loop.
+
+    Jobs outlive the tool call that started them, so long waits such as CI
+    checks don't hold up the server; callers get a Job id to poll instead.
+    """
+
+    def __init__(self, max_finished: int = MAX_FINISHED):
+        self.max_finished = max_finished
+        self._jobs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="jobs", daemon=True
+                ).start()
+                atexit.register(self.shutdown)
+            return self._loop
+
+    def start(self, kind: str, factory, key=None, **info) -> Job:
+        """Run the coroutine returned by `factory()` in the background.
+
+        While a job with the same `key` is still running, that job is returned
+        instead of starting a duplicate.
+        """
+        with self._lock:
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and not job.done:
+                        return job
+            job = Job(kind, key, info)
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = asyncio.run_coroutine_threadsafe(
+            self._run(job, factory), self._get_loop()
+        )
+        return job
+
+    async def _run(self, job: Job, factory):
+        status, result, error = "failed", None, None
+        with metrics.span("job", job.kind, job=job.id, **job.info) as span:
+            try:
+                result = await factory()
+                status = "succeeded"
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            except JobError as e:
+                result, error = e.result, str(e)
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            finally:
+                span.error = status != "succeeded"
+                job.result, job.error = result, error
+                job.finished_at = time.time()
+                job.status = status
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+    async def wait(self, job: Job, timeout: float, sleep=asyncio.sleep) -> Job:
+        """Poll until `job` finishes or `timeout` seconds pass, backing off."""
+        deadline = time.monotonic() + timeout
+        interval = POLL_INTERVAL
+        while not job.done:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await sleep(min(interval, remaining))
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job.done or job.future is None:
+            return False
+        return job.future.cancel()
+
+    def shutdown(self):
+        """Cancel running jobs, letting them kill their subprocesses, and stop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        async def cancel_all():
+            this = asyncio.current_task()
+            tasks = [task for task in asyncio.all_tasks() if task is not this]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_all(), loop).result(
+                SHUTDOWN_TIMEOUT
+            )
+        except concurrent.futures.TimeoutError:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+
+
+manager = JobManager()
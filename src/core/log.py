@@ -0,0 +1,6 @@
+import logging
+
+
+def configure_logging(level=logging.INFO):
+    """Set up root logging once, from the process entry point."""
+    logging.basicConfig(level=level, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -0,0 +1,308 @@
+import contextvars
+import functools
+import inspect
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, TextIO
+
+# Upper bounds, in milliseconds, of the latency histogram buckets. Anything
+# slower lands in a final overflow bucket.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 120000)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+
+class Histogram:
+    """Latency histogram with call, error and byte counters for one operation."""
+
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float, error=False, size=0):
+        index = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if duration_ms <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.errors += 1 if error else 0
+        self.bytes += size
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(float(bound), self.max_ms)
+        return self.max_ms
+
+    def snapshot(self) -> dict:
+        labels = [f"le_{bound}ms" for bound in self.bounds] + ["overflow"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "total_ms": round(self.total_ms, 1),
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5), 1),
+            "p95_ms": round(self.quantile(0.95), 1),
+            "max_ms": round(self.max_ms, 1),
+            "buckets": {
+                label: count for label, count in zip(labels, self.buckets) if count
+            },
+        }
+
+
+class Registry:
+    """Thread-safe collection of histograms keyed by (kind, name)."""
+
+    def __init__(self):
+        self._series: dict = {}
+        self._gauges: dict = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def add_gauge(self, name: str, read):
+        """Include read()'s current value in every snapshot under `gauges`."""
+        with self._lock:
+            self._gauges[name] = read
+
+    def observe(self, kind: str, name: str, duration_ms: float, error=False, size=0):
+        with self._lock:
+            series = self._series.get((kind, name))
+            if series is None:
+                series = self._series[(kind, name)] = Histogram()
+            series.observe(duration_ms, error, size)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot: dict = {
+                "since": self.started_at,
+                "uptime_s": round(time.time() - self.started_at, 1),
+            }
+            for (kind, name), series in sorted(self._series.items()):
+                snapshot.setdefault(kind, {})[name] = series.snapshot()
+            gauges = dict(self._gauges)
+        if gauges:
+            snapshot["gauges"] = {name: read() for name, read in gauges.items()}
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.started_at = time.time()
+
+
+class Tracer:
+    """Appends finished spans to a JSONL file, one object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+registry = Registry()
+_tracer = None
+
+
+def set_trace_file(path=None):
+    """Start writing spans to `path`, or stop tracing when it is None."""
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(path) if path else None
+
+
+class Span:
+    def __init__(self, kind: str, name: str, parent, attrs: dict):
+        self.id = secrets.token_hex(8)
+        self.trace_id = parent.trace_id if parent is not None else self.id
+        self.parent_id = parent.id if parent is not None else None
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+        self.error = False
+        self.bytes = 0
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def fail(self, reason):
+        self.error = True
+        self.attrs["error"] = str(reason)[:500]
+
+
+def _finish(span: Span):
+    duration_ms = (time.perf_counter() - span._started) * 1000
+    registry.observe(span.kind, span.name, duration_ms, span.error, span.bytes)
+    tracer = _tracer
+    if tracer is not None:
+        tracer.write(
+            {
+                "trace": span.trace_id,
+                "span": span.id,
+                "parent": span.parent_id,
+                "kind": span.kind,
+                "name": span.name,
+                "start": span.started_at,
+                "duration_ms": round(duration_ms, 3),
+                "error": span.error,
+                "bytes": span.bytes,
+                **span.attrs,
+            }
+        )
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    """Time the enclosed block, nested under whichever span is current."""
+    current = Span(kind, name, _current.get(), attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(str(e) or type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        _finish(current)
+
+
+def propagate(fn):
+    """Wrap fn so spans it opens on a pool thread nest under the current span."""
+    parent = _current.get()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+def command_name(cmd) -> str:
+    """Short metric name for a command line, e.g. `git push` or `gh pr checks`."""
+    words = [str(word) for word in cmd]
+    depth = 2 if words[0] == "gh" else 1
+    name = words[:1]
+    skip = False
+    for word in words[1:]:
+        if len(name) > depth:
+            break
+        if skip:
+            skip = False
+        elif word in ("-c", "-C"):
+            skip = True
+        elif not word.startswith("-"):
+            name.append(word)
+    return " ".join(name)
+
+
+def _is_error(result) -> bool:
+    if isinstance(result, dict):
+        return result.get("success") is False or "error" in result
+    if isinstance(result, str):
+        return result.startswith(('{"error"', "Error:"))
+    return False
+
+
+def _size(result) -> int:
+    if isinstance(result, str):
+        return len(result.encode("utf-8"))
+    return len(json.dumps(result, default=str).encode("utf-8"))
+
+
+def _record(current: Span, result):
+    current.bytes = _size(result)
+    if _is_error(result):
+        current.error = True
+
+
+def traced_tool(fn, name: str):
+    """Wrap a tool function so each call records a `tool` span."""
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with span("tool", name) as current:
+                result = await fn(*args, **kwargs)
+                _record(current, result)
+                return result
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span("tool", name) as current:
+            result = fn(*args, **kwargs)
+            _record(current, result)
+            return result
+
+    return wrapper
+
+
+def instrument(mcp, trace_file=None):
+    """Record a span for every tool registered on `mcp` from here on.
+
+    Also registers the `metrics__snapshot` tool on the server.
+    """
+    register = mcp.tool
+
+    def tool(name=None, **kwargs):
+        decorator = register(name, **kwargs)
+
+        def wrap(fn):
+            decorator(traced_tool(fn, name or fn.__name__))
+            return fn
+
+        return wrap
+
+    mcp.tool = tool
+    if trace_file:
+        set_trace_file(trace_file)
+
+    @register()
+    def metrics__snapshot(reset: bool = False) -> dict:
+        """Report latency histograms, call/error counts and bytes per tool, command and HTTP host, plus request queue gauges."""
+        snapshot = registry.snapshot()
+        if reset:
+            registry.reset()
+        return snapshot
+
+    return mcp
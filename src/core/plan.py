@@ -0,0 +1,116 @@
+import asyncio
+import subprocess
+import time
+
+
+class Step:
+    def __init__(
+        self, name: str, cmd, after=(), mutates=False, check=True, timeout=None
+    ):
+        self.name = name
+        self.cmd = cmd
+        self.after = tuple(after)
+        self.mutates = mutates
+        self.check = check
+        self.timeout = timeout
+
+
+class Plan:
+    """A set of commands with dependencies, run as one unit by run_plan.
+
+    A step's `cmd` is either an argument list or a callable that builds one
+    from the stripped stdout of earlier steps, keyed by step name. Steps that
+    `mutate` the repository are only listed, not run, in a dry run.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.steps: dict = {}
+
+    def step(self, name: str, cmd, after=(), mutates=False, check=True, timeout=None):
+        unknown = [dep for dep in after if dep not in self.steps]
+        if unknown or name in self.steps:
+            raise ValueError(f"Step {name!r} must be new and follow {after!r}")
+        self.steps[name] = Step(name, cmd, after, mutates, check, timeout)
+        return self
+
+
+class PlanResult:
+    def __init__(self, name: str, dry_run: bool, steps: list, outputs: dict, elapsed):
+        self.name = name
+        self.dry_run = dry_run
+        self.steps = steps
+        self.outputs = outputs
+        self.elapsed_ms = elapsed * 1000
+
+    @property
+    def success(self) -> bool:
+        return all(step["status"] in ("ok", "planned") for step in self.steps)
+
+    @property
+    def error(self):
+        for step in self.steps:
+            if step["status"] == "failed":
+                return f"{step['name']} failed: {step.get('error', '')}".strip()
+        return None
+
+    def report(self) -> dict:
+        return {
+            "plan": self.name,
+            "success": self.success,
+            "dry_run": self.dry_run,
+            "error": self.error,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "steps": self.steps,
+        }
+
+
+async def run_plan(plan: Plan, capture, dry_run=False, clock=time.perf_counter):
+    """Run every step as soon as the steps it comes after have succeeded.
+
+    Independent steps overlap. When a step fails, the steps after it are
+    skipped while unrelated branches of the plan still finish.
+    """
+    started = clock()
+    outputs: dict = {}
+    reports = {name: {"name": name, "status": "pending"} for name in plan.steps}
+    tasks: dict = {}
+
+    async def run_step(step: Step) -> bool:
+        report = reports[step.name]
+        for dep in step.after:
+            if not await tasks[dep]:
+                report["status"] = "skipped"
+                return False
+        step_started = clock()
+        try:
+            cmd = step.cmd(outputs) if callable(step.cmd) else step.cmd
+            report["cmd"] = cmd
+            if dry_run and step.mutates:
+                report["status"] = "planned"
+                outputs[step.name] = ""
+                return True
+            kwargs = {"timeout": step.timeout} if step.timeout else {}
+            result = await capture(cmd, **kwargs)
+            outputs[step.name] = result.stdout.strip()
+            report["status"] = "ok"
+        except subprocess.CalledProcessError as e:
+            outputs[step.name] = (e.stdout or "").strip()
+            report["returncode"] = e.returncode
+            if step.check:
+                report["status"] = "failed"
+                report["error"] = (e.stderr or e.stdout or "").strip()[-2000:]
+            else:
+                report["status"] = "ok"
+        except Exception as e:
+            report["status"] = "failed"
+            report["error"] = str(e) or type(e).__name__
+        report["duration_ms"] = round((clock() - step_started) * 1000, 1)
+        return report["status"] == "ok"
+
+    for step in plan.steps.values():
+        tasks[step.name] = asyncio.ensure_future(run_step(step))
+    await asyncio.gather(*tasks.values())
+    return PlanResult(
+        plan.name, dry_run, list(reports.values()), outputs, clock() - started
+    )
@@ -0,0 +1,100 @@
+import asyncio
+import subprocess
+from typing import Optional
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BoundedBuffer:
+    """Accumulates stream output, keeping at most `limit` bytes in memory."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._chunks: list = []
+        self._size = 0
+        self.dropped = 0
+
+    def write(self, chunk: bytes):
+        room = self.limit - self._size
+        if room > 0:
+            kept = chunk[:room]
+            self._chunks.append(kept)
+            self._size += len(kept)
+        self.dropped += max(0, len(chunk) - max(room, 0))
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped > 0
+
+    def getvalue(self) -> str:
+        return b"".join(self._chunks).decode("utf-8", errors="replace")
+
+
+class ProcessResult:
+    def __init__(self, args, returncode, stdout, stderr, truncated=False):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.truncated = truncated
+
+
+async def _pump(stream, buffer: BoundedBuffer):
+    while True:
+        chunk = await stream.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        buffer.write(chunk)
+
+
+async def _terminate(proc):
+    if proc.returncode is None:
+        proc.kill()
+        await proc.wait()
+
+
+async def run_process(
+    cmd,
+    cwd=None,
+    timeout: Optional[float] = None,
+    max_output: int = 50000,
+    env=None,
+) -> ProcessResult:
+    """Run `cmd` without blocking the event loop.
+
+    stdout and stderr are streamed into bounded buffers, so a chatty command
+    cannot grow memory past `max_output` bytes per stream. On timeout or
+    cancellation the process is killed before the exception propagates.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+    )
+    stdout = BoundedBuffer(max_output)
+    stderr = BoundedBuffer(max_output)
+    pumps = asyncio.gather(
+        _pump(proc.stdout, stdout), _pump(proc.stderr, stderr), proc.wait()
+    )
+    try:
+        await asyncio.wait_for(pumps, timeout)
+    except asyncio.TimeoutError:
+        await _terminate(proc)
+        if timeout is None:
+            raise
+        raise subprocess.TimeoutExpired(
+            cmd, timeout, output=stdout.getvalue(), stderr=stderr.getvalue()
+        )
+    except asyncio.CancelledError:
+        await _terminate(proc)
+        raise
+    return ProcessResult(
+        cmd,
+        proc.returncode,
+        stdout.getvalue(),
+        stderr.getvalue(),
+        truncated=stdout.truncated or stderr.truncated,
+    )
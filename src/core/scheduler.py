@@ -0,0 +1,335 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from core import metrics
+
+MAX_RETRIES = 4
+BASE_DELAY = 0.5
+# A server asking us to wait longer than this gets its error passed through.
+MAX_DELAY = 60
+
+
+class RateLimited(Exception):
+    """Raised by a scheduled call when the backend asks us to slow down.
+
+    `result` is what the call would have returned, handed back to the
+    caller once retries are exhausted.
+    """
+
+    def __init__(self, message: str, retry_after=None, result=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.result = result
+
+
+class _LeaderCancelled(Exception):
+    """The call a waiter joined was cancelled; the waiter runs its own."""
+
+
+def parse_retry_after(value, now=None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when - (time.time() if now is None else now))
+
+
+class TokenBucket:
+    """Hands out `rate` tokens per second, allowing bursts of `burst`.
+
+    reserve() takes a token immediately and returns how long the caller must
+    wait before using it, so threads and coroutines can wait their own way.
+    Given a `limit`, it takes no token and returns None if the wait would be
+    longer, so a caller that gives up doesn't push back the ones behind it.
+    """
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, limit: Optional[float] = None) -> Optional[float]:
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            tokens = self._tokens - 1
+            wait = -tokens / self.rate if tokens < 0 else 0.0
+            wait = max(wait, self._paused_until - now)
+            if limit is not None and wait > limit:
+                return None
+            self._tokens = tokens
+            return wait
+
+    def pause(self, seconds: float):
+        """Hold back every caller, e.g. after the server sent Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+class Backend:
+    """Rate limiting, retries and in-flight deduplication for one backend.
+
+    Calls sharing a `key` while one of them is running wait for and share
+    its result instead of repeating the request. Calls with key None are
+    never merged; use that for anything with side effects. A call given a
+    `timeout` gives up rather than wait for the limiter, a retry or a shared
+    call past it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        max_retries: int = MAX_RETRIES,
+        base_delay: float = BASE_DELAY,
+        max_delay: float = MAX_DELAY,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        jitter=random.random,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst, clock)
+        self._clock = clock
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._jitter = jitter
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    def _join(self, key):
+        """Return (future, leader) for key, registering a new call if needed."""
+        with self._lock:
+            self.calls += 1
+            if key is not None and key in self._inflight:
+                self.coalesced += 1
+                return self._inflight[key], False
+            future = Future()
+            if key is not None:
+                self._inflight[key] = future
+            return future, True
+
+    def _done(self, key, future, result=None, error=None):
+        with self._lock:
+            if key is not None:
+                self._inflight.pop(key, None)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _deadline(self, timeout) -> Optional[float]:
+        return None if timeout is None else self._clock() + timeout
+
+    def _past(self, deadline, seconds: float) -> bool:
+        return deadline is not None and self._clock() + seconds > deadline
+
+    def _delay(self, attempt: int, error: RateLimited, deadline) -> Optional[float]:
+        """Seconds before the next attempt, or None to give up."""
+        with self._lock:
+            self.rate_limited += 1
+        if attempt >= self.max_retries:
+            return None
+        backoff = min(self.max_delay, self.base_delay * 2**attempt)
+        if error.retry_after is not None:
+            if error.retry_after > self.max_delay:
+                return None
+            # Spread out the callers that were all told the same time.
+            delay = error.retry_after + self._jitter() * self.base_delay
+        else:
+            delay = self._jitter() * backoff
+        if self._past(deadline, delay):
+            return None
+        self.bucket.pause(delay)
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def _start_wait(self, seconds: float):
+        with self._lock:
+            self.waiting += 1
+            self.wait_s += seconds
+            self.max_wait_s = max(self.max_wait_s, seconds)
+        metrics.registry.observe("queue", self.name, seconds * 1000)
+
+    def _end_wait(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def _running(self, delta: int):
+        with self._lock:
+            self.running += delta
+
+    def _remaining(self, deadline) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - self._clock())
+
+    def _reserve(self, deadline, error) -> float:
+        """Take a token; raise instead if waiting for it would pass the deadline."""
+        wait = self.bucket.reserve(self._remaining(deadline))
+        if wait is None:
+            raise RateLimited(
+                f"{self.name}: waiting for the rate limit would pass the timeout",
+                result=error.result if error is not None else None,
+            )
+        return wait
+
+    def _run(self, fn, deadline=None):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(deadline, error)
+            if wait > 0:
+                self._start_wait(wait)
+                try:
+                    self._sleep(wait)
+                finally:
+                    self._end_wait()
+            self._running(1)
+            try:
+                return fn()
+            except RateLimited as e:
+                if self._delay(attempt, e, deadline) is None:
+                    raise
+                error = e
+            finally:
+                self._running(-1)
+
+    async def _run_async(self, fn, deadline=None):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(deadline, error)
+            if wait > 0:
+                self._start_wait(wait)
+                try:
+                    await asyncio.sleep(wait)
+                finally:
+                    self._end_wait()
+            self._running(1)
+            try:
+                return await fn()
+            except RateLimited as e:
+                if self._delay(attempt, e, deadline) is None:
+                    raise
+                error = e
+            finally:
+                self._running(-1)
+
+    def _gave_up_waiting(self) -> TimeoutError:
+        return TimeoutError(f"{self.name}: timed out waiting for an identical call")
+
+    def call(self, fn, key=None, timeout=None):
+        """Run fn() under this backend's limits, from a thread."""
+        deadline = self._deadline(timeout)
+        future, leader = self._join(key)
+        while not leader:
+            try:
+                return future.result(timeout=self._remaining(deadline))
+            except _LeaderCancelled:
+                future, leader = self._join(key)
+            except TimeoutError:
+                if future.done():
+                    raise
+                raise self._gave_up_waiting() from None
+        try:
+            result = self._run(fn, deadline)
+        except BaseException as e:
+            self._done(key, future, error=e)
+            raise
+        self._done(key, future, result)
+        return result
+
+    async def call_async(self, fn, key=None, timeout=None):
+        """Await fn() under this backend's limits, from any event loop."""
+        deadline = self._deadline(timeout)
+        future, leader = self._join(key)
+        while not leader:
+            try:
+                # Shielded so a waiter that is cancelled, or times out, leaves
+                # the shared call, and everyone else waiting on it, alone.
+                return await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)),
+                    self._remaining(deadline),
+                )
+            except _LeaderCancelled:
+                future, leader = self._join(key)
+            except TimeoutError:
+                if future.done():
+                    raise
+                raise self._gave_up_waiting() from None
+        try:
+            result = await self._run_async(fn, deadline)
+        except asyncio.CancelledError:
+            # Waiters run the call themselves rather than inherit this.
+            self._done(key, future, error=_LeaderCancelled())
+            raise
+        except BaseException as e:
+            self._done(key, future, error=e)
+            raise
+        self._done(key, future, result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self.waiting,
+                "running": self.running,
+                "in_flight_keys": len(self._inflight),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "wait_s": round(self.wait_s, 3),
+                "max_wait_s": round(self.max_wait_s, 3),
+                "rate": self.bucket.rate,
+                "burst": self.bucket.burst,
+            }
+
+
+_backends: dict = {}
+_backends_lock = threading.Lock()
+
+
+def backend(name: str, rate: float, burst: float) -> Backend:
+    """Return the process-wide scheduler for a backend, creating it once."""
+    with _backends_lock:
+        found = _backends.get(name)
+        if found is None:
+            found = _backends[name] = Backend(name, rate, burst)
+        return found
+
+
+def stats() -> dict:
+    with _backends_lock:
+        backends = list(_backends.values())
+    return {b.name: b.stats() for b in backends}
+
+
+metrics.registry.add_gauge("scheduler", stats)
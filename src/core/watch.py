@@ -0,0 +1,463 @@
+import atexit
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import subprocess
+import threading
+import time
+from typing import Optional
+from core import metrics
+
+logger = logging.getLogger("watch")
+
+# Quiet time after the last event before a burst of writes is processed.
+DEBOUNCE = 0.2
+
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+)
+_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal non-blocking inotify binding over libc, for Linux."""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read(self) -> list:
+        events: list = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _git_dir(project_dir: str) -> Optional[str]:
+    path = os.path.join(project_dir, ".git")
+    if os.path.isdir(path):
+        return path
+    try:
+        with open(path, encoding="utf-8") as f:
+            line = f.readline().strip()
+    except OSError:
+        return None
+    if line.startswith("gitdir: "):
+        return os.path.normpath(os.path.join(project_dir, line[len("gitdir: ") :]))
+    return None
+
+
+def _signature(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class Watcher:
+    """Keeps the set of changed files in a git working tree up to date.
+
+    Uses inotify where available and otherwise compares file stats on each
+    query. Paths git ignores are never reported. Changes are numbered, so
+    each consumer keeps a cursor and asks for what changed since; a cursor
+    from before a reset (a kernel queue overflow, or a change to the ignore
+    rules) returns None, which means "rescan everything".
+    """
+
+    def __init__(self, project_dir: str, debounce=DEBOUNCE, use_inotify=True):
+        self.project_dir = os.path.abspath(project_dir)
+        self.git_dir = _git_dir(self.project_dir)
+        self.debounce = debounce
+        self.use_inotify = use_inotify
+        self.mode = None
+        self._lock = threading.RLock()
+        self._inotify: Optional[_Inotify] = None
+        self._wds: dict = {}
+        self._ignored_dirs: set = set()
+        self._ignore_files: list = []
+        self._ignore_state: tuple = ()
+        self._signatures: dict = {}
+        self._pending: set = set()
+        self._new_dirs: set = set()
+        self._last_event = 0.0
+        self._changed: dict = {}
+        self._seq = 0
+        self._epoch = 0
+        self._dirty = None
+        self._dirty_seq = 0
+        self._git_state = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.events = 0
+        self.resets = 0
+
+    def _git(self, args, stdin=None):
+        return subprocess.run(
+            ["git", *args],
+            input=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.project_dir,
+        )
+
+    def _find_ignore_files(self) -> list:
+        """Ignore files outside the working tree: info/exclude and core.excludesFile."""
+        files = []
+        if self.git_dir is not None:
+            files.append(os.path.join(self.git_dir, "info", "exclude"))
+        result = self._git(["config", "--path", "--get", "core.excludesFile"])
+        excludes_file = result.stdout.decode("utf-8").strip()
+        if result.returncode != 0 or not excludes_file:
+            config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser(
+                "~/.config"
+            )
+            excludes_file = os.path.join(config_home, "git", "ignore")
+        files.append(os.path.join(self.project_dir, os.path.expanduser(excludes_file)))
+        return files
+
+    def _load_ignores(self):
+        result = self._git(
+            ["ls-files", "-z", "-o", "-i", "--exclude-standard", "--directory"]
+        )
+        self._ignored_dirs = {
+            path.rstrip("/")
+            for path in result.stdout.decode("utf-8").split("\0")
+            if path.endswith("/")
+        }
+        self._ignore_state = self._read_ignore_state()
+
+    def _read_ignore_state(self) -> tuple:
+        return tuple(_signature(path) for path in self._ignore_files)
+
+    def start(self):
+        with self._lock:
+            self._ignore_files = self._find_ignore_files()
+            self._load_ignores()
+            if self.use_inotify:
+                try:
+                    self._inotify = _Inotify()
+                    self._watch_tree("")
+                    self.mode = "inotify"
+                except OSError as e:
+                    logger.warning(f"inotify unavailable, polling instead: {e}")
+                    self._close_inotify()
+            if self.mode is None:
+                self._start_polling()
+        if self.mode == "inotify":
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        with self._lock:
+            self._close_inotify()
+
+    def _close_inotify(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._wds.clear()
+
+    def _start_polling(self):
+        self._close_inotify()
+        self.mode = "poll"
+        self._signatures = self._scan()
+
+    def _is_ignored_dir(self, rel: str) -> bool:
+        parts = rel.split("/")
+        return parts[0] == ".git" or any(
+            "/".join(parts[: i + 1]) in self._ignored_dirs for i in range(len(parts))
+        )
+
+    def _walk(self, rel_root: str):
+        """Yield (rel_dir, file names) for every directory that isn't ignored."""
+        for root, dirs, files in os.walk(os.path.join(self.project_dir, rel_root)):
+            rel = os.path.relpath(root, self.project_dir).replace(os.sep, "/")
+            rel = "" if rel == "." else rel
+            dirs[:] = [
+                d for d in dirs if not self._is_ignored_dir(f"{rel}/{d}".lstrip("/"))
+            ]
+            yield rel, files
+
+    def _watch_tree(self, rel_root: str) -> list:
+        """Watch rel_root and its subdirectories; returns the files inside."""
+        inotify = self._inotify
+        if inotify is None:
+            raise OSError("inotify is closed")
+        found: list = []
+        for rel, files in self._walk(rel_root):
+            wd = inotify.add(os.path.join(self.project_dir, rel))
+            self._wds[wd] = rel
+            found.extend(f"{rel}/{name}".lstrip("/") for name in files)
+        return found
+
+    def _scan(self) -> dict:
+        signatures = {}
+        for rel, files in self._walk(""):
+            for name in files:
+                path = f"{rel}/{name}".lstrip("/")
+                signatures[path] = _signature(os.path.join(self.project_dir, path))
+        return signatures
+
+    def _loop(self):
+        while not self._stop.is_set():
+            inotify = self._inotify
+            if inotify is None:
+                return
+            timeout = self.debounce if self._pending else 0.5
+            try:
+                ready, _, _ = select.select([inotify.fd], [], [], timeout)
+            except (OSError, ValueError):
+                return
+            with self._lock:
+                if self._inotify is None:
+                    return
+                if ready:
+                    self._drain()
+                elif time.monotonic() - self._last_event >= self.debounce:
+                    self._flush()
+
+    def _drain(self):
+        if self._inotify is None:
+            return
+        for wd, mask, name in self._inotify.read():
+            if mask & _IN_Q_OVERFLOW:
+                self._reset()
+                continue
+            rel_dir = self._wds.get(wd)
+            if rel_dir is None:
+                continue
+            if mask & _IN_IGNORED:
+                del self._wds[wd]
+                continue
+            path = f"{rel_dir}/{name}".lstrip("/")
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                self._new_dirs.add(path)
+            self._pending.add(path)
+            self._last_event = time.monotonic()
+            self.events += 1
+
+    def _poll(self):
+        signatures = self._scan()
+        for path in signatures.keys() | self._signatures.keys():
+            if signatures.get(path) != self._signatures.get(path):
+                self._pending.add(path)
+                self.events += 1
+        self._signatures = signatures
+
+    def _check_ignore(self, paths) -> set:
+        candidates = [p for p in paths if not self._is_ignored_dir(p.rsplit("/", 1)[0])]
+        ignored = set(paths) - set(candidates)
+        if candidates:
+            result = self._git(
+                ["check-ignore", "-z", "--stdin"],
+                stdin="\0".join(candidates).encode("utf-8"),
+            )
+            if result.returncode in (0, 1):
+                ignored.update(
+                    p for p in result.stdout.decode("utf-8").split("\0") if p
+                )
+        return ignored
+
+    def _flush(self):
+        if not self._pending:
+            return
+        paths = set(self._pending)
+        if any(path.rsplit("/", 1)[-1] == ".gitignore" for path in paths):
+            self._reload_ignores()
+            return
+        new_dirs = self._new_dirs & paths
+        self._pending.clear()
+        self._new_dirs.clear()
+        ignored = self._check_ignore(paths)
+        for rel in sorted(new_dirs - ignored):
+            # Files may have landed in a new directory before it was watched.
+            try:
+                paths.update(self._watch_tree(rel))
+            except OSError as e:
+                logger.warning(f"Cannot watch {rel}, polling instead: {e}")
+                self._start_polling()
+                self._reset()
+                return
+        # A new directory is reported through the files found inside it.
+        paths -= new_dirs
+        ignored |= self._check_ignore(paths - ignored)
+        for path in sorted(paths - ignored):
+            self._seq += 1
+            self._changed[path] = self._seq
+
+    def _reset(self):
+        self._epoch += 1
+        self._changed.clear()
+        self._pending.clear()
+        self._new_dirs.clear()
+        self._dirty = None
+        self.resets += 1
+
+    def _reload_ignores(self):
+        """Ignore rules changed: re-read them, and make every consumer rescan."""
+        self._load_ignores()
+        if self.mode == "inotify":
+            try:
+                # Directories that are no longer ignored need watches too.
+                self._watch_tree("")
+            except OSError as e:
+                logger.warning(f"Cannot watch {self.project_dir}, polling instead: {e}")
+                self._start_polling()
+        else:
+            self._signatures = self._scan()
+        self._reset()
+
+    def _sync(self):
+        if self.mode == "inotify":
+            self._drain()
+        else:
+            self._poll()
+        if self._read_ignore_state() != self._ignore_state:
+            self._reload_ignores()
+        self._flush()
+
+    def _read_git_state(self):
+        """Stats of the files whose change can alter `git status` by itself."""
+        files = ["HEAD", "index", "packed-refs"]
+        try:
+            with open(os.path.join(self.git_dir, "HEAD"), encoding="utf-8") as f:
+                head = f.read().strip()
+            if head.startswith("ref: "):
+                files.append(head[len("ref: ") :])
+        except OSError:
+            pass
+        return tuple(_signature(os.path.join(self.git_dir, name)) for name in files)
+
+    def _since(self, seq: int) -> set:
+        return {path for path, changed_at in self._changed.items() if changed_at > seq}
+
+    def cursor(self) -> tuple:
+        with self._lock:
+            self._sync()
+            return (self._epoch, self._seq)
+
+    def changes_since(self, cursor):
+        """(paths changed after cursor, new cursor); paths is None if unknown."""
+        with self._lock:
+            self._sync()
+            current = (self._epoch, self._seq)
+            if cursor is None or cursor[0] != self._epoch:
+                return None, current
+            return sorted(self._since(cursor[1])), current
+
+    def status_paths(self):
+        """(paths that may differ from HEAD, cursor), or (None, cursor).
+
+        None means the last recorded status no longer holds, for example
+        because HEAD or the index moved, so a full `git status` is needed.
+        """
+        with self._lock:
+            self._sync()
+            current = (self._epoch, self._seq)
+            if self._dirty is None or self._git_state != self._read_git_state():
+                return None, current
+            return sorted(self._dirty | self._since(self._dirty_seq)), current
+
+    def record_status(self, cursor, dirty_paths):
+        """Remember the paths a `git status` taken at cursor reported."""
+        with self._lock:
+            self._sync()
+            if cursor[0] != self._epoch:
+                self._dirty = None
+                return
+            self._dirty = set(dirty_paths) | self._since(cursor[1])
+            self._dirty_seq = self._seq
+            self._git_state = self._read_git_state()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "watched_dirs": len(self._wds),
+                "events": self.events,
+                "changed_paths": len(self._changed),
+                "dirty_paths": None if self._dirty is None else len(self._dirty),
+                "resets": self.resets,
+            }
+
+
+_watchers: dict = {}
+_watchers_lock = threading.Lock()
+
+
+def get_watcher(config) -> Optional[Watcher]:
+    """The running watcher for config.project_dir, if watching is enabled."""
+    if not getattr(config, "watch_files", False):
+        return None
+    project_dir = os.path.abspath(config.project_dir)
+    with _watchers_lock:
+        watcher = _watchers.get(project_dir)
+        if watcher is None:
+            if _git_dir(project_dir) is None:
+                return None
+            watcher = _watchers[project_dir] = Watcher(project_dir).start()
+        return watcher
+
+
+def close_watchers():
+    with _watchers_lock:
+        for watcher in _watchers.values():
+            watcher.close()
+        _watchers.clear()
+
+
+def stats() -> dict:
+    with _watchers_lock:
+        watchers = list(_watchers.values())
+    return {w.project_dir: w.stats() for w in watchers}
+
+
+metrics.registry.add_gauge("watch", stats)
+atexit.register(close_watchers)
@@ -1,36 +1,119 @@
+import asyncio
+from core import metrics
 from core.config import load_config
+from core.log import configure_logging
+from typing import Optional
 from mcp.server.fastmcp import FastMCP
 import tool.jira as jira_tools
 
 
-def setup_mcp(config=None):
-    if config is None:
-        config = load_config()
-    mcp = FastMCP("JiraMCP")
+def register(mcp, projects):
+    # Jira calls block, and may wait out a rate limit, so they run on worker
+    # threads to keep the event loop free for the other tool groups. Opening
+    # the mirror touches SQLite, so it happens on the worker thread too.
 
     @mcp.tool()
-    def jira__get_base_issue() -> dict:
+    async def jira__get_base_issue(project: Optional[str] = None) -> dict:
         """Retrieve the base JIRA issue configuration."""
-        return jira_tools.get_base_issue(config)
+        return await asyncio.to_thread(jira_tools.get_base_issue, projects.get(project))
 
     @mcp.tool()
-    def jira__create_issue_from_base(title: str, description: str) -> dict:
+    async def jira__create_issue_from_base(
+        title: str, description: str, project: Optional[str] = None
+    ) -> dict:
         """Create a new JIRA issue with the given title and description."""
-        return jira_tools.create_issue_from_base(title, description, config)
+        return await asyncio.to_thread(
+            jira_tools.create_issue_from_base, title, description, projects.get(project)
+        )
 
     @mcp.tool()
-    def jira__get_epic_stories(epic_key: str) -> dict:
-        """Retrieve all Issues in an Epic."""
-        return jira_tools.get_epic_stories(epic_key, config)
+    async def jira__create_issues_from_base(
+        items: list[dict[str, str]], project: Optional[str] = None
+    ) -> dict:
+        """Create several JIRA issues, each {title, description}, in bulk. Results keep the order of items."""
+        return await asyncio.to_thread(
+            jira_tools.create_issues_from_base, items, projects.get(project)
+        )
 
     @mcp.tool()
-    def jira__get_story_content(story_key: str) -> dict:
+    async def jira__get_epic_stories(
+        epic_key: str,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None,
+        project: Optional[str] = None,
+    ) -> dict:
+        """Retrieve the Issues in an Epic. Pass next_cursor back to page through large epics."""
+        config = projects.get(project)
+        return await asyncio.to_thread(
+            lambda: jira_tools.get_epic_stories(
+                epic_key, config, limit, cursor, mirror=jira_tools.get_mirror(config)
+            )
+        )
+
+    @mcp.tool()
+    async def jira__get_story_content(
+        story_key: str, project: Optional[str] = None
+    ) -> dict:
         """Retrieve the description, title and comments for a story."""
-        return jira_tools.get_story_content(story_key, config)
+        config = projects.get(project)
+        return await asyncio.to_thread(
+            lambda: jira_tools.get_story_content(
+                story_key, config, mirror=jira_tools.get_mirror(config)
+            )
+        )
+
+    @mcp.tool()
+    async def jira__get_stories_content(
+        keys: list[str], project: Optional[str] = None
+    ) -> dict:
+        """Retrieve the description, title and comments for several stories, in order."""
+        config = projects.get(project)
+        return await asyncio.to_thread(
+            lambda: jira_tools.get_stories_content(
+                keys, config, mirror=jira_tools.get_mirror(config)
+            )
+        )
+
+    @mcp.tool()
+    async def jira__search_local(
+        query: str, limit: int = 20, project: Optional[str] = None
+    ) -> dict:
+        """Full-text search over the issues this server has already read, served from the local mirror."""
+        config = projects.get(project)
+        return await asyncio.to_thread(
+            lambda: jira_tools.search_local(
+                query, config, limit, mirror=jira_tools.get_mirror(config)
+            )
+        )
+
+    @mcp.tool()
+    async def jira__health(project: Optional[str] = None) -> dict:
+        """Check connectivity and latency of the pooled JIRA client."""
+        return await asyncio.to_thread(jira_tools.jira_health, projects.get(project))
+
+    @mcp.tool()
+    def jira__cache_stats() -> dict:
+        """Report hit/miss counters for the cached JIRA lookups."""
+        return jira_tools.cache_stats()
+
+    @mcp.tool()
+    def jira__invalidate_cache(
+        issue_key: Optional[str] = None, project: Optional[str] = None
+    ) -> dict:
+        """Drop cached JIRA data for one issue of the project's server, or everything if no key is given."""
+        jira_tools.invalidate_cache(issue_key, projects.get(project))
+        return jira_tools.cache_stats()
+
 
+def setup_mcp(projects=None):
+    if projects is None:
+        projects = load_config()
+    mcp = metrics.instrument(FastMCP("JiraMCP"), projects.trace_file)
+    register(mcp, projects)
     return mcp
 
 
 if __name__ == "__main__":
+    configure_logging()
     mcp = setup_mcp()
     mcp.run()
@@ -0,0 +1,64 @@
+import argparse
+import importlib
+from core import metrics
+from core.config import load_config
+from core.log import configure_logging
+from mcp.server.fastmcp import FastMCP
+
+# Tool groups and the modules that register them. Modules are only imported
+# when their group is selected, so unused groups cost nothing at startup.
+GROUPS = {
+    "browse": "browse_main",
+    "jira": "jira_main",
+    "workflow": "workflow_main",
+}
+
+
+def parse_groups(value: str) -> list:
+    if value == "all":
+        return list(GROUPS)
+    groups = [group.strip() for group in value.split(",") if group.strip()]
+    unknown = [group for group in groups if group not in GROUPS]
+    if unknown or not groups:
+        raise ValueError(
+            f"Unknown tool group(s): {', '.join(unknown) or value}. "
+            f"Choose from: {', '.join(GROUPS)} or all."
+        )
+    return groups
+
+
+def setup_mcp(groups, projects=None):
+    if projects is None:
+        projects = load_config()
+    mcp = metrics.instrument(FastMCP("AutonomyMCP"), projects.trace_file)
+
+    @mcp.tool()
+    def projects__list() -> list:
+        """List the projects this server serves; pass a name as `project` to other tools."""
+        return projects.describe()
+
+    for group in groups:
+        importlib.import_module(GROUPS[group]).register(mcp, projects)
+    return mcp
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--tools",
+        type=str,
+        default="all",
+        help="Comma-separated tool groups to serve (browse,jira,workflow) or all",
+    )
+    args, rest = parser.parse_known_args(argv)
+    try:
+        groups = parse_groups(args.tools)
+    except ValueError as e:
+        parser.error(str(e))
+    configure_logging()
+    mcp = setup_mcp(groups, load_config(rest))
+    mcp.run()
+
+
+if __name__ == "__main__":
+    main()
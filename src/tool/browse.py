@@ -1,22 +1,60 @@
+import base64
+import codecs
+import json
+import os
 import subprocess
 import logging
-import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+from core import http, metrics, scheduler
+from core.cache import TTLCache
+from core.html import TextRenderer, parse_search_results
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger("browser")
 
+# "native" fetches in-process over a pooled HTTP client; "lynx" shells out to
+# `lynx -dump` for pages the built-in renderer handles poorly.
+BACKEND = os.getenv("BROWSE_BACKEND", "native")
+
+_HTML_TYPES = {"", "text/html", "application/xhtml+xml"}
+_TEXT_TYPES = {"application/json", "application/xml", "application/javascript"}
+
+# fetch_many limits: total requests in flight, the minimum spacing between
+# requests to a single host, and the time allowed per URL.
+FETCH_MANY_CONCURRENCY = 8
+HOST_INTERVAL = 0.25
+FETCH_TIMEOUT = 20.0
+
+# Bodies are read up to MAX_FETCH_BYTES; tools return DEFAULT_MAX_CHARS of the
+# rendered text per call and hand out continuation tokens for the rest.
+MAX_FETCH_BYTES = 2 * 1024 * 1024
+DEFAULT_MAX_CHARS = 20000
+
+# Search returns at most MAX_SEARCH_RESULTS records per query, and keeps the
+# parsed results of a query for SEARCH_TTL seconds.
+SEARCH_URL = "https://html.duckduckgo.com/html/"
+MAX_SEARCH_RESULTS = 10
+SEARCH_TTL = 900
+
+# Requests per second, and burst size, for all native fetches and searches.
+WEB_RATE = 10
+WEB_BURST = 20
+
+page_cache = http.PageCache()
+search_cache = TTLCache(max_size=256, ttl=SEARCH_TTL)
+web = scheduler.backend("web", WEB_RATE, WEB_BURST)
+
 
 def _run_command(cmd, **kwargs):
     return subprocess.run(cmd, **kwargs)
 
 
-def search(term: str, runner=_run_command) -> str:
-    search_url = f"https://duckduckgo.com/html/?q={term}"
-    cmd = ["lynx", "-dump", "-nolist", search_url]
-    try:
-        logger.info(f"Searching web for: {term}")
+def _lynx(url: str, runner, timeout=None, source=False):
+    cmd = ["lynx", "-source", url] if source else ["lynx", "-dump", "-nolist", url]
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+    with metrics.span("subprocess", f"lynx {cmd[1]}", cmd=cmd) as span:
         result = runner(
             cmd,
             stdout=subprocess.PIPE,
@@ -24,25 +62,311 @@ def search(term: str, runner=_run_command) -> str:
             text=True,
             encoding="utf-8",
             errors="replace",
+            **kwargs,
         )
-        return f"{result.stdout}\n{result.stderr}"
+        span.set(returncode=result.returncode)
+        span.bytes = len(result.stdout)
+    return result.stdout, result.stderr
+
+
+class _Body:
+    """Iterates a streaming response body, stopping at a byte budget.
+
+    The bytes read are kept so the raw page can be cached next to its
+    rendering, and reading fails with TimeoutError past the deadline.
+    """
+
+    def __init__(self, response, limit: int, deadline=None):
+        self._response = response
+        self._limit = limit
+        self._deadline = deadline
+        self.chunks: list = []
+        self.size = 0
+        self.truncated = False
+
+    def __iter__(self):
+        for chunk in self._response.iter_bytes():
+            if self._deadline is not None and time.monotonic() > self._deadline:
+                raise TimeoutError(f"Timed out reading {self._response.url}")
+            room = self._limit - self.size
+            if len(chunk) >= room:
+                # Reaching the budget counts as truncated: we stop reading
+                # without checking whether more of the body was coming.
+                self.truncated = True
+                chunk = chunk[:room]
+            self.chunks.append(chunk)
+            self.size += len(chunk)
+            yield chunk
+            if self.size >= self._limit:
+                return
+
+    @property
+    def raw(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+def render(response, chunks) -> str:
+    """Render body `chunks` of a response into lynx-style text as they arrive."""
+    content_type = response.headers.get("content-type", "")
+    kind = http.media_type(content_type)
+    decoder = codecs.getincrementaldecoder(http.content_charset(content_type))(
+        errors="replace"
+    )
+    parts: list = []
+    if kind in _HTML_TYPES:
+        renderer = TextRenderer(parts.append)
+        for chunk in chunks:
+            renderer.feed(decoder.decode(chunk))
+        renderer.feed(decoder.decode(b"", final=True))
+        renderer.close()
+    elif kind.startswith("text/") or kind in _TEXT_TYPES:
+        for chunk in chunks:
+            parts.append(decoder.decode(chunk))
+        parts.append(decoder.decode(b"", final=True))
+    else:
+        return f"[{kind} content not rendered]\n"
+    return "".join(parts)
+
+
+def _check_rate_limit(response):
+    retry_after = response.headers.get("retry-after")
+    if response.status_code == 429 or (response.status_code == 503 and retry_after):
+        raise scheduler.RateLimited(
+            f"HTTP {response.status_code} {response.reason_phrase}",
+            scheduler.parse_retry_after(retry_after),
+        )
+
+
+def _wait_budget(timeout) -> float:
+    """How long a load may spend waiting on the rate limiter and retries."""
+    return timeout if timeout is not None else http.DEFAULT_TIMEOUT
+
+
+def _native(url: str, client, cache, page, timeout=None):
+    client = client or http.get_client()
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    headers = page.validators() if page is not None else None
+    with client.stream(url, headers=headers, timeout=timeout) as response:
+        _check_rate_limit(response)
+        if response.status_code == 304 and page is not None:
+            cache.refresh(page, response.headers)
+            return page
+        body = _Body(response, MAX_FETCH_BYTES, deadline)
+        text = render(response, body)
+        if response.status_code >= 400:
+            text = f"HTTP {response.status_code} {response.reason_phrase}\n\n{text}"
+            return http.CachedPage(url, body.raw, text, {}, truncated=body.truncated)
+        if response.status_code != 200:
+            return http.CachedPage(url, body.raw, text, {}, truncated=body.truncated)
+        return cache.store(
+            url, body.raw, text, response.headers, truncated=body.truncated
+        )
+
+
+def _load(url: str, runner, client, cache, timeout=None, revalidate=True):
+    """Return the rendered page for url, from cache when possible.
+
+    Continuation requests pass revalidate=False so every chunk of a page is
+    cut from the same rendering, even after it has gone stale.
+    """
+    cache = page_cache if cache is None else cache
+    page, fresh = cache.lookup(url)
+    if page is not None and (fresh or not revalidate):
+        return page
+    if runner is not None or BACKEND == "lynx":
+        stdout, stderr = _lynx(url, runner or _run_command, timeout)
+        truncated = len(stdout) > MAX_FETCH_BYTES
+        return cache.store(
+            url, b"", stdout[:MAX_FETCH_BYTES], {}, truncated=truncated, stderr=stderr
+        )
+    # Concurrent loads of one URL share a single request.
+    return web.call(
+        lambda: _native(url, client, cache, page, timeout),
+        ("page", url),
+        _wait_budget(timeout),
+    )
+
+
+def encode_continuation(url: str, offset: int) -> str:
+    payload = json.dumps([url, offset]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_continuation(token: str):
+    url, offset = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    return url, int(offset)
+
+
+def _chunk(page, offset: int, max_chars: int) -> dict:
+    total = len(page.text)
+    offset = max(0, min(offset, total))
+    end = min(total, offset + max(max_chars, 1))
+    next_offset = end if end < total else None
+    return {
+        "success": True,
+        "url": page.url,
+        "content": page.text[offset:end],
+        "offset": offset,
+        "next_offset": next_offset,
+        "total_chars": total,
+        "truncated": page.truncated,
+        "continuation": (
+            encode_continuation(page.url, next_offset) if next_offset else None
+        ),
+        "stderr": page.stderr,
+    }
+
+
+def _search_page(url: str, runner, client, timeout=None) -> str:
+    """Return the HTML of a search results page."""
+    if runner is not None or BACKEND == "lynx":
+        stdout, _ = _lynx(url, runner or _run_command, timeout, source=True)
+        return stdout
+    client = client or http.get_client()
+
+    def load():
+        with client.stream(url, timeout=timeout) as response:
+            _check_rate_limit(response)
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f"HTTP {response.status_code} {response.reason_phrase}"
+                )
+            raw = b"".join(_Body(response, MAX_FETCH_BYTES))
+            charset = http.content_charset(response.headers.get("content-type", ""))
+            return raw.decode(charset, errors="replace")
+
+    return web.call(load, ("search", url), _wait_budget(timeout))
+
+
+def search(
+    term: str,
+    max_results: int = MAX_SEARCH_RESULTS,
+    runner=None,
+    client=None,
+    cache=None,
+) -> dict:
+    """Search the web and return up to `max_results` `{title, url, snippet}` records."""
+    cache = search_cache if cache is None else cache
+    query = " ".join(term.split())
+    search_url = f"{SEARCH_URL}?{urlencode({'q': query})}"
+    limit = max(1, min(max_results, MAX_SEARCH_RESULTS))
+    try:
+        results = cache.get(query)
+        cached = results is not None
+        if not cached:
+            logger.info(f"Searching web for: {query}")
+            html = _search_page(search_url, runner, client)
+            results = parse_search_results(html, MAX_SEARCH_RESULTS)
+            # An empty page is usually a block or an error page; don't keep it.
+            if results:
+                cache.set(query, results)
+        return {
+            "success": True,
+            "query": query,
+            "url": search_url,
+            "results": [dict(result) for result in results[:limit]],
+            "cached": cached,
+        }
     except Exception as e:
-        return f"Error: {str(e)}"
+        return {
+            "success": False,
+            "query": query,
+            "url": search_url,
+            "error": f"Error: {str(e)}",
+        }
 
 
-def fetch(url: str, runner=_run_command) -> str:
-    url = shlex.quote(url)
-    cmd = ["lynx", "-dump", "-nolist", url]
+def fetch(
+    url: str = "",
+    offset: int = 0,
+    max_chars: int = DEFAULT_MAX_CHARS,
+    continuation=None,
+    runner=None,
+    client=None,
+    cache=None,
+    timeout=None,
+) -> dict:
+    """Fetch a page and return `max_chars` of its text starting at `offset`.
+
+    The response's `continuation` token (or `next_offset`) addresses the next
+    chunk, which is served from the cached rendering.
+    """
     try:
-        logger.info(f"Browsing URL: {url}")
-        result = runner(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-        )
-        return f"{result.stdout}\n{result.stderr}"
+        if continuation:
+            url, offset = decode_continuation(continuation)
+        logger.info(f"Browsing URL: {url} (offset {offset})")
+        page = _load(url, runner, client, cache, timeout, revalidate=offset == 0)
+        return _chunk(page, offset, max_chars)
     except Exception as e:
-        return f"Error: {str(e)}"
+        return {"success": False, "url": url, "error": f"Error: {str(e)}"}
+
+
+class HostThrottle:
+    """Spaces out request starts so each host sees at most one per `interval`."""
+
+    def __init__(self, interval: float, clock=time.monotonic, sleep=time.sleep):
+        self.interval = interval
+        self._clock = clock
+        self._sleep = sleep
+        self._next_slot: dict = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str):
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            self._sleep(slot - now)
+
+
+# Shared by all fetch_many calls, so overlapping or back-to-back calls still
+# keep to one concurrency cap and one spacing per host.
+fetch_pool = ThreadPoolExecutor(
+    max_workers=FETCH_MANY_CONCURRENCY, thread_name_prefix="fetch-many"
+)
+host_throttle = HostThrottle(HOST_INTERVAL)
+
+
+def fetch_many(
+    urls: list,
+    runner=None,
+    client=None,
+    cache=None,
+    timeout: float = FETCH_TIMEOUT,
+    max_chars: int = DEFAULT_MAX_CHARS,
+    pool=None,
+    throttle=None,
+) -> dict:
+    """Fetch several URLs concurrently.
+
+    Results keep the input order and have the same shape as fetch's, so a
+    failed URL carries its own error without affecting the others.
+    """
+    pool = fetch_pool if pool is None else pool
+    throttle = host_throttle if throttle is None else throttle
+
+    def fetch_one(url):
+        try:
+            throttle.wait(urlsplit(url).netloc.lower())
+        except ValueError as e:
+            return {"success": False, "url": url, "error": f"Error: {str(e)}"}
+        return fetch(
+            url,
+            max_chars=max_chars,
+            runner=runner,
+            client=client,
+            cache=cache,
+            timeout=timeout,
+        )
+
+    logger.info(f"Browsing {len(urls)} URLs")
+    results = list(pool.map(metrics.propagate(fetch_one), urls))
+    return {"results": results}
+
+
+def cache_stats() -> dict:
+    stats = page_cache.stats()
+    stats["search"] = search_cache.stats()
+    stats["scheduler"] = web.stats()
+    return stats
@@ -1,35 +1,290 @@
-import sys
+import os
 import subprocess
 import json
 import logging
+import threading
+from pathlib import Path
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger("formatter")
 
+# Below this many candidate files, formatting in-process beats the cost of
+# handing work to the process pool.
+POOL_THRESHOLD = 8
 
-def _run_command(cmd, **kwargs):
-    return subprocess.run(cmd, **kwargs)
+_pool = None
+_pool_lock = threading.Lock()
 
 
-def black(config, runner=_run_command) -> str:
-    project_dir = config.project_dir
-    cmd = [sys.executable, "-m", "black", project_dir]
+class FormatIndex:
+    """Remembers the (mtime, size) of files known to be Black-formatted."""
+
+    def __init__(self):
+        self.mode = None
+        self.files: dict = {}
+        self.errors: set = set()
+        # Watcher position, and file selection, as of the last full-project run.
+        self.cursor = None
+        self.selection = None
+        self.lock = threading.Lock()
+
+
+_indexes: dict = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(project_dir) -> FormatIndex:
+    with _indexes_lock:
+        index = _indexes.get(project_dir)
+        if index is None:
+            index = _indexes[project_dir] = FormatIndex()
+        return index
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import atexit
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Spawned workers keep Black imported between calls and avoid
+            # forking a process that already runs server threads.
+            _pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def _load_options(project_dir) -> dict:
+    import black as black_module
+
+    pyproject = os.path.join(project_dir, "pyproject.toml")
+    if not os.path.isfile(pyproject):
+        return {}
+    return black_module.parse_pyproject_toml(pyproject)
+
+
+def _load_mode(options):
+    import black as black_module
+
+    return black_module.Mode(
+        target_versions={
+            black_module.TargetVersion[version.upper()]
+            for version in options.get("target_version", [])
+        },
+        line_length=options.get("line_length", black_module.DEFAULT_LINE_LENGTH),
+        string_normalization=not options.get("skip_string_normalization", False),
+        magic_trailing_comma=not options.get("skip_magic_trailing_comma", False),
+        preview=options.get("preview", False),
+    )
+
+
+class _Selection:
+    """Which files Black would format, from the [tool.black] include/exclude keys."""
+
+    def __init__(self, options):
+        from black import re_compile_maybe_verbose as compile_regex
+        from black.const import DEFAULT_EXCLUDES, DEFAULT_INCLUDES
+
+        self.key = tuple(
+            options.get(name)
+            for name in ("include", "exclude", "extend_exclude", "force_exclude")
+        )
+        self.include = compile_regex(options.get("include") or DEFAULT_INCLUDES)
+        # Like the Black CLI, a custom exclude replaces the .gitignore rules.
+        self.use_gitignore = not options.get("exclude")
+        self.excludes = [compile_regex(options.get("exclude") or DEFAULT_EXCLUDES)]
+        self.force_exclude = None
+        if options.get("extend_exclude"):
+            self.excludes.append(compile_regex(options["extend_exclude"]))
+        if options.get("force_exclude"):
+            self.force_exclude = compile_regex(options["force_exclude"])
+            self.excludes.append(self.force_exclude)
+
+    def excluded(self, normalized: str) -> bool:
+        """Match a path as Black does: "/dir/" for directories, "/a.py" for files."""
+        return any(_matches(pattern, normalized) for pattern in self.excludes)
+
+    def allows(self, rel_path: str) -> bool:
+        """Whether Black would format rel_path when walking the project."""
+        if not rel_path.endswith((".py", ".pyi")):
+            return False
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts)):
+            if self.excluded("/" + "/".join(parts[:depth]) + "/"):
+                return False
+        normalized = "/" + rel_path
+        return not self.excluded(normalized) and bool(self.include.search(normalized))
+
+    def allows_explicit(self, rel_path: str) -> bool:
+        """Explicitly named files are only subject to force_exclude."""
+        return not _matches(self.force_exclude, "/" + rel_path)
+
+
+def _matches(pattern, normalized: str) -> bool:
+    match = pattern.search(normalized) if pattern else None
+    return bool(match and match.group(0))
+
+
+def _discover(project_dir, selection) -> list:
+    """List Python sources Black would format, honouring .gitignore."""
     try:
-        logger.info(f"Running: {' '.join(cmd)}")
-        result = runner(
-            cmd,
+        result = subprocess.run(
+            [
+                "git",
+                "ls-files",
+                "-z",
+                "-co",
+                "--exclude-standard",
+                "--",
+                "*.py",
+                "*.pyi",
+            ],
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
+            stderr=subprocess.DEVNULL,
             cwd=project_dir,
         )
+        if result.returncode == 0:
+            paths = result.stdout.decode("utf-8").split("\0")
+            return [path for path in paths if path and selection.allows(path)]
+    except OSError:
+        pass
+    return _walk(project_dir, selection)
+
+
+def _walk(project_dir, selection) -> list:
+    from black.files import get_gitignore
+
+    # .gitignore rules by the directory they apply to, outermost first.
+    gitignores: dict = {}
+
+    def ignored(rel_path, is_dir):
+        for base, spec in gitignores.items():
+            if base and not rel_path.startswith(base + "/"):
+                continue
+            relative = rel_path[len(base) + 1 :] if base else rel_path
+            if spec.match_file(relative + ("/" if is_dir else "")):
+                return True
+        return False
+
+    paths = []
+    for root, dirs, files in os.walk(project_dir):
+        rel_root = os.path.relpath(root, project_dir).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root
+        if selection.use_gitignore:
+            gitignores[rel_root] = get_gitignore(Path(root))
+        kept = []
+        for name in sorted(dirs):
+            rel = f"{rel_root}/{name}".lstrip("/")
+            if not selection.excluded(f"/{rel}/") and not ignored(rel, True):
+                kept.append(name)
+        dirs[:] = kept
+        for name in files:
+            rel = f"{rel_root}/{name}".lstrip("/")
+            if selection.allows(rel) and not ignored(rel, False):
+                paths.append(rel)
+    return paths
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _format_file(path, mode) -> dict:
+    import black as black_module
+
+    try:
+        changed = black_module.format_file_in_place(
+            Path(path), fast=False, mode=mode, write_back=black_module.WriteBack.YES
+        )
+        return {"status": "changed" if changed else "unchanged"}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+
+def _watched_candidates(watcher, index, mode, selection):
+    """Files changed since the last run according to the watcher, or None."""
+    cursor = None
+    if index.mode == mode and index.selection == selection.key:
+        cursor = index.cursor
+    changed, new_cursor = watcher.changes_since(cursor)
+    if changed is None:
+        return None, new_cursor
+    python_files = {path for path in changed if selection.allows(path)}
+    return sorted(python_files | index.errors), new_cursor
+
+
+def black(config, paths=None, index=None, use_pool=None, watcher=None) -> str:
+    """Format the project with Black, skipping files unchanged since the last run.
+
+    With a watcher, only files it saw change are considered instead of
+    listing the whole project.
+    """
+    project_dir = config.project_dir
+    index = index or get_index(project_dir)
+    try:
+        options = _load_options(project_dir)
+        mode = _load_mode(options)
+        selection = _Selection(options)
+        candidates, cursor = None, None
+        if paths is not None:
+            candidates = [path for path in paths if selection.allows_explicit(path)]
+        elif watcher is not None:
+            candidates, cursor = _watched_candidates(watcher, index, mode, selection)
+        if candidates is None:
+            candidates = _discover(project_dir, selection)
+        with index.lock:
+            if index.mode != mode:
+                index.files.clear()
+                index.errors.clear()
+                index.mode = mode
+            pending = []
+            for rel_path in candidates:
+                abs_path = os.path.join(project_dir, rel_path)
+                signature = _signature(abs_path)
+                if signature is None:
+                    index.errors.discard(rel_path)
+                elif index.files.get(rel_path) != signature:
+                    pending.append(rel_path)
+            skipped = len(candidates) - len(pending)
+            logger.info(f"Formatting {len(pending)} file(s), {skipped} unchanged")
+
+            abs_paths = [os.path.join(project_dir, p) for p in pending]
+            if use_pool is None:
+                use_pool = len(pending) >= POOL_THRESHOLD
+            if use_pool:
+                outcomes = list(
+                    _get_pool().map(_format_file, abs_paths, [mode] * len(abs_paths))
+                )
+            else:
+                outcomes = [_format_file(path, mode) for path in abs_paths]
+
+            files = []
+            for rel_path, abs_path, outcome in zip(pending, abs_paths, outcomes):
+                if outcome["status"] == "error":
+                    index.files.pop(rel_path, None)
+                    index.errors.add(rel_path)
+                else:
+                    index.files[rel_path] = _signature(abs_path)
+                    index.errors.discard(rel_path)
+                files.append(dict(path=rel_path, **outcome))
+            if cursor is not None:
+                index.cursor = cursor
+                index.selection = selection.key
+        counts = {"changed": 0, "unchanged": 0, "error": 0}
+        for entry in files:
+            counts[entry["status"]] += 1
         return json.dumps(
             {
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "return_code": result.returncode,
+                "files": [entry for entry in files if entry["status"] != "unchanged"],
+                "changed": counts["changed"],
+                "unchanged": counts["unchanged"],
+                "errors": counts["error"],
+                "skipped": skipped,
             }
         )
     except Exception as e:
@@ -1,40 +1,281 @@
+import logging
 import os
-from atlassian import Jira
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlsplit
+from core import metrics, scheduler
+from core.cache import TTLCache
+from core.jira_mirror import JiraMirror
+
+logger = logging.getLogger("jira")
+
+# Idle time after which a pooled client is health checked before reuse.
+HEALTH_CHECK_INTERVAL = 60
+
+EPIC_FIELDS = "summary,status,issuetype"
+EPIC_PAGE_SIZE = 100
+EPIC_FETCH_WORKERS = 4
+
+STORY_FIELDS = "summary,description,status,issuetype,comment"
+STORY_BATCH_SIZE = 50
+STORY_FETCH_WORKERS = 8
+
+# Requests per second, and burst size, allowed to each Jira server.
+JIRA_RATE = 20
+JIRA_BURST = 40
+
+# Jira's default cap on issues per rest/api/2/issue/bulk request.
+BULK_CREATE_SIZE = 50
+
+base_issue_cache = TTLCache(max_size=16, ttl=600)
+required_fields_cache = TTLCache(max_size=64, ttl=3600)
+issue_cache = TTLCache(max_size=256, ttl=60)
+
+# Path segments holding issue keys or ids are collapsed so metrics are kept
+# per endpoint rather than per issue.
+_PATH_ID = re.compile(r"/(?:[A-Za-z][A-Za-z0-9_]*-\d+|\d{2,})(?=/|$)")
+
+# Only keys of this shape are put into JQL; anything else is looked up alone.
+_ISSUE_KEY = re.compile(r"^[A-Z][A-Z0-9_]*-\d+$")
+
+_clients: dict = {}
+_clients_lock = threading.Lock()
+
+_mirrors: dict = {}
+_mirrors_lock = threading.Lock()
+
+
+class _PooledClient:
+    def __init__(self, jira, session):
+        self.jira = jira
+        self.session = session
+        self.last_used = time.monotonic()
+
+
+def _total_timeout(timeout) -> Optional[float]:
+    """Seconds from a requests timeout, which may be a (connect, read) pair."""
+    if isinstance(timeout, tuple):
+        parts = [part for part in timeout if part is not None]
+        return sum(parts) if parts else None
+    return timeout
+
+
+def _new_session(config):
+    # requests and atlassian are imported on first use to keep startup fast.
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    backend = scheduler.backend(
+        f"jira {urlsplit(config.jira_url).netloc}", JIRA_RATE, JIRA_BURST
+    )
+
+    class TracedAdapter(HTTPAdapter):
+        def _send(self, request, **kwargs):
+            endpoint = _PATH_ID.sub("/{id}", urlsplit(request.url).path)
+            with metrics.span(
+                "http", f"{request.method} {endpoint}", url=request.url
+            ) as span:
+                response = super().send(request, **kwargs)
+                span.set(status=response.status_code)
+                span.error = response.status_code >= 400
+                if not kwargs.get("stream"):
+                    span.bytes = len(response.content)
+            retry_after = response.headers.get("Retry-After")
+            if response.status_code == 429 or (
+                response.status_code == 503 and retry_after
+            ):
+                raise scheduler.RateLimited(
+                    f"HTTP {response.status_code}",
+                    scheduler.parse_retry_after(retry_after),
+                    response,
+                )
+            return response
+
+        def send(self, request, **kwargs):
+            key = None
+            if request.method == "GET" and not kwargs.get("stream"):
+                # Identical concurrent reads share one response.
+                key = (request.url, request.headers.get("Authorization"))
+            try:
+                return backend.call(
+                    lambda: self._send(request, **kwargs),
+                    key,
+                    _total_timeout(kwargs.get("timeout")),
+                )
+            except scheduler.RateLimited as e:
+                if e.result is None:
+                    raise
+                return e.result
+
+    session = requests.Session()
+    adapter = TracedAdapter(
+        pool_connections=1,
+        pool_maxsize=config.jira_pool_size,
+        pool_block=True,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _new_client(config):
+    from atlassian import Jira
+
+    session = _new_session(config)
+    jira = Jira(
+        url=config.jira_url,
+        token=config.jira_api_token,
+        timeout=config.jira_timeout,
+        session=session,
+    )
+    return _PooledClient(jira, session)
+
+
+def _is_healthy(jira) -> bool:
+    try:
+        jira.get("rest/api/2/serverInfo")
+        return True
+    except Exception:
+        return False
 
 
 def get_jira(config):
-    return Jira(url=config.jira_url, token=config.jira_api_token)
+    """Return the long-lived, pooled Jira client for this server process."""
+    key = (config.jira_url, config.jira_api_token)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = _new_client(config)
+        idle = time.monotonic() - client.last_used
+        client.last_used = time.monotonic()
+    # Checked outside the lock so a slow server doesn't hold up other callers.
+    if idle > HEALTH_CHECK_INTERVAL and not _is_healthy(client.jira):
+        with _clients_lock:
+            if _clients.get(key) is client:
+                client.session.close()
+                _clients[key] = _new_client(config)
+            client = _clients[key]
+    return client.jira
+
+
+def close_jira_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.session.close()
+        _clients.clear()
+
+
+def get_mirror(config) -> Optional[JiraMirror]:
+    """Return the process-wide mirror for this Jira, or None if disabled."""
+    path = getattr(config, "jira_mirror_path", None)
+    if not path:
+        return None
+    with _mirrors_lock:
+        mirror = _mirrors.get(path)
+        if mirror is None:
+            mirror = _mirrors[path] = JiraMirror(path)
+        return mirror
+
 
+def _mirror_ready(mirror, jira) -> bool:
+    """Start a sync if one is due; the mirror may serve reads unless the last failed.
 
-def get_required_fields(jira, project_key, issue_type_id):
-    meta_endpoint = (
-        f"rest/api/2/issue/createmeta/{project_key}/issuetypes/{issue_type_id}"
+    The sync runs in the background, so reads are answered from the last
+    synced state instead of waiting for it to catch up.
+    """
+    if mirror is None:
+        return False
+    try:
+        # Looked up once per mirror; sync() needs it to keep epics current.
+        mirror.epic_field(jira)
+    except Exception:
+        return False
+    if mirror.sync_due():
+        mirror.sync_in_background(jira)
+    return not mirror.sync_failed
+
+
+def _store(write, *args):
+    """Write fetched issues to the mirror; failing to do so must not fail the tool."""
+    try:
+        write(*args)
+    except Exception as e:
+        logger.warning(f"Could not update the Jira mirror: {e}")
+
+
+def jira_health(config, jira_factory=get_jira) -> dict:
+    jira = jira_factory(config)
+    started = time.monotonic()
+    try:
+        info = jira.get("rest/api/2/serverInfo")
+        return {
+            "success": True,
+            "version": info.get("version"),
+            "latency_ms": round((time.monotonic() - started) * 1000, 1),
+        }
+    except Exception as e:
+        return {"success": False, "error": f"Jira health check failed: {str(e)}"}
+
+
+def invalidate_cache(issue_key=None, config=None):
+    """Drop cached JIRA data, either for one issue on config's server or everything."""
+    if issue_key is None:
+        base_issue_cache.invalidate()
+        required_fields_cache.invalidate()
+        issue_cache.invalidate()
+    else:
+        base_issue_cache.invalidate((config.jira_url, issue_key))
+        issue_cache.invalidate((config.jira_url, issue_key))
+
+
+def cache_stats() -> dict:
+    return {
+        "base_issue": base_issue_cache.stats(),
+        "required_fields": required_fields_cache.stats(),
+        "issue": issue_cache.stats(),
+    }
+
+
+def get_required_fields(jira, project_key, issue_type_id, config):
+    def load():
+        meta_endpoint = (
+            f"rest/api/2/issue/createmeta/{project_key}/issuetypes/{issue_type_id}"
+        )
+        meta_response = jira.get(meta_endpoint)
+        return [
+            field["fieldId"]
+            for field in meta_response.get("values", [])
+            if field.get("required", False)
+        ]
+
+    # Keyed by server too: project keys are only unique within one Jira.
+    return required_fields_cache.get_or_load(
+        (config.jira_url, project_key, issue_type_id), load
+    )
+
+
+def _get_base_issue(jira, config):
+    return base_issue_cache.get_or_load(
+        (config.jira_url, config.jira_base_issue),
+        lambda: jira.issue(config.jira_base_issue),
     )
-    meta_response = jira.get(meta_endpoint)
-    return [
-        field["fieldId"]
-        for field in meta_response.get("values", [])
-        if field.get("required", False)
-    ]
 
 
 def get_base_issue(config, jira_factory=get_jira) -> dict:
     jira = jira_factory(config)
-    issue = jira.issue(config.jira_base_issue)
+    issue = _get_base_issue(jira, config)
     return {
         "title": issue["fields"]["summary"],
         "description": issue["fields"]["description"],
     }
 
 
-def create_issue_from_base(
-    title: str, description: str, config, jira_factory=get_jira
-) -> dict:
-    jira = jira_factory(config)
-    base_issue = jira.issue(config.jira_base_issue)
+def _new_issue_data(base_issue, required_fields, title, description) -> dict:
     project_key = base_issue["fields"]["project"]["key"]
     issue_type_id = base_issue["fields"]["issuetype"]["id"]
-    required_fields = get_required_fields(jira, project_key, issue_type_id)
     new_issue_data = {
         "fields": {
             "project": {"key": project_key},
@@ -49,6 +290,26 @@ def create_issue_from_base(
             and field_id in base_issue["fields"]
         ):
             new_issue_data["fields"][field_id] = base_issue["fields"][field_id]
+    return new_issue_data
+
+
+def _base_and_required_fields(jira, config):
+    base_issue = _get_base_issue(jira, config)
+    required_fields = get_required_fields(
+        jira,
+        base_issue["fields"]["project"]["key"],
+        base_issue["fields"]["issuetype"]["id"],
+        config,
+    )
+    return base_issue, required_fields
+
+
+def create_issue_from_base(
+    title: str, description: str, config, jira_factory=get_jira
+) -> dict:
+    jira = jira_factory(config)
+    base_issue, required_fields = _base_and_required_fields(jira, config)
+    new_issue_data = _new_issue_data(base_issue, required_fields, title, description)
     try:
         new_issue = jira.post("rest/api/2/issue", data=new_issue_data)
         return {
@@ -60,66 +321,239 @@ def create_issue_from_base(
         return {"success": False, "error": f"Failed to create issue: {str(e)}"}
 
 
-def get_epic_stories(epic_key: str, config, jira_factory=get_jira) -> dict:
-    """Retrieve all Issues in an Epic."""
-    jira = jira_factory(config)
+def _element_error(error) -> str:
+    element = error.get("elementErrors") or {}
+    messages = list(element.get("errorMessages") or [])
+    messages += [
+        f"{field}: {msg}" for field, msg in (element.get("errors") or {}).items()
+    ]
+    return "; ".join(messages) or f"HTTP {error.get('status', 'error')}"
+
+
+def _bulk_response(e):
+    """The JSON body of a failed bulk request, if it has one.
+
+    Jira answers 400 when every issue in the request fails, with the same
+    per-issue errors as a partial success.
+    """
+    response = getattr(e, "response", None)
     try:
-        # Search for all issues that belong to this epic
-        jql = f'"Epic Link" = {epic_key}'
-        issues = jira.jql(jql)
+        body = response.json()
+    except Exception:
+        return None
+    return body if isinstance(body, dict) and "errors" in body else None
+
 
-        stories = []
-        for issue in issues.get("issues", []):
-            stories.append(
+def _create_chunk(jira, chunk: list) -> list:
+    """Submit (index, issue data) pairs in one bulk request; results in order."""
+    try:
+        response = jira.post(
+            "rest/api/2/issue/bulk",
+            data={"issueUpdates": [data for _, data in chunk]},
+        )
+    except Exception as e:
+        response = _bulk_response(e)
+        if response is None:
+            error = f"Failed to create issue: {str(e)}"
+            return [{"index": i, "success": False, "error": error} for i, _ in chunk]
+    failed = {
+        error.get("failedElementNumber"): _element_error(error)
+        for error in response.get("errors") or []
+    }
+    created = iter(response.get("issues") or [])
+    results = []
+    for position, (index, _) in enumerate(chunk):
+        issue = None if position in failed else next(created, None)
+        if issue is None:
+            error = failed.get(position, "Jira did not report a result")
+            results.append(
                 {
-                    "key": issue["key"],
-                    "title": issue["fields"]["summary"],
-                    "status": issue["fields"]["status"]["name"],
-                    "issue_type": issue["fields"]["issuetype"]["name"],
+                    "index": index,
+                    "success": False,
+                    "error": f"Failed to create issue: {error}",
                 }
             )
+        else:
+            results.append(
+                {
+                    "index": index,
+                    "success": True,
+                    "issue_key": issue["key"],
+                    "issue_id": issue["id"],
+                }
+            )
+    return results
+
+
+def create_issues_from_base(items: list, config, jira_factory=get_jira) -> dict:
+    """Create many issues from the base issue, BULK_CREATE_SIZE per request.
+
+    Every item gets a result at its own index. A failed item or chunk is
+    reported without stopping the rest.
+    """
+    jira = jira_factory(config)
+    try:
+        base_issue, required_fields = _base_and_required_fields(jira, config)
+    except Exception as e:
+        return {"success": False, "error": f"Failed to load base issue: {str(e)}"}
+    results: list[Optional[dict]] = [None] * len(items)
+    pending = []
+    for index, item in enumerate(items):
+        title = (item or {}).get("title")
+        if not title:
+            results[index] = {
+                "index": index,
+                "success": False,
+                "error": "Each item needs a title.",
+            }
+            continue
+        data = _new_issue_data(
+            base_issue, required_fields, title, item.get("description") or ""
+        )
+        pending.append((index, data))
+    for offset in range(0, len(pending), BULK_CREATE_SIZE):
+        for result in _create_chunk(jira, pending[offset : offset + BULK_CREATE_SIZE]):
+            results[result["index"]] = result
+    issues = [result for result in results if result is not None]
+    created = sum(1 for result in issues if result["success"])
+    return {
+        "success": created == len(items),
+        "created": created,
+        "failed": len(items) - created,
+        "issues": issues,
+    }
+
+
+def _story_summary(issue) -> dict:
+    return {
+        "key": issue["key"],
+        "title": issue["fields"]["summary"],
+        "status": issue["fields"]["status"]["name"],
+        "issue_type": issue["fields"]["issuetype"]["name"],
+    }
+
+
+def get_epic_stories(
+    epic_key: str,
+    config,
+    limit: Optional[int] = None,
+    cursor: Optional[int] = None,
+    jira_factory=get_jira,
+    mirror=None,
+) -> dict:
+    """Retrieve all Issues in an Epic, optionally one page at a time."""
+    if limit is not None and limit < 1:
+        return {"success": False, "error": "limit must be at least 1"}
+    jira = jira_factory(config)
+    if _mirror_ready(mirror, jira):
+        listing = mirror.epic_stories(epic_key)
+        if listing is not None:
+            start = cursor or 0
+            end = len(listing) if limit is None else start + limit
+            stories = listing[start:end]
+            next_offset = start + len(stories)
+            return {
+                "success": True,
+                "epic_key": epic_key,
+                "total_issues": len(listing),
+                "stories": stories,
+                "next_cursor": next_offset if next_offset < len(listing) else None,
+                "source": "mirror",
+            }
+    try:
+        # Search for all issues that belong to this epic
+        jql = f'"Epic Link" = {epic_key} ORDER BY key ASC'
+        start = cursor or 0
+        first_limit = EPIC_PAGE_SIZE if limit is None else min(limit, EPIC_PAGE_SIZE)
+        first = jira.jql(jql, fields=EPIC_FIELDS, start=start, limit=first_limit)
+        issues = first.get("issues", [])
+        total = first.get("total", start + len(issues))
+        end = total if limit is None else min(total, start + limit)
+
+        # The server may cap maxResults below what we asked for, so the first
+        # page tells us the real page size for the remaining requests.
+        page_size = len(issues)
+        offsets = list(range(start + page_size, end, page_size)) if issues else []
+
+        def fetch_page(offset):
+            page = jira.jql(
+                jql,
+                fields=EPIC_FIELDS,
+                start=offset,
+                limit=min(page_size, end - offset),
+            )
+            return page.get("issues", [])
 
+        stories = [_story_summary(issue) for issue in issues[: end - start]]
+        if offsets:
+            with ThreadPoolExecutor(max_workers=EPIC_FETCH_WORKERS) as pool:
+                for page in pool.map(metrics.propagate(fetch_page), offsets):
+                    stories.extend(_story_summary(issue) for issue in page)
+
+        next_offset = start + len(stories)
+        if mirror is not None and start == 0 and next_offset >= total:
+            _store(mirror.store_summaries, epic_key, stories)
         return {
             "success": True,
             "epic_key": epic_key,
-            "total_issues": len(stories),
+            "total_issues": total,
             "stories": stories,
+            # An empty page would hand back the same cursor forever.
+            "next_cursor": next_offset if stories and next_offset < total else None,
         }
     except Exception as e:
         return {"success": False, "error": f"Failed to retrieve epic stories: {str(e)}"}
 
 
-def get_story_content(story_key: str, config, jira_factory=get_jira) -> dict:
+def _comment_list(comments_data) -> list:
+    return [
+        {
+            "author": comment["author"]["displayName"],
+            "created": comment["created"],
+            "body": comment["body"],
+        }
+        for comment in comments_data.get("comments", [])
+    ]
+
+
+def _story_content(story_key, issue, comment_list) -> dict:
+    return {
+        "success": True,
+        "key": story_key,
+        "title": issue["fields"]["summary"],
+        "description": issue["fields"]["description"] or "",
+        "status": issue["fields"]["status"]["name"],
+        "issue_type": issue["fields"]["issuetype"]["name"],
+        "comments": comment_list,
+    }
+
+
+def get_story_content(
+    story_key: str, config, jira_factory=get_jira, mirror=None
+) -> dict:
     """Retrieve the description, title and comments for a story."""
     jira = jira_factory(config)
+    if _mirror_ready(mirror, jira):
+        mirrored = mirror.story(story_key)
+        if mirrored is not None:
+            return {**mirrored, "source": "mirror"}
     try:
-        issue = jira.issue(story_key)
+        issue = issue_cache.get_or_load(
+            (config.jira_url, story_key), lambda: jira.issue(story_key)
+        )
 
         comment_list = []
+        complete = True
         try:
             # Attempt to get comments
-            comments_data = jira.issue_get_comments(story_key)
-            for comment in comments_data.get("comments", []):
-                comment_list.append(
-                    {
-                        "author": comment["author"]["displayName"],
-                        "created": comment["created"],
-                        "body": comment["body"],
-                    }
-                )
+            comment_list = _comment_list(jira.issue_get_comments(story_key))
         except AttributeError:
             # If comment retrieval fails, proceed without them.
-            pass
+            complete = False
 
-        return {
-            "success": True,
-            "key": story_key,
-            "title": issue["fields"]["summary"],
-            "description": issue["fields"]["description"] or "",
-            "status": issue["fields"]["status"]["name"],
-            "issue_type": issue["fields"]["issuetype"]["name"],
-            "comments": comment_list,
-        }
+        if mirror is not None:
+            _store(mirror.store_story, story_key, issue, comment_list, complete)
+        return _story_content(story_key, issue, comment_list)
     except Exception as e:
         import traceback
 
@@ -129,3 +563,77 @@ def get_story_content(story_key: str, config, jira_factory=get_jira) -> dict:
             "error": f"Failed to retrieve story content: {str(e)}",
             "details": error_details,
         }
+
+
+def _search_stories(jira, keys, mirror=None) -> dict:
+    """Fetch a batch of issues with their comments in a single JQL search."""
+    keys = [key for key in keys if _ISSUE_KEY.match(key)]
+    if not keys:
+        return {}
+    jql = f"key in ({', '.join(keys)})"
+    result = jira.jql(jql, fields=STORY_FIELDS, limit=len(keys))
+    found = {}
+    fetched = []
+    for issue in result.get("issues", []):
+        comments = issue["fields"].get("comment") or {}
+        if comments.get("total", 0) > len(comments.get("comments", [])):
+            # The search response truncated the comments; let the single
+            # issue path fetch them in full.
+            continue
+        comment_list = _comment_list(comments)
+        fetched.append((issue["key"], issue, comment_list))
+        found[issue["key"]] = _story_content(issue["key"], issue, comment_list)
+    if mirror is not None:
+        _store(mirror.store_stories, fetched)
+    return found
+
+
+def get_stories_content(keys: list, config, jira_factory=get_jira, mirror=None) -> dict:
+    """Retrieve the description, title and comments for many stories at once."""
+    jira = jira_factory(config)
+    unique_keys = list(dict.fromkeys(key.strip().upper() for key in keys))
+    found: dict = {}
+    if _mirror_ready(mirror, jira):
+        for key in unique_keys:
+            mirrored = mirror.story(key)
+            if mirrored is not None:
+                found[key] = {**mirrored, "source": "mirror"}
+    remote_keys = [key for key in unique_keys if key not in found]
+    for offset in range(0, len(remote_keys), STORY_BATCH_SIZE):
+        batch = remote_keys[offset : offset + STORY_BATCH_SIZE]
+        try:
+            found.update(_search_stories(jira, batch, mirror))
+        except Exception:
+            # A single unknown key fails the whole JQL query; the per-key
+            # fallback below isolates it.
+            pass
+
+    missing = [key for key in unique_keys if key not in found]
+    if missing:
+        with ThreadPoolExecutor(max_workers=STORY_FETCH_WORKERS) as pool:
+            results = pool.map(
+                metrics.propagate(
+                    lambda key: get_story_content(key, config, lambda c: jira, mirror)
+                ),
+                missing,
+            )
+            found.update(zip(missing, results))
+
+    stories = [found[key.strip().upper()] for key in keys]
+    return {
+        "success": all(story["success"] for story in stories),
+        "stories": stories,
+    }
+
+
+def search_local(query: str, config, limit=20, jira_factory=get_jira, mirror=None):
+    """Full-text search over the issues mirrored locally."""
+    if mirror is None:
+        return {"success": False, "error": "The local Jira mirror is disabled."}
+    synced = _mirror_ready(mirror, jira_factory(config))
+    return {
+        "success": True,
+        "query": query,
+        "synced": synced,
+        "results": mirror.search(query, limit),
+    }
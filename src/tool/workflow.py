@@ -3,19 +3,95 @@ import sys
 import json
 import subprocess
 import re
+import time
+import threading
+import asyncio
 import logging
+from core import git, issues, jobs, metrics, scheduler
+from core.plan import Plan, run_plan
+from core.process import run_process
+from typing import List, Optional
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger("workflow")
 
+# How long a successful `gh auth status` check is trusted before re-running it.
+VALIDATION_TTL = 600
+
+MAX_OUTPUT_LENGTH = 50000
+# Per-command timeouts; CI watches legitimately take much longer than git.
+DEFAULT_TIMEOUT = 300
+CHECKS_TIMEOUT = 1800
+# Default byte budget for the patch returned by change_summary.
+MAX_PATCH_BYTES = 100000
+
+_AUTH_ERROR = re.compile(
+    r"gh auth login|authentication|not logged in|bad credentials|HTTP 401",
+    re.IGNORECASE,
+)
+
+
+_RATE_LIMIT_ERROR = re.compile(r"rate limit|HTTP 429|abuse detection", re.IGNORECASE)
+
+# gh subcommands that only read, so identical concurrent calls can share
+# one run.
+_GH_READ_VERBS = {"view", "list", "status", "checks", "diff"}
+_GH_API_WRITE_FLAGS = {"-X", "--method", "-f", "-F", "--field", "--raw-field"}
+
+# gh calls per second, and burst size, across every project.
+GH_RATE = 10
+GH_BURST = 20
+
+
+def _is_auth_error(stderr: str) -> bool:
+    return bool(_AUTH_ERROR.search(stderr))
+
+
+def _gh_key(cmd, working_dir):
+    """Key under which identical read-only gh calls are merged, else None."""
+    if cmd[1:2] == ["api"]:
+        read_only = not _GH_API_WRITE_FLAGS.intersection(cmd) and "--input" not in cmd
+    else:
+        read_only = len(cmd) > 2 and cmd[2] in _GH_READ_VERBS
+    return (working_dir, tuple(cmd)) if read_only else None
+
+
+def _rate_limited(result):
+    if result.returncode != 0 and _RATE_LIMIT_ERROR.search(result.stderr or ""):
+        raise scheduler.RateLimited("GitHub rate limit", result=result)
+    return result
+
+
+def _command_span(cmd):
+    return metrics.span("subprocess", metrics.command_name(cmd), cmd=cmd)
+
+
+def _observe(span, result):
+    span.set(returncode=result.returncode)
+    span.bytes = len(result.stdout or "") + len(result.stderr or "")
+    if result.returncode != 0:
+        span.error = True
+
 
 class Workflow:
-    def __init__(self, working_dir, runner=subprocess.run, which=subprocess.call):
+    def __init__(
+        self,
+        working_dir,
+        runner=subprocess.run,
+        which=subprocess.call,
+        validate=True,
+        async_runner=run_process,
+        gh_backend=None,
+    ):
         self.working_dir = working_dir
         self._runner = runner
+        self._async_runner = async_runner
+        self._gh = gh_backend or scheduler.backend("gh", GH_RATE, GH_BURST)
         self._which = which
+        self.validated_at = None
+        if validate:
+            self.validate()
+
+    def validate(self):
         if not self._command_exists("gh"):
             logger.error("GitHub CLI (gh) is not installed. Please install it first:")
             logger.error("https://cli.github.com/manual/installation")
@@ -25,6 +101,7 @@ class Workflow:
         except subprocess.CalledProcessError:
             logger.error("Please authenticate with GitHub first using: gh auth login")
             sys.exit(1)
+        self.validated_at = time.monotonic()
 
     def _command_exists(self, cmd):
         return (
@@ -32,120 +109,415 @@ class Workflow:
             == 0
         )
 
-    def run(self, cmd, check=True):
+    def _schedule(self, cmd, attempt):
+        """Pass gh calls through the shared scheduler; run the rest directly."""
+        if cmd[0] != "gh":
+            return attempt()
+        try:
+            return self._gh.call(
+                lambda: _rate_limited(attempt()), _gh_key(cmd, self.working_dir)
+            )
+        except scheduler.RateLimited as e:
+            return e.result
+
+    async def _schedule_async(self, cmd, attempt):
+        if cmd[0] != "gh":
+            return await attempt()
+
+        async def checked():
+            return _rate_limited(await attempt())
+
+        try:
+            return await self._gh.call_async(checked, _gh_key(cmd, self.working_dir))
+        except scheduler.RateLimited as e:
+            return e.result
+
+    def run(self, cmd, check=True, timeout=None):
         logger.info(f"Running: {' '.join(cmd)}")
-        result = self._runner(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=False,
-            cwd=self.working_dir,
-        )
+
+        def attempt():
+            with _command_span(cmd) as span:
+                result = self._runner(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    check=False,
+                    cwd=self.working_dir,
+                    timeout=timeout,
+                )
+                _observe(span, result)
+            return result
+
+        return self._finish(cmd, self._schedule(cmd, attempt), check)
+
+    async def _run_captured(self, cmd, timeout, max_output):
+        async def attempt():
+            with _command_span(cmd) as span:
+                result = await self._async_runner(
+                    cmd, cwd=self.working_dir, timeout=timeout, max_output=max_output
+                )
+                _observe(span, result)
+            return result
+
+        return await self._schedule_async(cmd, attempt)
+
+    async def run_async(self, cmd, check=True, timeout=DEFAULT_TIMEOUT):
+        """Like run, but streams output without blocking the event loop."""
+        logger.info(f"Running: {' '.join(cmd)}")
+        result = await self._run_captured(cmd, timeout, MAX_OUTPUT_LENGTH)
+        return self._finish(cmd, result, check)
+
+    async def capture(self, cmd, max_output=MAX_OUTPUT_LENGTH, timeout=DEFAULT_TIMEOUT):
+        """Run cmd and return the raw ProcessResult, for callers that parse output."""
+        logger.info(f"Running: {' '.join(cmd)}")
+        result = await self._run_captured(cmd, timeout, max_output)
+        if result.returncode != 0:
+            logger.error(f"Command failed with exit code {result.returncode}")
+            self._check_auth(cmd, result.stderr)
+            raise subprocess.CalledProcessError(
+                result.returncode, cmd, result.stdout, result.stderr
+            )
+        return result
+
+    def _check_auth(self, cmd, stderr):
+        if cmd[0] == "gh" and _is_auth_error(stderr):
+            # Force the session to re-run `gh auth status` on its next use.
+            self.validated_at = None
+
+    def _finish(self, cmd, result, check):
         output_stdout = result.stdout.strip()
         output_stderr = result.stderr.strip()
         logger.info(f"Output: {output_stdout}")
         logger.info(f"Error: {output_stderr}")
+        if result.returncode != 0:
+            self._check_auth(cmd, output_stderr)
         if check and result.returncode != 0:
             logger.error(f"Command failed with exit code {result.returncode}")
             raise subprocess.CalledProcessError(
                 result.returncode, cmd, output_stdout, output_stderr
             )
         output = (output_stdout + "\n" + output_stderr).strip()
-        max_output_length = 50000
-        if len(output) > max_output_length:
-            truncated = output[:max_output_length]
-            logger.info(
-                f"Output truncated from {len(output)} to {max_output_length} characters"
-            )
-            return truncated + "\n... [output truncated]"
+        if len(output) > MAX_OUTPUT_LENGTH or getattr(result, "truncated", False):
+            logger.info(f"Output truncated to {MAX_OUTPUT_LENGTH} characters")
+            return output[:MAX_OUTPUT_LENGTH] + "\n... [output truncated]"
         return output
 
 
-def list(config) -> str:
-    workflow_dir = config.project_dir
-    workflow_obj = Workflow(workflow_dir)
-    issues_json = workflow_obj.run(
-        [
-            "gh",
+class WorkflowSession:
+    """Shares one validated Workflow across tool calls for a project directory."""
+
+    def __init__(self, working_dir, workflow_factory=None, ttl=VALIDATION_TTL):
+        self.working_dir = working_dir
+        self.ttl = ttl
+        self._workflow_factory = workflow_factory or (
+            lambda working_dir: Workflow(working_dir, validate=False)
+        )
+        self._workflow = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Workflow:
+        with self._lock:
+            if self._workflow is None:
+                self._workflow = self._workflow_factory(self.working_dir)
+            workflow = self._workflow
+            if (
+                workflow.validated_at is None
+                or time.monotonic() - workflow.validated_at > self.ttl
+            ):
+                workflow.validate()
+            return workflow
+
+
+_sessions: dict = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(working_dir) -> WorkflowSession:
+    with _sessions_lock:
+        session = _sessions.get(working_dir)
+        if session is None:
+            session = _sessions[working_dir] = WorkflowSession(working_dir)
+        return session
+
+
+async def _workflow(config, session=None) -> Workflow:
+    if session is None:
+        session = get_session(config.project_dir)
+    # Validation shells out synchronously, so keep it off the event loop.
+    return await asyncio.to_thread(session.get)
+
+
+async def list(
+    config,
+    session=None,
+    state: str = "open",
+    labels: Optional[List[str]] = None,
+    offset: int = 0,
+    limit: int = 100,
+    refresh: bool = False,
+) -> str:
+    workflow_obj = await _workflow(config, session)
+    index = await issues.get_index(config.project_dir, workflow_obj.capture)
+    await issues.sync(index, workflow_obj.capture, force=refresh)
+    return json.dumps(index.query(state, labels, offset, limit))
+
+
+def _branch_name(issue_number: int, issue_json: str) -> str:
+    issue_title = json.loads(issue_json).get("title", "")
+    branch_type = "feature" if issue_title.startswith("[feature]") else "fix"
+    return f"{branch_type}/issue-{issue_number}"
+
+
+def start_plan(issue_number: int) -> Plan:
+    """Branch off the remote's default branch for an issue and publish it."""
+
+    def branch(outputs):
+        return _branch_name(issue_number, outputs["issue"])
+
+    def base(outputs):
+        return f"origin/{git.parse_default_branch(outputs['default_branch'])}"
+
+    return (
+        Plan("start")
+        .step(
             "issue",
-            "list",
-            "--state",
-            "open",
-            "--json",
-            "number,title,labels,createdAt",
-            "--limit",
-            "100",
-        ]
+            ["gh", "issue", "view", str(issue_number), "--json", "number,title,body"],
+        )
+        .step("fetch", ["git", "fetch", "--prune", "origin"])
+        .step("default_branch", git.default_branch_command())
+        .step(
+            "checkout",
+            # -f discards local changes the way `reset --hard` used to, but
+            # leaves the branch we were on untouched.
+            lambda o: ["git", "checkout", "-f", "-b", branch(o), base(o)],
+            after=("issue", "fetch", "default_branch"),
+            mutates=True,
+        )
+        .step("clean", ["git", "clean", "-fd"], after=("checkout",), mutates=True)
+        .step(
+            "push",
+            lambda o: ["git", "push", "-u", "origin", branch(o)],
+            after=("checkout",),
+            mutates=True,
+        )
     )
-    return issues_json
 
 
-def start(issue_number: int, config) -> str:
-    workflow_dir = config.project_dir
-    workflow_obj = Workflow(workflow_dir)
-    issue_json = workflow_obj.run(
-        ["gh", "issue", "view", str(issue_number), "--json", "number,title,body"]
+async def start(issue_number: int, config, session=None, dry_run=False) -> str:
+    workflow_obj = await _workflow(config, session)
+    result = await run_plan(start_plan(issue_number), workflow_obj.capture, dry_run)
+    report = result.report()
+    issue_step = next(step for step in result.steps if step["name"] == "issue")
+    if issue_step["status"] == "ok":
+        report["issue"] = json.loads(result.outputs["issue"])
+        report["branch"] = _branch_name(issue_number, result.outputs["issue"])
+    return json.dumps(report)
+
+
+def _watched_pathspec(watcher):
+    """(pathspec for the paths that may be dirty, cursor); None means scan all."""
+    candidates, cursor = watcher.status_paths()
+    if candidates is None or len(candidates) > git.MAX_PATHSPEC:
+        return None, cursor
+    if not candidates:
+        # Matches nothing, so status only reports the branch.
+        return [":(exclude)*"], cursor
+    return [f":(literal){path}" for path in candidates], cursor
+
+
+def _entry_paths(entries) -> List[str]:
+    paths = []
+    for entry in entries:
+        paths.append(entry["path"])
+        if "orig_path" in entry:
+            paths.append(entry["orig_path"])
+    return paths
+
+
+async def change_summary(
+    config,
+    session=None,
+    paths: Optional[List[str]] = None,
+    max_patch_bytes: int = MAX_PATCH_BYTES,
+    watcher=None,
+) -> str:
+    """Status, diff stat and patch of the working tree.
+
+    With a watcher and no explicit paths, git only looks at the files that
+    were dirty last time or have changed since.
+    """
+    workflow_obj = await _workflow(config, session)
+    cursor = None
+    if paths is None and watcher is not None:
+        paths, cursor = await asyncio.to_thread(_watched_pathspec, watcher)
+    result = await git.collect_changes(
+        workflow_obj.capture, paths=paths, max_patch_bytes=max_patch_bytes
     )
-    issue_title = json.loads(issue_json).get("title", "")
-    branch_type = "feature" if issue_title.startswith("[feature]") else "fix"
-    workflow_obj.run(["git", "fetch", "origin"])
-    workflow_obj.run(["git", "reset", "--hard", "origin/master"])
-    workflow_obj.run(["git", "clean", "-fd"])
-    branch_name = f"{branch_type}/issue-{issue_number}"
-    workflow_obj.run(["git", "checkout", "-b", branch_name])
-    workflow_obj.run(["git", "push", "-u", "origin", branch_name])
-    return issue_json
-
-
-def change_summary(config) -> str:
-    workflow_dir = config.project_dir
-    workflow_obj = Workflow(workflow_dir)
-    status = workflow_obj.run(["git", "status", "--short"])
-    diff_stat = workflow_obj.run(["git", "diff", "--stat"])
-    result = {
-        "status": status,
-        "diff_stat": diff_stat,
-        "diff": diff_stat,
-    }
+    if watcher is not None and cursor is not None:
+        await asyncio.to_thread(
+            watcher.record_status, cursor, _entry_paths(result["status"])
+        )
     return json.dumps(result)
 
 
-def commit(commit_message: str, config) -> str:
-    workflow_dir = config.project_dir
-    workflow_obj = Workflow(workflow_dir)
-    branch_name = workflow_obj.run(["git", "rev-parse", "--abbrev-ref", "HEAD"])
-    workflow_obj.run(["git", "add", "."])
-    workflow_obj.run(["git", "commit", "-m", commit_message], check=False)
-    workflow_obj.run(["git", "push", "-u", "origin", branch_name])
+async def _stage_changes(workflow_obj, watcher):
+    """Stage every change, asking git only about watched paths if possible."""
+    pathspec = None
+    if watcher is not None:
+        pathspec, cursor = await asyncio.to_thread(_watched_pathspec, watcher)
+    if pathspec is None:
+        await workflow_obj.run_async(["git", "add", "."])
+        return
+    status = git.parse_status(
+        (await workflow_obj.capture(git.status_command(pathspec))).stdout
+    )
+    dirty = _entry_paths(status["entries"])
+    await asyncio.to_thread(watcher.record_status, cursor, dirty)
+    if dirty:
+        await workflow_obj.run_async(
+            ["git", "add", "-A", "--", *(f":(literal){path}" for path in dirty)]
+        )
+
+
+async def _pr_number(workflow_obj):
+    """Number of the PR for the current branch, or None if there is none."""
     try:
-        pr_json = workflow_obj.run(["gh", "pr", "view", "--json", "number"])
-        pr_data = json.loads(pr_json)
-        pr_number = pr_data.get("number")
-        if pr_number:
-            try:
-                workflow_obj.run(["gh", "pr", "checks", str(pr_number), "--watch"])
-            except:
-                pass
-    except:
+        pr_json = await workflow_obj.run_async(["gh", "pr", "view", "--json", "number"])
+    except subprocess.CalledProcessError:
+        return None
+    return json.loads(pr_json).get("number")
+
+
+def _parse_checks(output: str) -> List[dict]:
+    checks = []
+    for line in output.splitlines():
+        fields = line.split("\t")
+        if len(fields) >= 2:
+            check = {"name": fields[0], "state": fields[1]}
+            if len(fields) >= 4 and fields[3]:
+                check["link"] = fields[3]
+            checks.append(check)
+    return checks
+
+
+async def _check_results(workflow_obj, pr_number):
+    try:
+        result = await workflow_obj.capture(["gh", "pr", "checks", str(pr_number)])
+        return 0, result.stdout
+    except subprocess.CalledProcessError as e:
+        return e.returncode, f"{e.stdout}\n{e.stderr}".strip()
+
+
+async def watch_checks(workflow_obj, pr_number) -> dict:
+    """Wait for a PR's checks to finish, failing the job if any check failed."""
+    try:
+        await workflow_obj.capture(
+            ["gh", "pr", "checks", str(pr_number), "--watch"],
+            timeout=CHECKS_TIMEOUT,
+        )
+    except subprocess.CalledProcessError:
+        # The exit code only says that something failed; the final listing
+        # below says what.
         pass
-    commit_info = workflow_obj.run(["git", "log", "-1", "--pretty=format:%h %s"])
-    result = {"branch": branch_name, "commit": commit_info, "message": commit_message}
+    returncode, output = await _check_results(workflow_obj, pr_number)
+    result = {"pr": pr_number, "checks": _parse_checks(output)}
+    if returncode != 0 and "no checks reported" not in output:
+        raise jobs.JobError(f"Checks did not pass for PR #{pr_number}", result)
+    return result
+
+
+def merge_plan(pr_number) -> Plan:
+    """Merge a PR on the remote; the local checkout is left alone."""
+    return Plan("merge").step(
+        "merge", ["gh", "pr", "merge", str(pr_number), "--merge"], mutates=True
+    )
+
+
+def checkout_default_plan() -> Plan:
+    """Move the working copy to the remote's updated default branch."""
+    return (
+        Plan("checkout_default")
+        .step("default_branch", git.default_branch_command())
+        .step(
+            "checkout",
+            lambda o: [
+                "git",
+                "checkout",
+                git.parse_default_branch(o["default_branch"]),
+            ],
+            after=("default_branch",),
+            mutates=True,
+        )
+        .step("pull", ["git", "pull", "--ff-only"], after=("checkout",), mutates=True)
+    )
+
+
+async def _merge_when_green(workflow_obj, pr_number) -> dict:
+    result = await watch_checks(workflow_obj, pr_number)
+    merged = await run_plan(merge_plan(pr_number), workflow_obj.capture)
+    result.update(merged.report())
+    if not merged.success:
+        raise jobs.JobError(merged.error, result)
+    result["merged"] = True
+    return result
+
+
+async def commit(
+    commit_message: str, config, session=None, job_manager=None, watcher=None
+) -> str:
+    job_manager = job_manager or jobs.manager
+    workflow_obj = await _workflow(config, session)
+    branch_name = await workflow_obj.run_async(
+        ["git", "rev-parse", "--abbrev-ref", "HEAD"]
+    )
+    await _stage_changes(workflow_obj, watcher)
+    await workflow_obj.run_async(["git", "commit", "-m", commit_message], check=False)
+    await workflow_obj.run_async(["git", "push", "-u", "origin", branch_name])
+    pr_number = await _pr_number(workflow_obj)
+    checks_job = None
+    if pr_number:
+        checks_job = job_manager.start(
+            "checks",
+            lambda: watch_checks(workflow_obj, pr_number),
+            key=("checks", config.project_dir, pr_number),
+            pr=pr_number,
+        )
+    commit_info = await workflow_obj.run_async(
+        ["git", "log", "-1", "--pretty=format:%h %s"]
+    )
+    result = {
+        "branch": branch_name,
+        "commit": commit_info,
+        "message": commit_message,
+        "pr": pr_number,
+        "checks_job": checks_job.id if checks_job else None,
+    }
     return json.dumps(result)
 
 
-def complete(config) -> str:
-    workflow_dir = config.project_dir
-    workflow_obj = Workflow(workflow_dir)
-    branch_name = workflow_obj.run(["git", "rev-parse", "--abbrev-ref", "HEAD"])
+async def complete(config, session=None, job_manager=None, dry_run=False) -> str:
+    """Open a PR if needed, then merge it in a background job once checks pass.
+
+    A dry run opens nothing and starts no job; it reports the merge plan.
+    """
+    job_manager = job_manager or jobs.manager
+    workflow_obj = await _workflow(config, session)
+    branch_name, pr_number = await asyncio.gather(
+        workflow_obj.run_async(["git", "rev-parse", "--abbrev-ref", "HEAD"]),
+        _pr_number(workflow_obj),
+    )
     issue_match = re.search(r"issue-(\d+)", branch_name)
     issue_number = issue_match.group(1) if issue_match else "unknown"
-    try:
-        pr_json = workflow_obj.run(["gh", "pr", "view", "--json", "number"])
-        pr_data = json.loads(pr_json)
-        pr_number = pr_data.get("number")
-    except:
-        workflow_obj.run(
+    result = {"branch": branch_name, "issue_number": issue_number, "pr": pr_number}
+    if dry_run:
+        merged = await run_plan(
+            merge_plan(pr_number or "<new>"), workflow_obj.capture, dry_run=True
+        )
+        result.update(merged.report())
+        return json.dumps(result)
+    if not pr_number:
+        await workflow_obj.run_async(
             [
                 "gh",
                 "pr",
@@ -158,19 +530,38 @@ def complete(config) -> str:
                 branch_name,
             ]
         )
-        pr_json = workflow_obj.run(["gh", "pr", "view", "--json", "number"])
-        pr_data = json.loads(pr_json)
-        pr_number = pr_data.get("number")
-    try:
-        workflow_obj.run(["gh", "pr", "checks", str(pr_number), "--watch"])
-    except:
-        pass
-    workflow_obj.run(["gh", "pr", "merge", str(pr_number), "--merge"])
-    workflow_obj.run(["git", "checkout", "master"])
-    workflow_obj.run(["git", "pull"])
-    result = {
-        "branch": branch_name,
-        "issue_number": issue_number,
-        "status": "completed",
-    }
+        pr_json = await workflow_obj.run_async(["gh", "pr", "view", "--json", "number"])
+        pr_number = json.loads(pr_json).get("number")
+    job = job_manager.start(
+        "complete",
+        lambda: _merge_when_green(workflow_obj, pr_number),
+        key=("complete", config.project_dir, pr_number),
+        pr=pr_number,
+        branch=branch_name,
+    )
+    result.update(pr=pr_number, status="waiting_for_checks", job=job.id)
     return json.dumps(result)
+
+
+async def checkout_default(config, session=None, dry_run=False) -> str:
+    """Check out and pull the default branch, e.g. once a complete job merged.
+
+    This runs in the foreground on purpose: the background merge job never
+    touches the working copy, so it cannot switch branches under later work.
+    """
+    workflow_obj = await _workflow(config, session)
+    result = await run_plan(checkout_default_plan(), workflow_obj.capture, dry_run)
+    return json.dumps(result.report())
+
+
+async def job_status(job_id=None, wait_seconds: float = 0, job_manager=None) -> str:
+    """Report one job, waiting up to wait_seconds for it to finish, or all jobs."""
+    job_manager = job_manager or jobs.manager
+    if job_id is None:
+        return json.dumps({"jobs": [job.to_dict() for job in job_manager.jobs()]})
+    job = job_manager.get(job_id)
+    if job is None:
+        return json.dumps({"error": f"Unknown job: {job_id}"})
+    if wait_seconds > 0:
+        await job_manager.wait(job, wait_seconds)
+    return json.dumps(job.to_dict())
@@ -1,47 +1,101 @@
+import asyncio
+from core import metrics, watch
 from core.config import load_config
+from core.log import configure_logging
+from typing import Optional
 from mcp.server.fastmcp import FastMCP
 import tool.formatter as formatter_tools
 import tool.workflow as workflow_tools
 
 
-def setup_mcp(config=None):
-    if config is None:
-        config = load_config()
-    mcp = FastMCP("WorkflowMCP")
+def register(mcp, projects):
 
     @mcp.tool()
-    def formatter__black() -> str:
-        """Format the specified project using Black."""
-        return formatter_tools.black(config)
+    async def formatter__black(project: Optional[str] = None) -> str:
+        """Format the project using Black, only touching files changed since the last run."""
+        config = projects.get(project)
+        return await asyncio.to_thread(
+            lambda: formatter_tools.black(config, watcher=watch.get_watcher(config))
+        )
 
     @mcp.tool()
-    def workflow__list() -> str:
-        """List all current issues."""
-        return workflow_tools.list(config)
+    async def workflow__list(
+        state: str = "open",
+        labels: Optional[list[str]] = None,
+        offset: int = 0,
+        limit: int = 100,
+        refresh: bool = False,
+        project: Optional[str] = None,
+    ) -> str:
+        """List issues from the local index, filtered by state (open/closed/all) and labels. Pass next_offset back as offset for more."""
+        return await workflow_tools.list(
+            projects.get(project), None, state, labels, offset, limit, refresh
+        )
 
     @mcp.tool()
-    def workflow__start(issue_number: int) -> str:
-        """Start work on the specified issue."""
-        return workflow_tools.start(issue_number, config)
+    async def workflow__start(
+        issue_number: int, dry_run: bool = False, project: Optional[str] = None
+    ) -> str:
+        """Start work on an issue: branch off the default branch and push. dry_run only reports the plan."""
+        return await workflow_tools.start(
+            issue_number, projects.get(project), dry_run=dry_run
+        )
 
     @mcp.tool()
-    def workflow__change_summary() -> str:
-        """Get a summary of recent changes."""
-        return workflow_tools.change_summary(config)
+    async def workflow__change_summary(
+        paths: Optional[list[str]] = None,
+        max_patch_bytes: int = workflow_tools.MAX_PATCH_BYTES,
+        project: Optional[str] = None,
+    ) -> str:
+        """Get the status, per-file line counts and patch of uncommitted changes."""
+        config = projects.get(project)
+        watcher = await asyncio.to_thread(watch.get_watcher, config)
+        return await workflow_tools.change_summary(
+            config, None, paths, max_patch_bytes, watcher=watcher
+        )
 
     @mcp.tool()
-    def workflow__commit(commit_message: str) -> str:
-        """Commit changes and push to the repository."""
-        return workflow_tools.commit(commit_message, config)
+    async def workflow__commit(
+        commit_message: str, project: Optional[str] = None
+    ) -> str:
+        """Commit and push; CI checks are watched in a background job (see checks_job)."""
+        config = projects.get(project)
+        watcher = await asyncio.to_thread(watch.get_watcher, config)
+        return await workflow_tools.commit(commit_message, config, watcher=watcher)
 
     @mcp.tool()
-    def workflow__complete() -> str:
-        """Mark the current issue as complete."""
-        return workflow_tools.complete(config)
+    async def workflow__complete(
+        dry_run: bool = False, project: Optional[str] = None
+    ) -> str:
+        """Complete the current issue: its PR is merged by a background job once checks pass. The working copy is not switched; use workflow__checkout_default."""
+        return await workflow_tools.complete(projects.get(project), dry_run=dry_run)
 
+    @mcp.tool()
+    async def workflow__checkout_default(
+        dry_run: bool = False, project: Optional[str] = None
+    ) -> str:
+        """Check out and pull the default branch, e.g. after a complete job merged the PR."""
+        return await workflow_tools.checkout_default(
+            projects.get(project), dry_run=dry_run
+        )
+
+    @mcp.tool()
+    async def workflow__job_status(
+        job_id: Optional[str] = None, wait_seconds: float = 0
+    ) -> str:
+        """Report a background job, waiting up to wait_seconds for it to finish. Lists all jobs if no id is given."""
+        return await workflow_tools.job_status(job_id, wait_seconds)
+
+
+def setup_mcp(projects=None):
+    if projects is None:
+        projects = load_config()
+    mcp = metrics.instrument(FastMCP("WorkflowMCP"), projects.trace_file)
+    register(mcp, projects)
     return mcp
 
 
 if __name__ == "__main__":
+    configure_logging()
     mcp = setup_mcp()
     mcp.run()
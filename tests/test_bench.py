@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "scripts",
+    "bench-tools.py",
+)
+
+
+def test_tool_benchmarks_run_offline(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    result = subprocess.run(
+        [
+            sys.executable,
+            SCRIPT,
+            "--json",
+            "--runs",
+            "2",
+            "--files",
+            "10",
+            "--gh-issues",
+            "50",
+            "--save",
+            str(baseline),
+        ],
+        capture_output=True,
+        text=True,
+    )
+    report = json.loads(result.stdout)
+    assert report["failures"] == [], report["failures"]
+    assert result.returncode == 0
+    assert json.loads(baseline.read_text()) == report
+    tools = {scenario["tool"] for scenario in report["results"].values()}
+    assert {"jira__get_stories_content", "workflow__start"} <= tools
+    assert {"formatter__black", "browse__fetch_many"} <= tools
+    for scenario in report["results"].values():
+        assert scenario["calls"] == 2
+        assert 0 < scenario["p50_ms"] <= scenario["p95_ms"] <= scenario["max_ms"]
+    stories = report["results"]["jira__get_stories_content[20]"]["children"]
+    assert stories["http"] == {"GET /rest/api/2/search": 2}
@@ -1,6 +1,21 @@
 import tool.browse
+import os
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import pytest
+from core.cache import TTLCache
+from core.http import HttpClient, PageCache
+from core.html import html_to_text, parse_search_results
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
 
 
 class DummyResult:
@@ -15,5 +30,297 @@ def dummy_run(*args, **kwargs):
 
 
 def test_search_and_fetch():
-    assert isinstance(tool.browse.search("test", runner=dummy_run), str)
-    assert isinstance(tool.browse.fetch("http://example.com", runner=dummy_run), str)
+    search = tool.browse.search("test", runner=dummy_run, cache=TTLCache())
+    assert search["success"] and search["results"] == []
+    result = tool.browse.fetch(
+        "http://example.com", runner=dummy_run, cache=PageCache()
+    )
+    assert result["content"] == "output"
+    assert result["stderr"] == ""
+
+
+PAGE = """<html><head><title>Docs</title><script>track()</script></head>
+<body><h1>Getting   started</h1><p>Install the <a href="/pkg">package</a>.</p>
+<ul><li>One</li><li>Two</li></ul><pre>x = 1
+  y = 2</pre></body></html>"""
+
+
+def test_parse_search_results_fixture():
+    results = parse_search_results(fixture("ddg_results.html"))
+    assert [r["url"] for r in results] == [
+        "https://docs.python.org/3/library/asyncio-subprocess.html",
+        "https://stackoverflow.com/questions/63782892/using-asyncio-to-read-the-output",
+        "https://realpython.com/async-io-python/",
+        "https://pymotw.com/3/asyncio/subprocesses.html",
+    ]
+    assert results[0]["title"] == "Subprocesses \u2014 Python 3.12 documentation"
+    assert results[0]["snippet"] == (
+        "This section describes high-level async/await asyncio APIs "
+        "to create and manage subprocesses."
+    )
+    assert results[1]["snippet"].endswith("& stream it.")
+    assert results[3]["snippet"] == ""
+    assert len(parse_search_results(fixture("ddg_results.html"), 2)) == 2
+
+
+def test_search_encodes_query_caps_and_caches_results():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "text/html; charset=utf-8"},
+            content=fixture("ddg_results.html").encode("utf-8"),
+        )
+
+    client = HttpClient(transport=httpx.MockTransport(handler))
+    cache = TTLCache()
+    result = tool.browse.search(
+        "python  asyncio & subprocess", max_results=2, client=client, cache=cache
+    )
+    assert requests[0].url.params["q"] == "python asyncio & subprocess"
+    assert [r["title"] for r in result["results"]] == [
+        "Subprocesses \u2014 Python 3.12 documentation",
+        "Using asyncio to read the output of a serial subprocess - Stack Overflow",
+    ]
+    again = tool.browse.search(
+        "python asyncio & subprocess", client=client, cache=cache
+    )
+    assert again["cached"] is True
+    assert len(again["results"]) == 4
+    assert len(requests) == 1
+
+
+def test_html_to_text_lynx_layout():
+    assert html_to_text(PAGE) == (
+        "Getting started\n\nInstall the package.\n\n"
+        "  * One\n  * Two\n\nx = 1\n  y = 2\n"
+    )
+
+
+def test_fetch_native_reuses_connection(http_server):
+    http_server.routes["/docs"] = (200, {"Content-Type": "text/html"}, PAGE)
+    http_server.routes["/plain"] = (
+        200,
+        {"Content-Type": "text/plain; charset=latin-1"},
+        "caf\xe9".encode("latin-1"),
+    )
+    client = HttpClient()
+    try:
+        text = tool.browse.fetch(
+            http_server.url("/docs"), client=client, cache=PageCache()
+        )
+        assert text["content"].startswith("Getting started\n")
+        assert "track()" not in text["content"]
+        plain = tool.browse.fetch(
+            http_server.url("/plain"), client=client, cache=PageCache()
+        )
+        assert plain["content"] == "café"
+    finally:
+        client.close()
+    ports = {request["client_port"] for request in http_server.requests}
+    assert len(ports) == 1
+
+
+def test_fetch_native_reports_http_errors(http_server):
+    client = HttpClient()
+    try:
+        text = tool.browse.fetch(
+            http_server.url("/missing"), client=client, cache=PageCache()
+        )
+    finally:
+        client.close()
+    assert text["content"].startswith("HTTP 404 Not Found")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_fetch_cache_revalidates_with_etag():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"Cache-Control": "max-age=60"})
+        return httpx.Response(
+            200,
+            headers={
+                "Content-Type": "text/html",
+                "ETag": '"v1"',
+                "Cache-Control": "max-age=60",
+            },
+            content=PAGE.encode("utf-8"),
+        )
+
+    clock = FakeClock()
+    cache = PageCache(clock=clock)
+    client = HttpClient(transport=httpx.MockTransport(handler))
+    url = "https://docs.example.com/start"
+    first = tool.browse.fetch(url, client=client, cache=cache)
+    assert tool.browse.fetch(url, client=client, cache=cache) == first
+    assert len(requests) == 1
+
+    clock.now += 120
+    assert tool.browse.fetch(url, client=client, cache=cache) == first
+    assert len(requests) == 2
+    assert cache.stats()["revalidated"] == 1
+    assert cache.stats()["hits"] == 1
+    assert cache._pages[url].raw == PAGE.encode("utf-8")
+
+
+def test_fetch_cache_honours_no_store_and_evicts():
+    def handler(request):
+        headers = {"Content-Type": "text/plain"}
+        if request.url.path == "/private":
+            headers["Cache-Control"] = "no-store"
+        return httpx.Response(200, headers=headers, content=b"x" * 100)
+
+    cache = PageCache(max_bytes=450)
+    client = HttpClient(transport=httpx.MockTransport(handler))
+    tool.browse.fetch("https://a.example/private", client=client, cache=cache)
+    assert cache.stats()["pages"] == 0
+    for name in ("a", "b", "c"):
+        tool.browse.fetch(f"https://a.example/{name}", client=client, cache=cache)
+    assert cache.stats()["pages"] == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_fetch_many_runs_concurrently_and_isolates_errors():
+    # Every good host waits for the others, so this only passes if all of
+    # them are in flight at once.
+    together = threading.Barrier(5)
+
+    def handler(request):
+        if request.url.host == "broken.example":
+            raise httpx.ConnectError("connection refused")
+        together.wait(timeout=5)
+        return httpx.Response(
+            200, headers={"Content-Type": "text/plain"}, content=request.url.host
+        )
+
+    client = HttpClient(transport=httpx.MockTransport(handler))
+    urls = [f"https://h{i}.example/" for i in range(5)]
+    urls.insert(2, "https://broken.example/")
+    urls.append("http://[")
+    result = tool.browse.fetch_many(urls, client=client, cache=PageCache())
+    assert [r["url"] for r in result["results"]] == urls
+    assert [r["success"] for r in result["results"]] == [
+        True,
+        True,
+        False,
+        True,
+        True,
+        True,
+        False,
+    ]
+    assert result["results"][0]["content"] == "h0.example"
+    assert result["results"][0]["url"] == urls[0]
+    assert "connection refused" in result["results"][2]["error"]
+
+
+def test_fetch_many_calls_share_one_cap_and_throttle():
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def handler(request):
+        with lock:
+            in_flight.append(request)
+            peak.append(len(in_flight))
+        time.sleep(0.01)
+        with lock:
+            in_flight.remove(request)
+        return httpx.Response(200, headers={"Content-Type": "text/plain"})
+
+    client = HttpClient(transport=httpx.MockTransport(handler))
+    sleeps = []
+    throttle = tool.browse.HostThrottle(0.5, clock=FakeClock(), sleep=sleeps.append)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+
+        def fetch_many(urls):
+            return tool.browse.fetch_many(
+                urls, client=client, cache=PageCache(), pool=pool, throttle=throttle
+            )
+
+        with ThreadPoolExecutor(max_workers=2) as callers:
+            calls = [
+                callers.submit(
+                    fetch_many, [f"https://h{i}.example/{n}" for i in range(3)]
+                )
+                for n in range(2)
+            ]
+            assert all(r["success"] for call in calls for r in call.result()["results"])
+    assert max(peak) <= 2
+    # Each host was fetched once per call, and the second fetch was spaced out.
+    assert sorted(sleeps) == [0.5, 0.5, 0.5]
+
+
+def test_host_throttle_spaces_requests_per_host():
+    clock = FakeClock()
+    sleeps = []
+    throttle = tool.browse.HostThrottle(0.5, clock=clock, sleep=sleeps.append)
+    throttle.wait("a.example")
+    throttle.wait("a.example")
+    throttle.wait("b.example")
+    throttle.wait("a.example")
+    assert sleeps == [0.5, 1.0]
+
+
+def test_fetch_pages_through_cached_rendering():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(
+            200, headers={"Content-Type": "text/plain"}, content=b"0123456789" * 5
+        )
+
+    cache = PageCache()
+    client = HttpClient(transport=httpx.MockTransport(handler))
+    url = "https://big.example/page"
+    first = tool.browse.fetch(url, max_chars=20, client=client, cache=cache)
+    assert first["content"] == "01234567890123456789"
+    assert first["next_offset"] == 20
+    assert first["total_chars"] == 50
+    second = tool.browse.fetch(
+        continuation=first["continuation"], max_chars=20, client=client, cache=cache
+    )
+    assert second["offset"] == 20
+    third = tool.browse.fetch(url, offset=40, max_chars=20, client=client, cache=cache)
+    assert third["content"] == "0123456789"
+    assert third["next_offset"] is None and third["continuation"] is None
+    assert len(calls) == 1
+
+
+def test_fetch_stops_reading_at_byte_budget(monkeypatch):
+    monkeypatch.setattr(tool.browse, "MAX_FETCH_BYTES", 1000)
+
+    def handler(request):
+        return httpx.Response(
+            200, headers={"Content-Type": "text/plain"}, content=b"x" * 5000
+        )
+
+    client = HttpClient(transport=httpx.MockTransport(handler))
+    result = tool.browse.fetch(
+        "https://big.example/huge", client=client, cache=PageCache()
+    )
+    assert result["total_chars"] == 1000
+    assert result["truncated"] is True
+
+
+def test_lynx_stderr_reported_separately():
+    def run(*args, **kwargs):
+        result = DummyResult()
+        result.stderr = "Alert!: Unable to connect"
+        return result
+
+    result = tool.browse.fetch("http://down.example", runner=run, cache=PageCache())
+    assert result["content"] == "output"
+    assert result["stderr"] == "Alert!: Unable to connect"
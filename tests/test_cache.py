@@ -0,0 +1,44 @@
+from core.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry_and_counters():
+    clock = FakeClock()
+    cache = TTLCache(max_size=4, ttl=10, clock=clock)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_and_invalidate():
+    cache = TTLCache(max_size=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_get_or_load_loads_once():
+    cache = TTLCache()
+    calls = []
+    loader = lambda: calls.append(1) or "v"
+    assert cache.get_or_load("k", loader) == "v"
+    assert cache.get_or_load("k", loader) == "v"
+    assert len(calls) == 1
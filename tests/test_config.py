@@ -1,7 +1,16 @@
-from core.config import get_required_env, Config
+import os
+import pytest
+from core.config import Project, load_config
 
 
-def test_config_from_env(monkeypatch, tmp_path):
+ENV = """JIRA_URL=https://jira.example
+JIRA_API_TOKEN=token
+GH_TOKEN=ghtoken
+JIRA_BASE_ISSUE=BASE-1
+"""
+
+
+def test_config_from_process_env(monkeypatch, tmp_path):
     monkeypatch.setenv("JIRA_URL", "url")
     monkeypatch.setenv("JIRA_USERNAME", "user")
     monkeypatch.setenv("JIRA_API_TOKEN", "token")
@@ -10,11 +19,7 @@ def test_config_from_env(monkeypatch, tmp_path):
     monkeypatch.setenv("PROJECT_DIR", str(tmp_path))
     monkeypatch.setenv("JIRA_BASE_ISSUE", "ISSUE-1")
 
-    class Args:
-        env = None
-        project_path = None
-
-    c = Config.from_env(Args())
+    c = Project("default", None, []).config()
     assert c.jira_url == "url"
     assert c.jira_username == "user"
     assert c.jira_api_token == "token"
@@ -22,3 +27,68 @@ def test_config_from_env(monkeypatch, tmp_path):
     assert c.gh_token == "ghtoken"
     assert c.project_dir == str(tmp_path)
     assert c.jira_base_issue == "ISSUE-1"
+    assert c.jira_pool_size == 10
+    assert c.jira_timeout == 30
+
+
+def test_process_env_and_first_env_file_win(monkeypatch, tmp_path):
+    first = tmp_path / "first.env"
+    first.write_text(ENV + "JIRA_TIMEOUT=5\n")
+    second = tmp_path / "second.env"
+    second.write_text("JIRA_TIMEOUT=9\nJIRA_POOL_SIZE=3\n")
+    monkeypatch.setenv("JIRA_API_TOKEN", "from-process")
+    config = Project("default", str(tmp_path), [str(first), str(second)]).config()
+    assert config.jira_api_token == "from-process"
+    assert config.jira_timeout == 5
+    assert config.jira_pool_size == 3
+
+
+def test_project_env_files_win_over_the_process_env(monkeypatch, tmp_path):
+    shared = tmp_path / "shared.env"
+    shared.write_text(ENV)
+    api_env = tmp_path / "api.env"
+    api_env.write_text("JIRA_URL=https://api-jira.example\n")
+    monkeypatch.setenv("JIRA_URL", "https://exported.example")
+    registry = load_config(
+        [
+            "--env",
+            str(shared),
+            "--project-path",
+            str(tmp_path / "web"),
+            "--project",
+            f"api={tmp_path / 'api'},{api_env}",
+        ]
+    )
+    assert registry.get().jira_url == "https://exported.example"
+    assert registry.get("api").jira_url == "https://api-jira.example"
+
+
+def test_registry_serves_named_projects_and_reloads_env(tmp_path):
+    shared = tmp_path / "shared.env"
+    shared.write_text(ENV)
+    api_env = tmp_path / "api.env"
+    api_env.write_text("JIRA_BASE_ISSUE=API-1\n")
+    registry = load_config(
+        [
+            "--env",
+            str(shared),
+            "--project-path",
+            str(tmp_path / "web"),
+            "--project",
+            f"api={tmp_path / 'api'},{api_env}",
+        ]
+    )
+    assert registry.names() == ["default", "api"]
+    web = registry.get()
+    api = registry.get("api")
+    assert web.project_dir == str(tmp_path / "web")
+    assert (web.jira_base_issue, api.jira_base_issue) == ("BASE-1", "API-1")
+    assert api.jira_url == "https://jira.example"
+    assert registry.get("api") is api
+
+    api_env.write_text("JIRA_BASE_ISSUE=API-2\n")
+    os.utime(api_env, ns=(0, 10**18))
+    assert registry.get("api").jira_base_issue == "API-2"
+    assert registry.get() is web
+    with pytest.raises(ValueError):
+        registry.get("mobile")
@@ -1,26 +1,67 @@
 import tool.formatter
-import subprocess
 import json
+import types
 
 
-class DummyResult:
-    def __init__(self):
-        self.stdout = "output"
-        self.stderr = ""
-        self.returncode = 0
+def make_project(tmp_path, count):
+    for i in range(count):
+        (tmp_path / f"mod{i}.py").write_text(f"x{i} = {{ 'a':1 }}\n")
+    return types.SimpleNamespace(project_dir=str(tmp_path))
 
 
-def dummy_run(*args, **kwargs):
-    return DummyResult()
+def test_black():
+    config = types.SimpleNamespace(project_dir=".")
+    result = tool.formatter.black(config, paths=[], index=tool.formatter.FormatIndex())
+    data = json.loads(result)
+    assert "changed" in data
+    assert "unchanged" in data
+    assert "errors" in data
 
 
-class DummyConfig:
-    project_dir = "."
+def test_black_formats_only_changed_files(tmp_path):
+    config = make_project(tmp_path, 3)
+    (tmp_path / "broken.py").write_text("def (:\n")
+    index = tool.formatter.FormatIndex()
 
+    data = json.loads(tool.formatter.black(config, index=index))
+    assert data["changed"] == 3
+    assert data["errors"] == 1
+    assert (tmp_path / "mod0.py").read_text() == 'x0 = {"a": 1}\n'
 
-def test_black():
-    result = tool.formatter.black(DummyConfig(), runner=dummy_run)
-    data = json.loads(result)
-    assert "stdout" in data
-    assert "stderr" in data
-    assert "return_code" in data
+    data = json.loads(tool.formatter.black(config, index=index))
+    assert data["changed"] == 0
+    assert data["skipped"] == 3
+    assert [f["path"] for f in data["files"]] == ["broken.py"]
+
+    (tmp_path / "mod1.py").write_text("y   =  2\n")
+    data = json.loads(tool.formatter.black(config, index=index))
+    assert data["changed"] == 1
+    assert {"path": "mod1.py", "status": "changed"} in data["files"]
+
+
+def test_black_process_pool(tmp_path):
+    config = make_project(tmp_path, 4)
+    index = tool.formatter.FormatIndex()
+    data = json.loads(tool.formatter.black(config, index=index, use_pool=True))
+    assert data["changed"] == 4
+
+
+def test_black_honours_pyproject_excludes_and_gitignore(tmp_path):
+    config = make_project(tmp_path, 2)
+    (tmp_path / "pyproject.toml").write_text(
+        '[tool.black]\nextend-exclude = "^/gen/"\nforce-exclude = "mod1"\n'
+    )
+    (tmp_path / ".gitignore").write_text("scratch.py\n")
+    for path in ("gen/out.py", "scratch.py", "build/lib.py", "pkg/mod.py"):
+        (tmp_path / path).parent.mkdir(exist_ok=True)
+        (tmp_path / path).write_text("x = { 'a':1 }\n")
+    index = tool.formatter.FormatIndex()
+
+    data = json.loads(tool.formatter.black(config, index=index))
+    assert sorted(f["path"] for f in data["files"]) == ["mod0.py", "pkg/mod.py"]
+    assert (tmp_path / "gen/out.py").read_text() == "x = { 'a':1 }\n"
+
+    data = json.loads(
+        tool.formatter.black(config, paths=["scratch.py", "mod1.py"], index=index)
+    )
+    assert [f["path"] for f in data["files"]] == ["scratch.py"]
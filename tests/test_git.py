@@ -0,0 +1,170 @@
+import asyncio
+import json
+import subprocess
+import types
+import pytest
+import tool.workflow
+from core import git
+from core.process import ProcessResult, run_process
+
+
+def sh(cwd, *cmd):
+    subprocess.run(cmd, cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    sh(tmp_path, "git", "init", "-q", "-b", "master")
+    sh(tmp_path, "git", "config", "user.email", "dev@example.com")
+    sh(tmp_path, "git", "config", "user.name", "dev")
+    (tmp_path / "a.txt").write_text("one\ntwo\n")
+    (tmp_path / "sp ace.txt").write_text("x\n")
+    sh(tmp_path, "git", "add", ".")
+    sh(tmp_path, "git", "commit", "-qm", "init")
+    return tmp_path
+
+
+class StaticSession:
+    def __init__(self, workflow):
+        self.workflow = workflow
+
+    def get(self):
+        return self.workflow
+
+
+def summary(repo, **kwargs):
+    session = StaticSession(tool.workflow.Workflow(str(repo), validate=False))
+    config = types.SimpleNamespace(project_dir=str(repo))
+    return json.loads(
+        asyncio.run(tool.workflow.change_summary(config, session, **kwargs))
+    )
+
+
+def test_change_summary_returns_patch(repo):
+    (repo / "a.txt").write_text("one\nthree\n")
+    sh(repo, "git", "mv", "sp ace.txt", "moved.txt")
+    (repo / "new.txt").write_text("new\n")
+    result = summary(repo)
+    assert result["branch"] == "master"
+    states = {e["path"]: (e["index"], e["worktree"]) for e in result["status"]}
+    assert states == {
+        "a.txt": (".", "M"),
+        "moved.txt": ("R", "."),
+        "new.txt": ("?", "?"),
+    }
+    assert {"path": "a.txt", "added": 1, "deleted": 1} in result["diff_stat"]
+    assert {"path": "moved.txt", "added": 0, "deleted": 0} in result["diff_stat"]
+    patch = next(p for p in result["diff"] if p["path"] == "a.txt")
+    assert "-two\n+three" in patch["patch"]
+    assert result["truncated"] is False
+
+
+def test_change_summary_budget_and_paths(repo):
+    (repo / "a.txt").write_text("".join(f"line {i}\n" for i in range(2000)))
+    (repo / "sp ace.txt").write_text("y\n")
+    result = summary(repo, max_patch_bytes=200)
+    assert result["truncated"] is True
+    result = summary(repo, paths=["sp ace.txt"])
+    assert [e["path"] for e in result["status"]] == ["sp ace.txt"]
+    assert [p["path"] for p in result["diff"]] == ["sp ace.txt"]
+
+
+def test_parse_numstat_patch_rename_braces():
+    stats, patches = git.parse_numstat_patch(
+        "1\t0\tsrc/{old => new}/f.py\n\ndiff --git a/src/old/f.py b/src/new/f.py\n"
+        "similarity index 90%\nrename from src/old/f.py\nrename to src/new/f.py\n"
+    )
+    assert stats[0]["path"] == "src/new/f.py"
+    assert patches[0]["path"] == "src/new/f.py"
+
+
+@pytest.fixture
+def clone(tmp_path):
+    """A working clone of a bare repository whose default branch is main."""
+    remote = tmp_path / "remote.git"
+    sh(tmp_path, "git", "init", "-q", "--bare", "-b", "main", str(remote))
+    work = tmp_path / "work"
+    sh(tmp_path, "git", "clone", "-q", str(remote), str(work))
+    sh(work, "git", "config", "user.email", "dev@example.com")
+    sh(work, "git", "config", "user.name", "dev")
+    sh(work, "git", "checkout", "-q", "-b", "main")
+    (work / "a.txt").write_text("one\n")
+    sh(work, "git", "add", ".")
+    sh(work, "git", "commit", "-qm", "init")
+    sh(work, "git", "push", "-q", "-u", "origin", "main")
+    sh(work, "git", "checkout", "-q", "-b", "old-work")
+    return work
+
+
+async def stub_gh(cmd, **kwargs):
+    """Answers gh commands locally and runs everything else for real."""
+    if cmd[0] == "gh":
+        issue = {"number": 5, "title": "[feature] Add thing", "body": ""}
+        return ProcessResult(cmd, 0, json.dumps(issue), "")
+    return await run_process(cmd, **kwargs)
+
+
+def test_start_plan_against_bare_remote(clone):
+    session = StaticSession(
+        tool.workflow.Workflow(str(clone), validate=False, async_runner=stub_gh)
+    )
+    config = types.SimpleNamespace(project_dir=str(clone))
+    (clone / "scratch.txt").write_text("untracked\n")
+
+    dry = json.loads(asyncio.run(tool.workflow.start(5, config, session, dry_run=True)))
+    assert dry["success"] and dry["branch"] == "feature/issue-5"
+    steps = {step["name"]: step for step in dry["steps"]}
+    assert steps["checkout"]["status"] == "planned"
+    assert steps["checkout"]["cmd"][-1] == "origin/main"
+    assert (clone / "scratch.txt").exists()
+
+    result = json.loads(asyncio.run(tool.workflow.start(5, config, session)))
+    assert result["success"], result["error"]
+    assert all("duration_ms" in step for step in result["steps"])
+    head = subprocess.run(
+        ["git", "rev-parse", "--abbrev-ref", "HEAD"],
+        cwd=clone,
+        capture_output=True,
+        text=True,
+    )
+    assert head.stdout.strip() == "feature/issue-5"
+    assert not (clone / "scratch.txt").exists()
+    remote_heads = subprocess.run(
+        ["git", "ls-remote", "--heads", "origin"],
+        cwd=clone,
+        capture_output=True,
+        text=True,
+    )
+    assert "refs/heads/feature/issue-5" in remote_heads.stdout
+
+
+def test_checkout_default_moves_to_the_updated_default_branch(clone):
+    session = StaticSession(tool.workflow.Workflow(str(clone), validate=False))
+    config = types.SimpleNamespace(project_dir=str(clone))
+    assert list(tool.workflow.merge_plan(7).steps) == ["merge"]
+
+    result = json.loads(asyncio.run(tool.workflow.checkout_default(config, session)))
+    assert result["success"], result["error"]
+    head = subprocess.run(
+        ["git", "rev-parse", "--abbrev-ref", "HEAD"],
+        cwd=clone,
+        capture_output=True,
+        text=True,
+    )
+    assert head.stdout.strip() == "main"
+
+
+def test_start_reports_a_failed_issue_lookup(clone):
+    async def failing_gh(cmd, **kwargs):
+        if cmd[0] == "gh":
+            return ProcessResult(cmd, 1, "", "could not resolve to an issue")
+        return await run_process(cmd, **kwargs)
+
+    session = StaticSession(
+        tool.workflow.Workflow(str(clone), validate=False, async_runner=failing_gh)
+    )
+    config = types.SimpleNamespace(project_dir=str(clone))
+    result = json.loads(asyncio.run(tool.workflow.start(5, config, session)))
+    assert result["success"] is False
+    assert result["error"].startswith("issue failed")
+    assert "branch" not in result
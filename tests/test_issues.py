@@ -0,0 +1,81 @@
+import asyncio
+import json
+from core import issues
+from core.process import ProcessResult
+
+
+class FakeGitHub:
+    def __init__(self, git_dir, issues_by_number):
+        self.git_dir = git_dir
+        self.issues = issues_by_number
+        self.commands = []
+
+    async def capture(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        if cmd[:2] == ["git", "rev-parse"]:
+            return ProcessResult(cmd, 0, f"{self.git_dir}\n", "")
+        since = cmd[-1].partition("&since=")[2]
+        lines = [
+            json.dumps(issue)
+            for issue in sorted(self.issues.values(), key=lambda i: i["updated_at"])
+            if issue["updated_at"] >= since
+        ]
+        return ProcessResult(cmd, 0, "\n".join(lines), "")
+
+
+def issue(number, updated, state="open", labels=(), pull_request=False):
+    return {
+        "number": number,
+        "title": f"Issue {number}",
+        "state": state,
+        "labels": list(labels),
+        "created_at": "2025-01-01T00:00:00Z",
+        "updated_at": updated,
+        "pull_request": pull_request,
+    }
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_issue_index_syncs_incrementally_and_filters(tmp_path):
+    github = FakeGitHub(
+        str(tmp_path / ".git"),
+        {
+            n: issue(n, f"2025-02-{n % 28 + 1:02d}T00:00:00Z", labels=["bug"] * (n % 2))
+            for n in range(1, 151)
+        },
+    )
+    github.issues[151] = issue(151, "2025-03-01T00:00:00Z", pull_request=True)
+    index = asyncio.run(issues.get_index(str(tmp_path), github.capture))
+    clock = FakeClock()
+    index._clock = clock
+
+    asyncio.run(issues.sync(index, github.capture))
+    first = index.query(limit=100)
+    assert first["total"] == 150
+    assert first["issues"][0]["number"] == 150
+    assert first["next_offset"] == 100
+    assert len(index.query(offset=100)["issues"]) == 50
+    assert index.query(labels=["BUG"])["total"] == 75
+    assert (tmp_path / ".git" / "autonomy" / "issues.json").exists()
+    assert "&since=" not in github.commands[-1][-1]
+
+    asyncio.run(issues.sync(index, github.capture))
+    assert len(github.commands) == 2
+
+    github.issues[7] = issue(7, "2025-04-01T00:00:00Z", state="closed")
+    clock.now += issues.REFRESH_INTERVAL + 1
+    asyncio.run(issues.sync(index, github.capture))
+    assert github.commands[-1][-1].endswith("&since=2025-02-28T00:00:00Z")
+    assert index.query(state="closed")["issues"][0]["number"] == 7
+    assert index.query()["total"] == 149
+
+    reloaded = issues.IssueIndex(index.path)
+    assert reloaded.synced_at == "2025-04-01T00:00:00Z"
+    assert reloaded.query(state="all")["total"] == 150
@@ -1,5 +1,14 @@
 import tool.jira
 import types
+import pytest
+
+JIRA_URL = "http://jira.local"
+
+
+@pytest.fixture(autouse=True)
+def clear_jira_cache():
+    tool.jira.invalidate_cache()
+    yield
 
 
 class DummyJira:
@@ -25,15 +34,295 @@ def dummy_get_jira(config):
 
 
 def test_get_base_issue():
-    config = types.SimpleNamespace(jira_base_issue="P-1")
+    config = types.SimpleNamespace(jira_url=JIRA_URL, jira_base_issue="P-1")
     result = tool.jira.get_base_issue(config, jira_factory=dummy_get_jira)
     assert "title" in result and "description" in result
 
 
 def test_create_issue_from_base():
-    config = types.SimpleNamespace(jira_base_issue="P-1")
+    config = types.SimpleNamespace(jira_url=JIRA_URL, jira_base_issue="P-1")
     result = tool.jira.create_issue_from_base(
         "t", "d", config, jira_factory=dummy_get_jira
     )
     assert result["success"] is True
     assert "issue_key" in result
+
+
+def test_get_jira_reuses_pooled_client():
+    config = types.SimpleNamespace(
+        jira_url="http://jira.local",
+        jira_api_token="token",
+        jira_pool_size=2,
+        jira_timeout=5,
+    )
+    try:
+        first = tool.jira.get_jira(config)
+        assert tool.jira.get_jira(config) is first
+        adapter = first._session.get_adapter("http://jira.local")
+        assert adapter._pool_maxsize == 2
+    finally:
+        tool.jira.close_jira_clients()
+    assert tool.jira.get_jira(config) is not first
+    tool.jira.close_jira_clients()
+
+
+def test_idle_client_is_checked_outside_the_lock(monkeypatch):
+    config = types.SimpleNamespace(
+        jira_url="http://jira.local",
+        jira_api_token="token",
+        jira_pool_size=1,
+        jira_timeout=5,
+    )
+    checks = []
+
+    def is_healthy(jira):
+        checks.append(tool.jira._clients_lock.locked())
+        return False
+
+    monkeypatch.setattr(tool.jira, "_is_healthy", is_healthy)
+    try:
+        first = tool.jira.get_jira(config)
+        for client in tool.jira._clients.values():
+            client.last_used -= tool.jira.HEALTH_CHECK_INTERVAL + 1
+        assert tool.jira.get_jira(config) is not first
+        assert checks == [False]
+    finally:
+        tool.jira.close_jira_clients()
+
+
+def test_jira_health():
+    config = types.SimpleNamespace(jira_url=JIRA_URL, jira_base_issue="P-1")
+    result = tool.jira.jira_health(config, jira_factory=dummy_get_jira)
+    assert result["success"] is True
+
+
+class CountingJira(DummyJira):
+    def __init__(self):
+        self.calls = []
+
+    def issue(self, key):
+        self.calls.append(("issue", key))
+        return super().issue(key)
+
+    def get(self, endpoint):
+        self.calls.append(("get", endpoint))
+        return super().get(endpoint)
+
+    def post(self, endpoint, data=None):
+        self.calls.append(("post", endpoint))
+        return super().post(endpoint, data)
+
+
+def test_create_issue_from_base_caches_lookups():
+    config = types.SimpleNamespace(jira_url=JIRA_URL, jira_base_issue="P-1")
+    jira = CountingJira()
+    for _ in range(3):
+        tool.jira.create_issue_from_base("t", "d", config, jira_factory=lambda c: jira)
+    assert [c[0] for c in jira.calls].count("issue") == 1
+    assert [c[0] for c in jira.calls].count("get") == 1
+    assert [c[0] for c in jira.calls].count("post") == 3
+    stats = tool.jira.cache_stats()
+    assert stats["base_issue"]["hits"] == 2
+    tool.jira.invalidate_cache("P-1", config)
+    tool.jira.get_base_issue(config, jira_factory=lambda c: jira)
+    assert [c[0] for c in jira.calls].count("issue") == 2
+
+
+def test_caches_are_kept_per_jira_server():
+    first = types.SimpleNamespace(jira_url=JIRA_URL, jira_base_issue="P-1")
+    second = types.SimpleNamespace(jira_url="http://other.local", jira_base_issue="P-1")
+    jira, other = CountingJira(), CountingJira()
+    tool.jira.get_base_issue(first, jira_factory=lambda c: jira)
+    tool.jira.get_base_issue(second, jira_factory=lambda c: other)
+    assert other.calls == [("issue", "P-1")]
+
+
+class BulkJira(DummyJira):
+    """Fails the summary "bad" in bulk requests, and chunk 2 outright."""
+
+    def __init__(self):
+        self.bulk_sizes = []
+        self.next_id = 100
+
+    def post(self, endpoint, data=None):
+        assert endpoint == "rest/api/2/issue/bulk"
+        updates = data["issueUpdates"]
+        self.bulk_sizes.append(len(updates))
+        if len(self.bulk_sizes) == 2:
+            raise RuntimeError("503 Service Unavailable")
+        issues, errors = [], []
+        for position, update in enumerate(updates):
+            if update["fields"]["summary"] == "bad":
+                errors.append(
+                    {
+                        "status": 400,
+                        "failedElementNumber": position,
+                        "elementErrors": {"errors": {"summary": "is invalid"}},
+                    }
+                )
+            else:
+                self.next_id += 1
+                issues.append({"id": str(self.next_id), "key": f"P-{self.next_id}"})
+        return {"issues": issues, "errors": errors}
+
+
+def test_create_issues_from_base_in_chunks_with_partial_failures():
+    jira = BulkJira()
+    items = [{"title": f"t{i}", "description": "d"} for i in range(120)]
+    items[3]["title"] = "bad"
+    items[7] = {"description": "no title"}
+    config = types.SimpleNamespace(jira_url=JIRA_URL, jira_base_issue="P-1")
+    result = tool.jira.create_issues_from_base(
+        items, config, jira_factory=lambda c: jira
+    )
+    assert jira.bulk_sizes == [50, 50, 19]
+    assert result["success"] is False
+    assert [r["index"] for r in result["issues"]] == list(range(120))
+    assert result["issues"][3]["error"].endswith("summary: is invalid")
+    assert "title" in result["issues"][7]["error"]
+    assert result["issues"][4]["issue_key"] == "P-104"
+    assert "503" in result["issues"][60]["error"]
+    assert result["issues"][-1]["success"] is True
+    assert result["created"] == 120 - 2 - 50
+
+
+class EpicJira:
+    def __init__(self, count, max_results=50):
+        self.count = count
+        self.max_results = max_results
+        self.requests = []
+
+    def jql(self, jql, fields="*all", start=0, limit=None, expand=None):
+        self.requests.append((start, limit, fields))
+        size = min(limit or self.max_results, self.max_results)
+        issues = [
+            {
+                "key": f"P-{i}",
+                "fields": {
+                    "summary": f"story {i}",
+                    "status": {"name": "Open"},
+                    "issuetype": {"name": "Story"},
+                },
+            }
+            for i in range(start, min(start + size, self.count))
+        ]
+        return {"total": self.count, "maxResults": size, "issues": issues}
+
+
+def test_get_epic_stories_fetches_every_page():
+    jira = EpicJira(230)
+    result = tool.jira.get_epic_stories(
+        "E-1", types.SimpleNamespace(jira_url=JIRA_URL), jira_factory=lambda c: jira
+    )
+    assert result["success"] is True
+    assert result["total_issues"] == 230
+    assert [s["key"] for s in result["stories"]] == [f"P-{i}" for i in range(230)]
+    assert result["next_cursor"] is None
+    assert len(jira.requests) == 5
+    assert all(r[2] == tool.jira.EPIC_FIELDS for r in jira.requests)
+
+
+def test_get_epic_stories_limit_and_cursor():
+    jira = EpicJira(230)
+    config = types.SimpleNamespace(jira_url=JIRA_URL)
+    page = tool.jira.get_epic_stories(
+        "E-1", config, limit=70, jira_factory=lambda c: jira
+    )
+    assert len(page["stories"]) == 70
+    assert page["next_cursor"] == 70
+    page = tool.jira.get_epic_stories(
+        "E-1",
+        config,
+        limit=200,
+        cursor=page["next_cursor"],
+        jira_factory=lambda c: jira,
+    )
+    assert page["stories"][0]["key"] == "P-70"
+    assert len(page["stories"]) == 160
+    assert page["next_cursor"] is None
+    page = tool.jira.get_epic_stories(
+        "E-1", config, limit=0, jira_factory=lambda c: jira
+    )
+    assert page["success"] is False
+
+
+class StoriesJira:
+    def __init__(self, known):
+        self.known = known
+        self.jql_calls = 0
+        self.issue_calls = []
+
+    def _fields(self, key):
+        return {
+            "summary": f"title {key}",
+            "description": None,
+            "status": {"name": "Open"},
+            "issuetype": {"name": "Story"},
+        }
+
+    def jql(self, jql, fields="*all", start=0, limit=None, expand=None):
+        self.jql_calls += 1
+        keys = jql[len("key in (") : -1].split(", ")
+        if any(key not in self.known for key in keys):
+            raise RuntimeError("An issue with key does not exist")
+        comment = {"author": {"displayName": "A"}, "created": "c", "body": "b"}
+        return {
+            "issues": [
+                {
+                    "key": key,
+                    "fields": dict(
+                        self._fields(key),
+                        comment={"total": 1, "comments": [comment]},
+                    ),
+                }
+                for key in keys
+            ]
+        }
+
+    def issue(self, key):
+        self.issue_calls.append(key)
+        if key not in self.known:
+            raise RuntimeError(f"Issue {key} does not exist")
+        return {"fields": self._fields(key)}
+
+    def issue_get_comments(self, key):
+        return {"comments": []}
+
+
+def test_get_stories_content_single_search():
+    jira = StoriesJira({"P-1", "P-2"})
+    result = tool.jira.get_stories_content(
+        ["P-2", "p-1"],
+        types.SimpleNamespace(jira_url=JIRA_URL),
+        jira_factory=lambda c: jira,
+    )
+    assert result["success"] is True
+    assert [s["key"] for s in result["stories"]] == ["P-2", "P-1"]
+    assert result["stories"][0]["comments"][0]["author"] == "A"
+    assert jira.jql_calls == 1
+    assert jira.issue_calls == []
+
+
+def test_get_stories_content_isolates_errors():
+    jira = StoriesJira({"P-1", "P-2"})
+    result = tool.jira.get_stories_content(
+        ["P-1", "P-9", "P-2"],
+        types.SimpleNamespace(jira_url=JIRA_URL),
+        jira_factory=lambda c: jira,
+    )
+    assert result["success"] is False
+    assert [s["success"] for s in result["stories"]] == [True, False, True]
+    assert result["stories"][0]["title"] == "title P-1"
+    assert "P-9" in result["stories"][1]["error"]
+
+
+def test_get_stories_content_keeps_odd_keys_out_of_jql():
+    jira = StoriesJira({"P-1"})
+    result = tool.jira.get_stories_content(
+        ["P-1", "P-1) OR project = X"],
+        types.SimpleNamespace(jira_url=JIRA_URL),
+        jira_factory=lambda c: jira,
+    )
+    assert [s["success"] for s in result["stories"]] == [True, False]
+    assert jira.jql_calls == 1
+    assert jira.issue_calls == ["P-1) OR PROJECT = X"]
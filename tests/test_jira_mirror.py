@@ -0,0 +1,188 @@
+import threading
+import types
+import pytest
+import tool.jira
+from core.jira_mirror import JiraMirror
+
+JIRA_URL = "http://jira.local"
+
+
+@pytest.fixture(autouse=True)
+def clear_jira_cache():
+    tool.jira.invalidate_cache()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class MirroredJira:
+    """Serves key and epic searches, plus the incremental sync query."""
+
+    def __init__(self):
+        self.issues = {
+            "P-1": ("Fix login redirect", "Users bounce back to /login", "E-1"),
+            "P-2": ("Cache epic listings", "Listing is slow", "E-1"),
+            "P-3": ("Unrelated", "Nothing here", None),
+        }
+        self.updated = []
+        self.queries = []
+
+    def _issue(self, key):
+        summary, description, epic = self.issues[key]
+        comment = {"author": {"displayName": "A"}, "created": "c", "body": "redirects"}
+        return {
+            "key": key,
+            "fields": {
+                "summary": summary,
+                "description": description,
+                "status": {"name": "Open"},
+                "issuetype": {"name": "Story"},
+                "comment": {"total": 1, "comments": [comment]},
+                "customfield_10008": epic,
+            },
+        }
+
+    def get(self, path):
+        assert path == "rest/api/2/field"
+        return [{"id": "customfield_10008", "name": "Epic Link"}]
+
+    def jql(self, jql, fields="*all", start=0, limit=None, expand=None):
+        self.queries.append(jql)
+        if jql.startswith("key in ("):
+            keys = jql[len("key in (") : -1].split(", ")
+        elif jql.startswith('"Epic Link"'):
+            epic = jql.split()[3]
+            keys = [k for k, v in self.issues.items() if v[2] == epic]
+        else:
+            assert "updated >=" in jql
+            keys = self.updated
+        issues = [self._issue(key) for key in keys][start:]
+        return {"total": len(keys), "issues": issues}
+
+
+def test_stories_served_from_mirror_and_kept_fresh_by_sync():
+    jira = MirroredJira()
+    clock = Clock()
+    mirror = JiraMirror(":memory:", clock=clock)
+    config = types.SimpleNamespace(jira_url=JIRA_URL)
+
+    def fetch(keys):
+        return tool.jira.get_stories_content(
+            keys, config, jira_factory=lambda c: jira, mirror=mirror
+        )
+
+    first = fetch(["P-1", "P-2"])
+    assert [s.get("source") for s in first["stories"]] == [None, None]
+    jira.queries.clear()
+
+    second = fetch(["P-2", "P-1"])
+    assert second["success"] is True
+    assert [s["source"] for s in second["stories"]] == ["mirror", "mirror"]
+    assert second["stories"][1]["comments"][0]["body"] == "redirects"
+    assert jira.queries == []
+
+    jira.issues["P-1"] = ("Fix logout redirect", "Changed upstream", "E-1")
+    jira.updated = ["P-1"]
+    clock.now += 90
+    fetch(["P-1"])
+    mirror.sync_in_background(jira).result()
+    third = fetch(["P-1"])
+    assert third["stories"][0]["title"] == "Fix logout redirect"
+    assert third["stories"][0]["source"] == "mirror"
+    assert jira.queries == [
+        'project in ("P") AND updated >= "-3m" ORDER BY updated ASC'
+    ]
+
+    found = tool.jira.search_local(
+        "redirecting logout", config, jira_factory=lambda c: jira, mirror=mirror
+    )
+    assert [r["key"] for r in found["results"]] == ["P-1"]
+    assert "[logout]" in found["results"][0]["snippet"]
+
+
+def test_epic_listing_served_from_mirror_after_full_fetch():
+    jira = MirroredJira()
+    clock = Clock()
+    mirror = JiraMirror(":memory:", clock=clock)
+    config = types.SimpleNamespace(jira_url=JIRA_URL)
+
+    def epic():
+        return tool.jira.get_epic_stories(
+            "E-1", config, jira_factory=lambda c: jira, mirror=mirror
+        )
+
+    assert "source" not in epic()
+    cached = epic()
+    assert cached["source"] == "mirror"
+    assert [s["key"] for s in cached["stories"]] == ["P-1", "P-2"]
+    # Only the story contents are mirrored fully by a listing.
+    assert mirror.story("P-1") is None
+
+    jira.issues["P-3"] = ("Now in the epic", "Moved", "E-1")
+    jira.issues["P-1"] = ("Fix login redirect", "Moved out", None)
+    jira.updated = ["P-1", "P-3"]
+    clock.now += 61
+    epic()
+    mirror.sync_in_background(jira).result()
+    moved = epic()
+    assert moved["source"] == "mirror"
+    assert [s["key"] for s in moved["stories"]] == ["P-2", "P-3"]
+
+
+def test_mirror_write_failure_does_not_fail_the_fetch():
+    class LockedMirror(JiraMirror):
+        def store_stories(self, *args):
+            raise RuntimeError("database is locked")
+
+    jira = MirroredJira()
+    mirror = LockedMirror(":memory:", clock=Clock())
+    result = tool.jira.get_stories_content(
+        ["P-1"],
+        types.SimpleNamespace(jira_url=JIRA_URL),
+        jira_factory=lambda c: jira,
+        mirror=mirror,
+    )
+    assert result["success"] is True
+    assert result["stories"][0]["title"] == "Fix login redirect"
+
+
+def test_reads_do_not_wait_for_a_due_sync():
+    class SlowSyncJira(MirroredJira):
+        def __init__(self):
+            super().__init__()
+            self.release = threading.Event()
+
+        def jql(self, jql, **kwargs):
+            if "updated >=" in jql:
+                assert self.release.wait(5)
+            return super().jql(jql, **kwargs)
+
+    jira = SlowSyncJira()
+    clock = Clock()
+    mirror = JiraMirror(":memory:", clock=clock)
+    config = types.SimpleNamespace(jira_url=JIRA_URL)
+
+    def fetch():
+        return tool.jira.get_stories_content(
+            ["P-1"], config, jira_factory=lambda c: jira, mirror=mirror
+        )["stories"][0]
+
+    fetch()
+    jira.issues["P-1"] = ("Fix logout redirect", "Changed upstream", "E-1")
+    jira.updated = ["P-1"]
+    clock.now += 3600
+    # While the due sync is held up, the last synced state is served.
+    for _ in range(2):
+        story = fetch()
+        assert story["source"] == "mirror"
+        assert story["title"] == "Fix login redirect"
+    syncing = mirror.sync_in_background(jira)
+    assert not syncing.done()
+    jira.release.set()
+    assert syncing.result() == 1
+    assert fetch()["title"] == "Fix logout redirect"
@@ -0,0 +1,54 @@
+import asyncio
+from core.jobs import JobError, JobManager
+
+
+def test_jobs_run_concurrently_in_background():
+    manager = JobManager()
+    # Each job waits for the other, so both finish only if they overlap.
+    together = asyncio.Barrier(2)
+
+    async def meet(value):
+        await asyncio.wait_for(together.wait(), 5)
+        return value
+
+    first = manager.start("meet", lambda: meet(1), key="a")
+    assert manager.start("meet", lambda: meet(3), key="a") is first
+    assert not first.done
+    second = manager.start("meet", lambda: meet(2), key="b")
+
+    asyncio.run(manager.wait(first, 10))
+    asyncio.run(manager.wait(second, 10))
+    assert (first.status, first.result) == ("succeeded", 1)
+    assert second.to_dict()["result"] == 2
+    manager.shutdown()
+
+
+def test_job_failures_and_backoff():
+    manager = JobManager()
+
+    async def fail():
+        raise JobError("checks failed", {"checks": [{"name": "ci", "state": "fail"}]})
+
+    async def blocked():
+        await asyncio.sleep(60)
+
+    failed = manager.start("checks", fail)
+    slow = manager.start("checks", blocked)
+    asyncio.run(manager.wait(failed, 2))
+    assert failed.status == "failed"
+    assert failed.error == "checks failed"
+    assert failed.result["checks"][0]["state"] == "fail"
+
+    sleeps = []
+
+    async def record(delay):
+        sleeps.append(delay)
+        await asyncio.sleep(delay / 100)
+
+    asyncio.run(manager.wait(slow, 3.5, sleep=record))
+    assert not slow.done
+    assert [round(d, 1) for d in sleeps[:3]] == [0.5, 1.0, 2.0]
+    assert manager.cancel(slow.id)
+    asyncio.run(manager.wait(slow, 1))
+    assert slow.status == "cancelled"
+    manager.shutdown()
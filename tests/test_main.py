@@ -0,0 +1,29 @@
+import asyncio
+import types
+import pytest
+import main
+from core.config import ProjectRegistry
+
+
+def tool_names(mcp):
+    return {tool.name for tool in asyncio.run(mcp.list_tools())}
+
+
+def test_parse_groups():
+    assert main.parse_groups("all") == ["browse", "jira", "workflow"]
+    assert main.parse_groups("jira, browse") == ["jira", "browse"]
+    with pytest.raises(ValueError):
+        main.parse_groups("browse,mail")
+
+
+def test_setup_mcp_registers_selected_groups():
+    config = ProjectRegistry.of(types.SimpleNamespace(project_dir=".", trace_file=None))
+    names = tool_names(main.setup_mcp(["browse", "jira"], config))
+    assert "browse__fetch" in names
+    assert "jira__get_story_content" in names
+    assert not any(name.startswith("workflow__") for name in names)
+
+    names = tool_names(main.setup_mcp(main.parse_groups("all"), config))
+    assert {"browse__search", "jira__health", "workflow__commit"} <= names
+    listing = asyncio.run(main.setup_mcp([], config).call_tool("projects__list", {}))
+    assert '"project_dir": "."' in listing[0].text
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import pytest
+from mcp.server.fastmcp import FastMCP
+from core import metrics
+from core.http import HttpClient
+from core.process import ProcessResult
+from tool.workflow import Workflow
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.registry.reset()
+    yield
+    metrics.set_trace_file(None)
+    metrics.registry.reset()
+
+
+def test_histogram_counts_errors_and_quantiles():
+    histogram = metrics.Histogram()
+    for duration in (3, 4, 40, 40, 900):
+        histogram.observe(duration, size=10)
+    histogram.observe(200000, error=True)
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 6
+    assert snapshot["errors"] == 1
+    assert snapshot["bytes"] == 50
+    assert snapshot["p50_ms"] == 50
+    assert snapshot["max_ms"] == 200000
+    assert snapshot["buckets"] == {
+        "le_5ms": 2,
+        "le_50ms": 2,
+        "le_1000ms": 1,
+        "overflow": 1,
+    }
+
+
+def test_instrumented_tools_trace_nested_spans(tmp_path, http_server):
+    async def async_runner(cmd, **kwargs):
+        return ProcessResult(cmd, 0, "abc", "")
+
+    http_server.routes["/status"] = (200, {"Content-Type": "text/plain"}, b"x" * 64)
+    trace_file = tmp_path / "trace.jsonl"
+    mcp = metrics.instrument(FastMCP("Test"), str(trace_file))
+    workflow = Workflow(".", validate=False, async_runner=async_runner)
+    client = HttpClient()
+
+    @mcp.tool()
+    async def demo__push() -> str:
+        """Push, then fetch something."""
+        await workflow.run_async(["git", "push", "-u", "origin", "main"])
+        with client.stream(http_server.url("/status")) as response:
+            response.read()
+        return "done"
+
+    @mcp.tool()
+    def demo__broken() -> dict:
+        """Always fails."""
+        return {"success": False, "error": "nope"}
+
+    asyncio.run(mcp.call_tool("demo__push", {}))
+    asyncio.run(mcp.call_tool("demo__broken", {}))
+    client.close()
+
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    by_name = {span["name"]: span for span in spans}
+    tool = by_name["demo__push"]
+    host = f"GET {http_server.url('/').split('/')[2]}"
+    assert tool["parent"] is None
+    assert by_name["git push"]["parent"] == tool["span"]
+    assert by_name["git push"]["cmd"] == ["git", "push", "-u", "origin", "main"]
+    assert by_name[host]["parent"] == tool["span"]
+    assert by_name[host]["bytes"] == 64
+    assert {span["trace"] for span in spans if span["name"] != "demo__broken"} == {
+        tool["trace"]
+    }
+
+    snapshot = asyncio.run(mcp.call_tool("metrics__snapshot", {}))
+    snapshot = json.loads(snapshot[0].text)
+    assert snapshot["tool"]["demo__push"]["count"] == 1
+    assert snapshot["tool"]["demo__push"]["bytes"] == 4
+    assert snapshot["tool"]["demo__broken"]["errors"] == 1
+    assert snapshot["subprocess"]["git push"]["count"] == 1
+    assert snapshot["http"][host]["count"] == 1
@@ -0,0 +1,59 @@
+import asyncio
+import subprocess
+from core.plan import Plan, run_plan
+from core.process import ProcessResult
+
+
+def test_plan_overlaps_independent_steps_and_skips_after_failure():
+    # a and b wait for each other, so the plan only finishes if they overlap.
+    together = asyncio.Barrier(2)
+
+    async def capture(cmd, **kwargs):
+        if cmd[0] in ("a", "b"):
+            await asyncio.wait_for(together.wait(), 5)
+        if cmd[0] == "fail":
+            raise subprocess.CalledProcessError(1, cmd, "", "boom")
+        return ProcessResult(cmd, 0, f"{cmd[0]}\n", "")
+
+    plan = (
+        Plan("demo")
+        .step("a", ["a"])
+        .step("b", ["b"])
+        .step("c", lambda o: [o["a"] + o["b"]], after=("a", "b"))
+        .step("bad", ["fail"])
+        .step("after_bad", ["never"], after=("bad",))
+    )
+    result = asyncio.run(run_plan(plan, capture))
+    assert result.outputs["c"] == "ab"
+    statuses = {step["name"]: step["status"] for step in result.steps}
+    assert statuses == {
+        "a": "ok",
+        "b": "ok",
+        "c": "ok",
+        "bad": "failed",
+        "after_bad": "skipped",
+    }
+    assert result.error == "bad failed: boom"
+    assert result.steps[0]["duration_ms"] >= 0
+
+
+def test_dry_run_only_lists_mutating_steps():
+    commands = []
+
+    async def capture(cmd, **kwargs):
+        commands.append(cmd)
+        return ProcessResult(cmd, 0, "main", "")
+
+    plan = (
+        Plan("demo")
+        .step("read", ["git", "ls-remote"])
+        .step("write", lambda o: ["git", "checkout", o["read"]], mutates=True)
+    )
+    result = asyncio.run(run_plan(plan, capture, dry_run=True))
+    assert commands == [["git", "ls-remote"]]
+    assert result.steps[1] == {
+        "name": "write",
+        "status": "planned",
+        "cmd": ["git", "checkout", "main"],
+    }
+    assert result.success
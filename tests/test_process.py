@@ -0,0 +1,41 @@
+import asyncio
+import subprocess
+import sys
+import time
+import pytest
+from core.process import run_process, BoundedBuffer
+
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+
+def test_run_process_captures_output():
+    result = asyncio.run(
+        run_process(python("import sys; print('out'); print('err', file=sys.stderr)"))
+    )
+    assert result.returncode == 0
+    assert result.stdout.strip() == "out"
+    assert result.stderr.strip() == "err"
+    assert result.truncated is False
+
+
+def test_run_process_truncates_while_reading():
+    result = asyncio.run(run_process(python("print('x' * 200000)"), max_output=1000))
+    assert len(result.stdout) == 1000
+    assert result.truncated is True
+
+
+def test_run_process_timeout_kills_process():
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        asyncio.run(run_process(python("import time; time.sleep(30)"), timeout=0.5))
+    assert time.monotonic() - started < 10
+
+
+def test_bounded_buffer_counts_dropped_bytes():
+    buffer = BoundedBuffer(4)
+    buffer.write(b"abc")
+    buffer.write(b"def")
+    assert buffer.getvalue() == "abcd"
+    assert buffer.dropped == 2
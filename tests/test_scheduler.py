@@ -0,0 +1,221 @@
+import asyncio
+import threading
+import tool.browse
+import tool.workflow
+from core import scheduler
+from core.http import PageCache
+from core.process import ProcessResult
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_spaces_calls_after_burst():
+    clock = Clock()
+    bucket = scheduler.TokenBucket(rate=2, burst=2, clock=clock)
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    clock.now = 10
+    bucket.pause(3)
+    assert bucket.reserve() == 3
+
+
+def test_token_bucket_keeps_the_token_of_a_caller_that_gives_up():
+    clock = Clock()
+    bucket = scheduler.TokenBucket(rate=2, burst=1, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve(limit=0.1) is None
+    assert bucket.reserve() == 0.5
+
+
+def test_parse_retry_after():
+    assert scheduler.parse_retry_after("7") == 7
+    assert (
+        scheduler.parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", 1445412480) == 10
+    )
+    assert scheduler.parse_retry_after("soon") is None
+
+
+def test_identical_inflight_calls_share_one_run():
+    backend = scheduler.Backend("test", rate=100, burst=100)
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "page"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(backend.call(load, "k")))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while backend.stats()["calls"] < 5:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ["page"] * 5
+    assert backend.stats()["coalesced"] == 4
+    assert backend.call(lambda: "again", "k") == "again"
+
+
+def test_retry_after_is_honoured_then_gives_up():
+    sleeps = []
+    backend = scheduler.Backend(
+        "test",
+        rate=100,
+        burst=100,
+        max_retries=2,
+        sleep=sleeps.append,
+        jitter=lambda: 0,
+    )
+    attempts = []
+
+    def limited():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise scheduler.RateLimited("429", retry_after=2, result="limited")
+        return "ok"
+
+    assert backend.call(limited) == "ok"
+    assert len(sleeps) == 2 and all(s >= 1.9 for s in sleeps)
+    assert backend.stats()["retries"] == 2
+
+    def always_limited():
+        raise scheduler.RateLimited("429", result="limited")
+
+    try:
+        backend.call(always_limited)
+        raise AssertionError("expected RateLimited")
+    except scheduler.RateLimited as e:
+        assert e.result == "limited"
+    assert backend.stats()["rate_limited"] == 5
+
+
+def test_gh_rate_limit_is_retried_and_reads_are_merged():
+    runs = []
+
+    async def runner(cmd, **kwargs):
+        runs.append(cmd)
+        await asyncio.sleep(0.01)
+        if len(runs) == 1:
+            return ProcessResult(cmd, 1, "", "API rate limit exceeded for user")
+        return ProcessResult(cmd, 0, '{"number": 1}', "")
+
+    backend = scheduler.Backend("gh-test", rate=100, burst=100, base_delay=0)
+    workflow = tool.workflow.Workflow(
+        ".", validate=False, async_runner=runner, gh_backend=backend
+    )
+    cmd = ["gh", "pr", "view", "--json", "number"]
+
+    async def both():
+        return await asyncio.gather(workflow.capture(cmd), workflow.capture(cmd))
+
+    first, second = asyncio.run(both())
+    assert first.stdout == second.stdout == '{"number": 1}'
+    assert len(runs) == 2
+    assert backend.stats()["coalesced"] == 1
+    assert tool.workflow._gh_key(["gh", "pr", "merge", "1"], ".") is None
+
+
+def test_fetch_retries_after_429(http_server):
+    responses = iter(
+        [
+            (429, {"Retry-After": "0"}, "slow down"),
+            (200, {"Content-Type": "text/plain"}, "hello"),
+        ]
+    )
+    http_server.routes["/limited"] = lambda handler: next(responses)
+    result = tool.browse.fetch(http_server.url("/limited"), cache=PageCache())
+    assert result["content"] == "hello"
+    assert len(http_server.requests) == 2
+
+
+def test_cancelled_waiters_and_leaders_stay_local():
+    backend = scheduler.Backend("test", rate=100, burst=100)
+    runs = []
+
+    async def load():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "page"
+
+    async def scenario():
+        leader = asyncio.create_task(backend.call_async(load, "k"))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(backend.call_async(load, "k")) for _ in range(2)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        results = await asyncio.gather(leader, waiters[1])
+        assert waiters[0].cancelled()
+
+        leader = asyncio.create_task(backend.call_async(load, "j"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(backend.call_async(load, "j"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return results, await waiter
+
+    results, rerun = asyncio.run(scenario())
+    assert results == ["page", "page"]
+    assert rerun == "page"
+    assert len(runs) == 3
+
+
+def test_waits_past_the_timeout_give_up():
+    sleeps = []
+    backend = scheduler.Backend(
+        "test", rate=100, burst=100, sleep=sleeps.append, jitter=lambda: 0
+    )
+
+    def limited():
+        raise scheduler.RateLimited("429", retry_after=30, result="limited")
+
+    try:
+        backend.call(limited, timeout=5)
+        raise AssertionError("expected RateLimited")
+    except scheduler.RateLimited as e:
+        assert e.result == "limited"
+    assert sleeps == []
+    assert backend.stats()["retries"] == 0
+
+
+def test_waiters_give_up_on_a_shared_call_at_their_timeout():
+    backend = scheduler.Backend("test", rate=100, burst=100)
+    started = threading.Event()
+    release = threading.Event()
+
+    def load():
+        started.set()
+        assert release.wait(5)
+        return "page"
+
+    leader = threading.Thread(target=lambda: backend.call(load, "k"))
+    leader.start()
+    assert started.wait(5)
+    try:
+        backend.call(load, "k", timeout=0.01)
+        raise AssertionError("expected TimeoutError")
+    except TimeoutError as e:
+        assert "identical call" in str(e)
+
+    async def waiter():
+        return await backend.call_async(load, "k", timeout=0.01)
+
+    try:
+        asyncio.run(waiter())
+        raise AssertionError("expected TimeoutError")
+    except TimeoutError as e:
+        assert "identical call" in str(e)
+    release.set()
+    leader.join(5)
+    assert backend.stats()["in_flight_keys"] == 0
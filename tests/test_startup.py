@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "scripts",
+    "bench-startup.py",
+)
+
+
+def test_entry_points_start_within_budget():
+    result = subprocess.run(
+        [sys.executable, SCRIPT, "--json", "--runs", "1"],
+        capture_output=True,
+        text=True,
+    )
+    report = json.loads(result.stdout)
+    assert report["failures"] == [], report["failures"]
+    assert result.returncode == 0
+    for name in ("browse", "jira", "workflow", "all"):
+        assert report["results"][name]["deferred_loaded"] == []
+
+
+def test_startup_regression_against_a_baseline_fails(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": {"jira": {"ready_ms": 1.0}}}))
+    result = subprocess.run(
+        [sys.executable, SCRIPT, "jira", "--json", "--runs", "1"]
+        + ["--baseline", str(baseline)],
+        capture_output=True,
+        text=True,
+    )
+    report = json.loads(result.stdout)
+    assert result.returncode == 1
+    assert [f.split(":")[0] for f in report["failures"]] == ["jira"]
+    assert "vs baseline 1ms" in report["failures"][0]
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import subprocess
+import types
+import pytest
+import tool.formatter
+import tool.workflow
+from core import watch
+
+
+def sh(cwd, *cmd):
+    subprocess.run(cmd, cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    sh(tmp_path, "git", "init", "-q", "-b", "master")
+    sh(tmp_path, "git", "config", "user.email", "dev@example.com")
+    sh(tmp_path, "git", "config", "user.name", "dev")
+    (tmp_path / ".gitignore").write_text("build/\n*.log\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+    sh(tmp_path, "git", "add", ".")
+    sh(tmp_path, "git", "commit", "-qm", "init")
+    return tmp_path
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "poll"])
+def watcher(request, repo):
+    watcher = watch.Watcher(str(repo), use_inotify=request.param).start()
+    yield watcher
+    watcher.close()
+
+
+def test_changes_since_skips_ignored_paths(repo, watcher):
+    changed, cursor = watcher.changes_since(None)
+    assert changed is None
+    (repo / "a.py").write_text("a = 2\n")
+    (repo / "debug.log").write_text("noise\n")
+    (repo / "build" / "out.py").write_text("x = 1\n")
+    (repo / "pkg").mkdir()
+    (repo / "pkg" / "mod.py").write_text("m = 1\n")
+    changed, cursor = watcher.changes_since(cursor)
+    assert changed == ["a.py", "pkg/mod.py"]
+    assert watcher.changes_since(cursor)[0] == []
+
+
+def test_change_summary_and_commit_use_watched_paths(repo, watcher):
+    session = types.SimpleNamespace(
+        get=lambda: tool.workflow.Workflow(str(repo), validate=False)
+    )
+    config = types.SimpleNamespace(project_dir=str(repo))
+
+    def summary():
+        return json.loads(
+            asyncio.run(tool.workflow.change_summary(config, session, watcher=watcher))
+        )
+
+    (repo / "a.py").write_text("a = 2\n")
+    assert [e["path"] for e in summary()["status"]] == ["a.py"]
+    assert watcher.status_paths()[0] == ["a.py"]
+
+    (repo / "b.py").write_text("b = 2\n")
+    (repo / "a.py").write_text("a = 1\n")
+    assert [e["path"] for e in summary()["status"]] == ["b.py"]
+    assert watcher.status_paths()[0] == ["b.py"]
+
+    workflow_obj = session.get()
+    asyncio.run(tool.workflow._stage_changes(workflow_obj, watcher))
+    staged = subprocess.run(
+        ["git", "diff", "--cached", "--name-only"],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+    )
+    assert staged.stdout.split() == ["b.py"]
+    # Staging moved the index, so the recorded status no longer holds.
+    assert watcher.status_paths()[0] is None
+
+
+def test_black_only_formats_watched_changes(repo, watcher):
+    config = types.SimpleNamespace(project_dir=str(repo))
+    index = tool.formatter.FormatIndex()
+    data = json.loads(tool.formatter.black(config, index=index, watcher=watcher))
+    assert data["unchanged"] == 2
+
+    (repo / "b.py").write_text("b  =  3\n")
+    data = json.loads(tool.formatter.black(config, index=index, watcher=watcher))
+    assert data["files"] == [{"path": "b.py", "status": "changed"}]
+    assert data["skipped"] == 0
+
+
+def test_ignore_rule_changes_force_a_rescan(repo, watcher):
+    (repo / "build" / "gen.py").write_text("g = 1\n")
+    _, cursor = watcher.changes_since(None)
+    watcher.record_status(watcher.cursor(), [])
+    assert watcher.status_paths()[0] == []
+
+    (repo / ".gitignore").write_text("*.log\n")
+    (repo / "build" / "gen.py").write_text("g = 2\n")
+    assert watcher.changes_since(cursor)[0] is None
+    assert watcher.status_paths()[0] is None
+
+    _, cursor = watcher.changes_since(None)
+    (repo / "build" / "gen.py").write_text("g = 3\n")
+    assert watcher.changes_since(cursor)[0] == ["build/gen.py"]
+
+    (repo / ".git" / "info" / "exclude").write_text("build/\n")
+    assert watcher.changes_since(cursor)[0] is None
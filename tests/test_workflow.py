@@ -1,5 +1,9 @@
 import tool.workflow
+import json
 import types
+import asyncio
+import subprocess
+from core.jobs import JobManager
 
 
 class DummyResult:
@@ -24,3 +28,116 @@ def test_list():
     )
     result = wf.run(["echo", "foo"])
     assert isinstance(result, str)
+
+
+class RecordingRunner:
+    def __init__(self):
+        self.commands = []
+        self.fail_auth = False
+
+    def __call__(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        result = DummyResult()
+        if self.fail_auth and cmd[:2] == ["gh", "issue"]:
+            result.returncode = 1
+            result.stderr = "To get started with GitHub CLI, please run: gh auth login"
+        return result
+
+    async def run_async(self, cmd, **kwargs):
+        return self(cmd, **kwargs)
+
+
+def test_session_validates_once_and_after_auth_failure():
+    runner = RecordingRunner()
+    session = tool.workflow.WorkflowSession(
+        ".",
+        workflow_factory=lambda d: tool.workflow.Workflow(
+            d,
+            runner=runner,
+            which=dummy_which,
+            validate=False,
+            async_runner=runner.run_async,
+        ),
+    )
+    config = types.SimpleNamespace(project_dir=".")
+    asyncio.run(tool.workflow.start(1, config, session))
+    asyncio.run(tool.workflow.start(1, config, session))
+    auth_checks = lambda: runner.commands.count(["gh", "auth", "status"])
+    assert auth_checks() == 1
+
+    runner.fail_auth = True
+    try:
+        asyncio.run(tool.workflow.start(1, config, session))
+    except subprocess.CalledProcessError:
+        pass
+    runner.fail_auth = False
+    asyncio.run(tool.workflow.start(1, config, session))
+    assert auth_checks() == 2
+
+
+class CIRunner(RecordingRunner):
+    def __init__(self, checks_returncode):
+        super().__init__()
+        self.checks_returncode = checks_returncode
+
+    def __call__(self, cmd, **kwargs):
+        result = super().__call__(cmd, **kwargs)
+        if cmd[:3] == ["gh", "pr", "view"]:
+            result.stdout = '{"number": 7}'
+        elif cmd[:3] == ["gh", "pr", "checks"] and "--watch" not in cmd:
+            result.returncode = self.checks_returncode
+            result.stdout = "build\tfail\t1m\thttps://ci.example/1\n"
+        return result
+
+
+def test_commit_and_complete_watch_checks_in_background():
+    config = types.SimpleNamespace(project_dir=".")
+    manager = JobManager()
+    runner = CIRunner(checks_returncode=0)
+    session = tool.workflow.WorkflowSession(
+        ".",
+        workflow_factory=lambda d: tool.workflow.Workflow(
+            d, runner=runner, which=dummy_which, async_runner=runner.run_async
+        ),
+    )
+    result = json.loads(
+        asyncio.run(tool.workflow.commit("msg", config, session, manager))
+    )
+    assert result["pr"] == 7
+    status = json.loads(
+        asyncio.run(tool.workflow.job_status(result["checks_job"], 2, manager))
+    )
+    assert status["status"] == "succeeded"
+    assert status["result"]["checks"][0]["name"] == "build"
+    assert ["gh", "pr", "checks", "7", "--watch"] in runner.commands
+
+    runner.checks_returncode = 1
+    result = json.loads(asyncio.run(tool.workflow.complete(config, session, manager)))
+    status = json.loads(
+        asyncio.run(tool.workflow.job_status(result["job"], 2, manager))
+    )
+    assert status["status"] == "failed"
+    assert ["gh", "pr", "merge", "7", "--merge"] not in runner.commands
+    listing = json.loads(asyncio.run(tool.workflow.job_status(job_manager=manager)))
+    assert len(listing["jobs"]) == 2
+    manager.shutdown()
+
+
+def test_merge_job_leaves_the_working_copy_to_checkout_default():
+    config = types.SimpleNamespace(project_dir=".")
+    manager = JobManager()
+    runner = CIRunner(checks_returncode=0)
+    session = tool.workflow.WorkflowSession(
+        ".",
+        workflow_factory=lambda d: tool.workflow.Workflow(
+            d, runner=runner, which=dummy_which, async_runner=runner.run_async
+        ),
+    )
+    result = json.loads(asyncio.run(tool.workflow.complete(config, session, manager)))
+    status = json.loads(
+        asyncio.run(tool.workflow.job_status(result["job"], 2, manager))
+    )
+    assert status["status"] == "succeeded"
+    assert ["gh", "pr", "merge", "7", "--merge"] in runner.commands
+    assert not any(cmd[:2] == ["git", "checkout"] for cmd in runner.commands)
+    manager.shutdown()